@@ -9,6 +9,8 @@ import "@openzeppelin/contracts/proxy/utils/UUPSUpgradeable.sol";
 abstract contract DualSpaceGeneral is ERC721Upgradeable, UUPSUpgradeable {
 
     event BatchStart(uint256 startBlock, uint128 batchNbr, uint8 ratio);
+    // metadata caches drop their entries when the base uri changes
+    event BaseURIChange(string baseURI);
 
     struct TokenMeta {
         // date + category
@@ -17,6 +19,24 @@ abstract contract DualSpaceGeneral is ERC721Upgradeable, UUPSUpgradeable {
         uint16 batchInternalId; // <= 999
     }
 
+    // state of a token in one space, returned by batchTokenState
+    // owner is zero and other fields are empty if the token is not minted
+    struct TokenState {
+        address owner;
+        uint256 privilegeExpiration;
+        bool privilegeExpired;
+        string tokenURI;
+    }
+
+    // tokens of each owner for tokensOfOwner, token ids fit in 64 bits so 4 ids share a slot
+    // removal swaps the last token of the owner in, pages are not stable across transfers of the owner
+    // tokens held by the contract itself (owner cleared) are not indexed
+    struct OwnerTokenIndex {
+        mapping(address => uint64[]) tokens;
+        // tokenId => position in tokens of its owner + 1, 0 if not indexed
+        mapping(uint256 => uint256) positions;
+    }
+
     // token example 2023040101010001
     // token batch *  10^6 + rarity * 10^4 + batch internal id
     function _resolveTokenId(uint256 tokenId) internal pure returns (TokenMeta memory) {
@@ -36,7 +56,10 @@ abstract contract DualSpaceGeneral is ERC721Upgradeable, UUPSUpgradeable {
 
     function tokenURI(uint256 tokenId) public view virtual override returns (string memory) {
         _requireMinted(tokenId);
+        return _tokenURI(tokenId);
+    }
 
+    function _tokenURI(uint256 tokenId) internal view returns (string memory) {
         string memory baseURI = _baseURI();
         // same batch nbr and same rarity has same metadata
         return bytes(baseURI).length > 0 ? string(abi.encodePacked(baseURI, StringsUpgradeable.toString(tokenId/10**4))) : "";
@@ -46,4 +69,82 @@ abstract contract DualSpaceGeneral is ERC721Upgradeable, UUPSUpgradeable {
     // function lock(uint256 tokenId, uint256 period) public 
 
     function getPrivilegeExpiration(uint256 tokenId) public virtual view returns (uint256);
+
+    // storage of the index is declared by each space, appended to its upgradeable layout
+    function _ownerTokenIndex() internal view virtual returns (OwnerTokenIndex storage);
+
+    // tokens of owner from position cursor, total is the count of tokens of owner
+    // so pages after the first can be fetched concurrently
+    function tokensOfOwner(
+        address owner,
+        uint256 cursor,
+        uint256 limit
+    ) public view returns (uint256[] memory tokenIds, uint256 total) {
+        uint64[] storage tokens = _ownerTokenIndex().tokens[owner];
+        total = tokens.length;
+        if (cursor >= total) {
+            return (new uint256[](0), total);
+        }
+        // compared without cursor + limit which overflows for limit = type(uint256).max
+        if (limit > total - cursor) {
+            limit = total - cursor;
+        }
+        tokenIds = new uint256[](limit);
+        for (uint256 i = 0; i < limit; i++) {
+            tokenIds[i] = tokens[cursor + i];
+        }
+    }
+
+    function _afterTokenTransfer(
+        address from,
+        address to,
+        uint256 firstTokenId,
+        uint256 batchSize
+    ) internal virtual override {
+        super._afterTokenTransfer(from, to, firstTokenId, batchSize);
+        if (from == to) {
+            return;
+        }
+        OwnerTokenIndex storage index = _ownerTokenIndex();
+        if (from != address(0)) {
+            _removeFromOwnerTokenIndex(index, from, firstTokenId);
+        }
+        if (to != address(0) && to != address(this)) {
+            _addToOwnerTokenIndex(index, to, firstTokenId);
+        }
+    }
+
+    // tokens minted before the index only enter it on their next transfer, this indexes them earlier
+    function _indexTokens(uint256[] memory tokenIds) internal {
+        OwnerTokenIndex storage index = _ownerTokenIndex();
+        for (uint256 i = 0; i < tokenIds.length; i++) {
+            address owner = _ownerOf(tokenIds[i]);
+            if (owner != address(0) && owner != address(this) && index.positions[tokenIds[i]] == 0) {
+                _addToOwnerTokenIndex(index, owner, tokenIds[i]);
+            }
+        }
+    }
+
+    function _addToOwnerTokenIndex(OwnerTokenIndex storage index, address owner, uint256 tokenId) private {
+        require(tokenId <= type(uint64).max, "token id does not fit the owner index");
+        uint64[] storage tokens = index.tokens[owner];
+        tokens.push(uint64(tokenId));
+        index.positions[tokenId] = tokens.length;
+    }
+
+    function _removeFromOwnerTokenIndex(OwnerTokenIndex storage index, address owner, uint256 tokenId) private {
+        uint256 position = index.positions[tokenId];
+        // held by the contract itself or minted before the index
+        if (position == 0) {
+            return;
+        }
+        uint64[] storage tokens = index.tokens[owner];
+        uint64 lastTokenId = tokens[tokens.length - 1];
+        if (lastTokenId != tokenId) {
+            tokens[position - 1] = lastTokenId;
+            index.positions[lastTokenId] = position;
+        }
+        tokens.pop();
+        delete index.positions[tokenId];
+    }
 }
@@ -6,6 +6,7 @@ pragma solidity ^0.8.0;
 // import "@openzeppelin/contracts/token/ERC721/ERC721Upgradeable.sol";
 // import "OpenZeppelin/openzeppelin-contracts@4.9.0/contracts/access/Ownable.sol";
 import "@openzeppelin/contracts/access/OwnableUpgradeable.sol";
+import "@openzeppelin/contracts/utils/cryptography/MerkleProofUpgradeable.sol";
 import "./EvmMetatransactionVerifier.sol";
 import "./DualSpaceGeneral.sol";
 import "./DualSpaceNFTEvm.sol";
@@ -21,30 +22,67 @@ contract DualSpaceNFTCore is
     EvmMetatransactionVerifier
 {
     bytes20 _evmContractAddress;
+    // packed into the slot of _evmContractAddress, set once migrateLegacyStorage is finished
+    // (or on initialize) so the legacy mappings are not read anymore
+    bool _legacyStorageMigrated;
     // only for debug
     // DualSpaceNFTEvm evmContractForDebug;
     CrossSpaceCall _crossSpaceCall;
     uint _defaultOracleBlockLife;
 
+    // legacy layout of the per batch state, kept for the upgradeable storage layout
     struct MintSetting {
         address oracleSigner;
         address authorizer;
         uint expiration;
     }
 
+    // per batch state in 2 slots instead of 4 (MintSetting + internal id counter)
+    // slot 0 is all a mint reads and writes
+    struct PackedMintSetting {
+        address oracleSigner;
+        uint64 expiration;
+        uint16 internalIdCounter;
+        address authorizer;
+    }
+
+    // espace batch setting mirrored by startBatch, expirations are in espace blocks
+    struct EvmBatchSetting {
+        uint64 startBlock;
+        uint8 ratio;
+        uint64 baseExpirationBlockInterval;
+    }
+
     struct Signature {
         uint8 v;
         bytes32 r;
         bytes32 s;
     }
 
+    struct MintRequest {
+        string username;
+        address ownerCoreAddress;
+        bytes20 ownerEvmAddress;
+        Signature oracleSignature;
+    }
+
+    // proof of leaf keccak256(keccak256(abi.encode(index, usernameHash, rarity)))
+    // against the mint permission root of a batch, see scripts/merkle_permission.py
+    struct MintPermissionProof {
+        uint256 index;
+        uint8 rarity;
+        bytes32[] proof;
+    }
+
     // 20230523 => address
     // mint oracle is a centralized server to prove the user owns the Github token
-    mapping(uint128 => MintSetting) _mintSetting;
+    // legacy, moved to _packedMintSetting
+    mapping(uint128 => MintSetting) _legacyMintSetting;
     // batchNbr => usernameHash => rarityCouldMint
     mapping(uint128 => mapping(bytes32 => uint8)) _authorizedRarityMintPermission;
 
-    mapping(uint128 => uint16) _batchInternalIdCounter;
+    // legacy, moved to _packedMintSetting
+    mapping(uint128 => uint16) _legacyBatchInternalIdCounter;
 
     function initialize(
         string memory name_,
@@ -61,16 +99,49 @@ contract DualSpaceNFTCore is
         // _crossSpaceCall = CrossSpaceCall(0x0888000000000000000000000000000000000006);
         _crossSpaceCall = CrossSpaceCall(crossSpaceCallAddress);
         _defaultOracleBlockLife = defaultOracleLife; // expected to defaults to 30 days, 2 block per second (30 * 24 * 60 * 60 * 2)
+        _legacyStorageMigrated = true;
     }
 
     string public baseURI;
 
+    // storage appended after the legacy layout
+    mapping(uint128 => PackedMintSetting) _packedMintSetting;
+    // batchNbr => merkle root of mint permissions, alternative to _authorizedRarityMintPermission
+    mapping(uint128 => bytes32) _mintPermissionRoot;
+    // batchNbr => leaf index / 256 => claimed bits
+    mapping(uint128 => mapping(uint256 => uint256)) _claimedMintPermission;
+    // batches started before the mirror have no entry and are read through staticCallEVM
+    mapping(uint128 => EvmBatchSetting) _evmBatchSetting;
+    // batchNbr => batchInternalId / 256 => bits of tokens whose evm owner is cleared (held by the evm contract)
+    // updated by every core call moving the evm owner. a set bit is authoritative: a token held by the evm contract
+    // only leaves it through core. an unset bit is not, the espace owner may transfer the token to the evm contract
+    mapping(uint128 => mapping(uint256 => uint256)) _evmOwnerClearedBitmap;
+    OwnerTokenIndex _ownerTokens;
+
+    function _ownerTokenIndex() internal view override returns (OwnerTokenIndex storage) {
+        return _ownerTokens;
+    }
+
+    // adds tokens minted before the upgrade to tokensOfOwner of both spaces, anyone can call it
+    // indexed tokens and tokens held by the contracts are skipped
+    function indexTokens(uint256[] memory tokenIds) public {
+        _indexTokens(tokenIds);
+        _crossSpaceCall.callEVM(
+            _evmContractAddress,
+            abi.encodeWithSignature(
+                "indexTokens(uint256[])",
+                tokenIds
+            )
+        );
+    }
+
     function _baseURI() internal view override returns (string memory) {
         return baseURI;
     }
 
     function setBaseURI(string memory baseURI_) external onlyOwner {
         baseURI = baseURI_;
+        emit BaseURIChange(baseURI_);
         _crossSpaceCall.callEVM(
             _evmContractAddress,
             abi.encodeWithSignature(
@@ -108,12 +179,14 @@ contract DualSpaceNFTCore is
         uint8 ratio
     ) public onlyOwner {
         require(batchNbr < 99999999, "invalid batch nbr");
-        _mintSetting[batchNbr].oracleSigner = oracleSigner;
-        _mintSetting[batchNbr].authorizer = authorizer;
-        _mintSetting[batchNbr].expiration =
+        PackedMintSetting storage setting = _migrateMintSetting(batchNbr);
+        setting.oracleSigner = oracleSigner;
+        setting.expiration = uint64(
             block.number +
-            _defaultOracleBlockLife;
-        _crossSpaceCall.callEVM(
+            _defaultOracleBlockLife
+        );
+        setting.authorizer = authorizer;
+        bytes memory output = _crossSpaceCall.callEVM(
             _evmContractAddress,
             abi.encodeWithSignature(
                 "startBatch(uint128,uint8)",
@@ -121,42 +194,161 @@ contract DualSpaceNFTCore is
                 ratio
             )
         );
+        // empty if the espace implementation predates the mirror
+        if (output.length == 64) {
+            (uint256 evmStartBlock, uint256 baseExpirationBlockInterval) = abi.decode(output, (uint256, uint256));
+            _evmBatchSetting[batchNbr] = EvmBatchSetting(
+                uint64(evmStartBlock),
+                ratio,
+                uint64(baseExpirationBlockInterval)
+            );
+        }
         emit BatchStart(block.number, batchNbr, ratio);
     }
 
+    // moves the legacy state of a batch to _packedMintSetting
+    function _migrateMintSetting(
+        uint128 batchNbr
+    ) internal returns (PackedMintSetting storage setting) {
+        setting = _packedMintSetting[batchNbr];
+        if (_legacyStorageMigrated) {
+            return setting;
+        }
+        if (setting.expiration == 0) {
+            MintSetting memory legacySetting = _legacyMintSetting[batchNbr];
+            if (legacySetting.expiration != 0) {
+                setting.oracleSigner = legacySetting.oracleSigner;
+                setting.expiration = uint64(legacySetting.expiration);
+                setting.authorizer = legacySetting.authorizer;
+                delete _legacyMintSetting[batchNbr];
+            }
+        }
+        if (setting.internalIdCounter == 0) {
+            uint16 legacyCounter = _legacyBatchInternalIdCounter[batchNbr];
+            if (legacyCounter != 0) {
+                setting.internalIdCounter = legacyCounter;
+                delete _legacyBatchInternalIdCounter[batchNbr];
+            }
+        }
+    }
+
+    // view of the batch state for batches not migrated yet
+    function _mintSettingOf(
+        uint128 batchNbr
+    ) internal view returns (PackedMintSetting memory setting) {
+        setting = _packedMintSetting[batchNbr];
+        if (!_legacyStorageMigrated && setting.expiration == 0) {
+            MintSetting memory legacySetting = _legacyMintSetting[batchNbr];
+            setting.oracleSigner = legacySetting.oracleSigner;
+            setting.expiration = uint64(legacySetting.expiration);
+            setting.authorizer = legacySetting.authorizer;
+        }
+    }
+
     function _isValidMintOracleSigner(
         address oracleSigner,
         uint128 batchNbr
     ) internal view returns (bool) {
+        PackedMintSetting memory setting = _mintSettingOf(batchNbr);
         return
-            oracleSigner == _mintSetting[batchNbr].oracleSigner &&
-            _mintSetting[batchNbr].expiration > block.number;
+            oracleSigner == setting.oracleSigner &&
+            setting.expiration > block.number;
     }
 
     function _isValidMintOracleAuthorizer(
         address authorizer,
         uint128 batchNbr
     ) internal view returns (bool) {
+        PackedMintSetting memory setting = _mintSettingOf(batchNbr);
         return
-            authorizer == _mintSetting[batchNbr].authorizer &&
-            _mintSetting[batchNbr].expiration > block.number;
+            authorizer == setting.authorizer &&
+            setting.expiration > block.number;
     }
 
     function clearMintSetting(uint128 batchNbr) public {
-        require((_mintSetting[batchNbr].expiration + _defaultOracleBlockLife) < block.number, "mint setting not expired for enough time");
-        delete _mintSetting[batchNbr];
+        _clearMintSetting(batchNbr);
     }
 
-    function getMintSettingExpiration(uint128 batchNbr) public view returns (uint256) {
-        return _mintSetting[batchNbr].expiration;
+    // clears the mint setting of many batches, reverts if any of them is not expired for enough time
+    function batchClearMintSetting(uint128[] memory batchNbrs) public {
+        for (uint256 i = 0; i < batchNbrs.length; i++) {
+            _clearMintSetting(batchNbrs[i]);
+        }
     }
 
-    function batchAuthorizeMintPermission(
+    function _clearMintSetting(uint128 batchNbr) internal {
+        PackedMintSetting storage setting = _migrateMintSetting(batchNbr);
+        require((setting.expiration + _defaultOracleBlockLife) < block.number, "mint setting not expired for enough time");
+        // internal id counter is kept so a restarted batch does not reuse token ids
+        setting.oracleSigner = address(0);
+        setting.expiration = 0;
+        setting.authorizer = address(0);
+        // claimed bits are kept so a restarted batch with the same root cannot mint twice
+        delete _mintPermissionRoot[batchNbr];
+    }
+
+    // deletes the permissions of usernames that never minted, once the mint setting of the batch could be cleared
+    // a batch without expiration is either not started or already cleared, only the owner can clear it
+    // usernameHashes: keccak256(abi.encodePacked(username))
+    function clearMintPermissions(uint128 batchNbr, bytes32[] memory usernameHashes) public {
+        uint256 expiration = _mintSettingOf(batchNbr).expiration;
+        require(expiration != 0 || msg.sender == owner(), "batch not started");
+        require(
+            (expiration + _defaultOracleBlockLife) < block.number,
+            "mint setting not expired for enough time"
+        );
+        mapping(bytes32 => uint8) storage permissions = _authorizedRarityMintPermission[batchNbr];
+        for (uint256 i = 0; i < usernameHashes.length; i++) {
+            delete permissions[usernameHashes[i]];
+        }
+    }
+
+    function batchCheckMintPermission(
         uint128 batchNbr,
-        string[] memory usernames,
-        uint8[] memory rarities
-    ) public {
-        require(usernames.length == rarities.length, "username and rariry array must have same length");
+        bytes32[] memory usernameHashes
+    ) external view returns (uint8[] memory rarities) {
+        rarities = new uint8[](usernameHashes.length);
+        mapping(bytes32 => uint8) storage permissions = _authorizedRarityMintPermission[batchNbr];
+        for (uint256 i = 0; i < usernameHashes.length; i++) {
+            rarities[i] = permissions[usernameHashes[i]];
+        }
+    }
+
+    function getDefaultOracleBlockLife() public view returns (uint256) {
+        return _defaultOracleBlockLife;
+    }
+
+    function getMintSettingExpiration(uint128 batchNbr) public view returns (uint256) {
+        return _mintSettingOf(batchNbr).expiration;
+    }
+
+    // moves per batch state of both contracts and the espace transferable table to the packed layout
+    // after upgrading from the legacy layout. legacy entries are read as fallback until finished is set,
+    // so the migration can be split into several transactions
+    function migrateLegacyStorage(
+        uint128[] memory batchNbrs,
+        uint256[] memory transferableTokenIds,
+        bool finished
+    ) public onlyOwner {
+        require(!_legacyStorageMigrated, "legacy storage already migrated");
+        for (uint256 i = 0; i < batchNbrs.length; i++) {
+            _migrateMintSetting(batchNbrs[i]);
+        }
+        _crossSpaceCall.callEVM(
+            _evmContractAddress,
+            abi.encodeWithSignature(
+                "migrateLegacyStorage(uint128[],uint256[],bool)",
+                batchNbrs,
+                transferableTokenIds,
+                finished
+            )
+        );
+        if (finished) {
+            _legacyStorageMigrated = true;
+        }
+    }
+
+    modifier onlyMintPermissionAuthorizer(uint128 batchNbr) {
         // owner or mint oracle
         if (msg.sender == owner()) {
             // do nothing
@@ -165,11 +357,64 @@ contract DualSpaceNFTCore is
         } else {
             revert("msg sender is not authorized to set mint permission");
         }
+        _;
+    }
+
+    function batchAuthorizeMintPermission(
+        uint128 batchNbr,
+        string[] memory usernames,
+        uint8[] memory rarities
+    ) public onlyMintPermissionAuthorizer(batchNbr) {
+        require(usernames.length == rarities.length, "username and rariry array must have same length");
         for (uint256 i = 0; i < usernames.length; i++) {
             _authorizeMintPermission(batchNbr, usernames[i], rarities[i]);
         }
     }
 
+    // authorizes every username of the tree with one SSTORE, usernames then mint with mintWithProof.
+    // claimed leaves are tracked by index, so an updated root should keep the index of existing leaves
+    function setMintPermissionRoot(
+        uint128 batchNbr,
+        bytes32 root
+    ) public onlyMintPermissionAuthorizer(batchNbr) {
+        _mintPermissionRoot[batchNbr] = root;
+    }
+
+    function getMintPermissionRoot(uint128 batchNbr) public view returns (bytes32) {
+        return _mintPermissionRoot[batchNbr];
+    }
+
+    function isMintPermissionClaimed(uint128 batchNbr, uint256 index) public view returns (bool) {
+        return (_claimedMintPermission[batchNbr][index >> 8] & (uint256(1) << (index & 0xff))) != 0;
+    }
+
+    function _claimMintPermission(
+        uint128 batchNbr,
+        bytes32 usernameHash,
+        MintPermissionProof memory permissionProof
+    ) internal {
+        bytes32 leaf = keccak256(
+            bytes.concat(
+                keccak256(
+                    abi.encode(
+                        permissionProof.index,
+                        usernameHash,
+                        permissionProof.rarity
+                    )
+                )
+            )
+        );
+        require(
+            permissionProof.rarity != 0 &&
+            MerkleProofUpgradeable.verify(permissionProof.proof, _mintPermissionRoot[batchNbr], leaf),
+            "no permission to mint"
+        );
+        mapping(uint256 => uint256) storage claimed = _claimedMintPermission[batchNbr];
+        uint256 mask = uint256(1) << (permissionProof.index & 0xff);
+        require((claimed[permissionProof.index >> 8] & mask) == 0, "mint permission already claimed");
+        claimed[permissionProof.index >> 8] |= mask;
+    }
+
     function _authorizeMintPermission(
         uint128 batchNbr,
         string memory username,
@@ -188,17 +433,170 @@ contract DualSpaceNFTCore is
         bytes20 ownerEvmAddress,
         Signature memory oracleSignature
     ) public returns (uint256) {
-        require(
-            _mintSetting[batchNbr].expiration > block.number,
-            "no available mint oracle at present"
+        uint256 tokenId;
+        (tokenId, ownerCoreAddress, ownerEvmAddress) = _prepareMint(
+            batchNbr,
+            MintRequest(username, ownerCoreAddress, ownerEvmAddress, oracleSignature)
         );
-        bytes32 usernameHash = keccak256(abi.encodePacked(username));
+        _mintPrepared(tokenId, ownerCoreAddress, ownerEvmAddress);
+        return tokenId;
+    }
+
+    // same as mint, but the permission is proven against the merkle root set by setMintPermissionRoot
+    function mintWithProof(
+        uint128 batchNbr,
+        string memory username,
+        address ownerCoreAddress,
+        bytes20 ownerEvmAddress,
+        Signature memory oracleSignature,
+        MintPermissionProof memory permissionProof
+    ) public returns (uint256) {
+        uint256 tokenId;
+        (tokenId, ownerCoreAddress, ownerEvmAddress) = _prepareMintWithProof(
+            batchNbr,
+            MintRequest(username, ownerCoreAddress, ownerEvmAddress, oracleSignature),
+            permissionProof
+        );
+        _mintPrepared(tokenId, ownerCoreAddress, ownerEvmAddress);
+        return tokenId;
+    }
+
+    function _mintPrepared(
+        uint256 tokenId,
+        address ownerCoreAddress,
+        bytes20 ownerEvmAddress
+    ) internal {
+        // update transferable state
+        if (ownerCoreAddress == address(this)) {
+            _crossSpaceCall.callEVM(
+                _evmContractAddress,
+                abi.encodeWithSignature(
+                    "setTransferableTable(uint256,bool)",
+                    tokenId,
+                    true
+                )
+            );
+        }
+        if (ownerEvmAddress == _evmContractAddress) {
+            _setEvmOwnerCleared(tokenId, true);
+        }
+        _crossSpaceCall.callEVM(
+            _evmContractAddress,
+            abi.encodeWithSignature(
+                "mint(bytes20,uint256)",
+                ownerEvmAddress,
+                tokenId
+            )
+        );
+        _mint(ownerCoreAddress, tokenId);
+    }
+
+    // mints several tokens of one batch with a single callEVM
+    function batchMint(
+        uint128 batchNbr,
+        MintRequest[] memory requests
+    ) public returns (uint256[] memory tokenIds) {
+        tokenIds = new uint256[](requests.length);
+        address[] memory ownerCoreAddresses = new address[](requests.length);
+        bytes20[] memory ownerEvmAddresses = new bytes20[](requests.length);
+        for (uint256 i = 0; i < requests.length; i++) {
+            (tokenIds[i], ownerCoreAddresses[i], ownerEvmAddresses[i]) = _prepareMint(
+                batchNbr,
+                requests[i]
+            );
+        }
+        _batchMintPrepared(tokenIds, ownerCoreAddresses, ownerEvmAddresses);
+    }
+
+    function batchMintWithProof(
+        uint128 batchNbr,
+        MintRequest[] memory requests,
+        MintPermissionProof[] memory permissionProofs
+    ) public returns (uint256[] memory tokenIds) {
+        require(requests.length == permissionProofs.length, "request and proof array must have same length");
+        tokenIds = new uint256[](requests.length);
+        address[] memory ownerCoreAddresses = new address[](requests.length);
+        bytes20[] memory ownerEvmAddresses = new bytes20[](requests.length);
+        for (uint256 i = 0; i < requests.length; i++) {
+            (tokenIds[i], ownerCoreAddresses[i], ownerEvmAddresses[i]) = _prepareMintWithProof(
+                batchNbr,
+                requests[i],
+                permissionProofs[i]
+            );
+        }
+        _batchMintPrepared(tokenIds, ownerCoreAddresses, ownerEvmAddresses);
+    }
+
+    function _batchMintPrepared(
+        uint256[] memory tokenIds,
+        address[] memory ownerCoreAddresses,
+        bytes20[] memory ownerEvmAddresses
+    ) internal {
+        bool[] memory transferables = new bool[](tokenIds.length);
+        for (uint256 i = 0; i < tokenIds.length; i++) {
+            transferables[i] = ownerCoreAddresses[i] == address(this);
+            if (ownerEvmAddresses[i] == _evmContractAddress) {
+                _setEvmOwnerCleared(tokenIds[i], true);
+            }
+        }
+        _crossSpaceCall.callEVM(
+            _evmContractAddress,
+            abi.encodeWithSignature(
+                "batchMint(bytes20[],uint256[],bool[])",
+                ownerEvmAddresses,
+                tokenIds,
+                transferables
+            )
+        );
+        for (uint256 i = 0; i < tokenIds.length; i++) {
+            _mint(ownerCoreAddresses[i], tokenIds[i]);
+        }
+    }
+
+    // checks and consumes the mint permission, returns token id and resolved owners
+    function _prepareMint(
+        uint128 batchNbr,
+        MintRequest memory request
+    ) internal returns (uint256, address, bytes20) {
+        PackedMintSetting storage setting = _activeMintSetting(batchNbr);
+        bytes32 usernameHash = keccak256(abi.encodePacked(request.username));
 
         // check mint permission
         uint8 rarity = _authorizedRarityMintPermission[batchNbr][usernameHash];
         require(rarity != 0, "no permission to mint");
         delete _authorizedRarityMintPermission[batchNbr][usernameHash];
 
+        return _prepareAuthorizedMint(setting, batchNbr, usernameHash, rarity, request);
+    }
+
+    function _prepareMintWithProof(
+        uint128 batchNbr,
+        MintRequest memory request,
+        MintPermissionProof memory permissionProof
+    ) internal returns (uint256, address, bytes20) {
+        PackedMintSetting storage setting = _activeMintSetting(batchNbr);
+        bytes32 usernameHash = keccak256(abi.encodePacked(request.username));
+        _claimMintPermission(batchNbr, usernameHash, permissionProof);
+        return _prepareAuthorizedMint(setting, batchNbr, usernameHash, permissionProof.rarity, request);
+    }
+
+    function _activeMintSetting(
+        uint128 batchNbr
+    ) internal returns (PackedMintSetting storage setting) {
+        setting = _migrateMintSetting(batchNbr);
+        require(
+            setting.expiration > block.number,
+            "no available mint oracle at present"
+        );
+    }
+
+    function _prepareAuthorizedMint(
+        PackedMintSetting storage setting,
+        uint128 batchNbr,
+        bytes32 usernameHash,
+        uint8 rarity,
+        MintRequest memory request
+    ) internal returns (uint256 tokenId, address ownerCoreAddress, bytes20 ownerEvmAddress) {
         require(
             ecrecover(
                 // hash to sign. cannot be replayed, or replay will not bring benefit
@@ -206,23 +604,25 @@ contract DualSpaceNFTCore is
                     abi.encodePacked(
                         batchNbr,
                         usernameHash,
-                        ownerCoreAddress,
-                        ownerEvmAddress
+                        request.ownerCoreAddress,
+                        request.ownerEvmAddress
                     )
                 ),
-                oracleSignature.v,
-                oracleSignature.r,
-                oracleSignature.s
-            ) == _mintSetting[batchNbr].oracleSigner,
+                request.oracleSignature.v,
+                request.oracleSignature.r,
+                request.oracleSignature.s
+            ) == setting.oracleSigner,
             "should be signed by oracle signer"
         );
 
-        _batchInternalIdCounter[batchNbr] += 1;
-        uint256 tokenId = _nextTokenId(
+        setting.internalIdCounter += 1;
+        tokenId = _nextTokenId(
             batchNbr,
             rarity,
-            _batchInternalIdCounter[batchNbr]
+            setting.internalIdCounter
         );
+        ownerCoreAddress = request.ownerCoreAddress;
+        ownerEvmAddress = request.ownerEvmAddress;
         // if mint to zero, mint to self
         if (ownerCoreAddress == address(0)) {
             ownerCoreAddress = address(this);
@@ -233,32 +633,21 @@ contract DualSpaceNFTCore is
         if (ownerCoreAddress == address(this) && ownerEvmAddress == _evmContractAddress) {
             revert("cannot clear both space owner when minting");
         }
-        // update transferable state
-        if (ownerCoreAddress == address(this)) {
-            _crossSpaceCall.callEVM(
-                _evmContractAddress,
-                abi.encodeWithSignature(
-                    "setTransferableTable(uint256,bool)",
-                    tokenId,
-                    true
-                )
-            );
-        }
-        _crossSpaceCall.callEVM(
-            _evmContractAddress,
-            abi.encodeWithSignature(
-                "mint(bytes20,uint256)",
-                ownerEvmAddress,
-                tokenId
-            )
-        );
-        _mint(ownerCoreAddress, tokenId);
-        return tokenId;
     }
 
     function getPrivilegeExpiration(
         uint256 tokenId
     ) public view override returns (uint256 exp) {
+        TokenMeta memory tokenMeta = _resolveTokenId(tokenId);
+        EvmBatchSetting memory setting = _evmBatchSetting[tokenMeta.batchNbr];
+        if (setting.startBlock != 0) {
+            // same expression as DualSpaceNFTEvm.getPrivilegeExpiration
+            return
+                setting.startBlock +
+                setting.ratio *
+                tokenMeta.rarity *
+                uint256(setting.baseExpirationBlockInterval);
+        }
         return
             uint256(
                 bytes32(
@@ -273,9 +662,60 @@ contract DualSpaceNFTCore is
             );
     }
 
+    // states of tokens in both spaces
+    // espace states are fetched by one staticCallEVM instead of one per token and per getter
+    function batchTokenState(
+        uint256[] memory tokenIds
+    )
+        public
+        view
+        returns (TokenState[] memory coreStates, TokenState[] memory evmStates)
+    {
+        evmStates = abi.decode(
+            _crossSpaceCall.staticCallEVM(
+                _evmContractAddress,
+                abi.encodeWithSignature(
+                    "batchTokenState(uint256[])",
+                    tokenIds
+                )
+            ),
+            (TokenState[])
+        );
+        coreStates = new TokenState[](tokenIds.length);
+        for (uint256 i = 0; i < tokenIds.length; i++) {
+            address tokenOwner = _ownerOf(tokenIds[i]);
+            if (tokenOwner == address(0)) {
+                continue;
+            }
+            coreStates[i] = TokenState(
+                tokenOwner,
+                evmStates[i].privilegeExpiration,
+                evmStates[i].privilegeExpired,
+                _tokenURI(tokenIds[i])
+            );
+        }
+    }
+
     function _isCoreTransferable(uint256 tokenId) internal view returns (bool) {
-        bytes20 currentEvmOwner = evmOwnerOf(tokenId);
-        return currentEvmOwner == _evmContractAddress;
+        return _isEvmOwnerCleared(tokenId) || evmOwnerOf(tokenId) == _evmContractAddress;
+    }
+
+    function _isEvmOwnerCleared(uint256 tokenId) internal view returns (bool) {
+        TokenMeta memory tokenMeta = _resolveTokenId(tokenId);
+        uint256 mask = uint256(1) << (tokenMeta.batchInternalId & 0xff);
+        return (_evmOwnerClearedBitmap[tokenMeta.batchNbr][tokenMeta.batchInternalId >> 8] & mask) != 0;
+    }
+
+    function _setEvmOwnerCleared(uint256 tokenId, bool cleared) internal {
+        TokenMeta memory tokenMeta = _resolveTokenId(tokenId);
+        uint256 mask = uint256(1) << (tokenMeta.batchInternalId & 0xff);
+        mapping(uint256 => uint256) storage bitmap = _evmOwnerClearedBitmap[tokenMeta.batchNbr];
+        uint256 word = bitmap[tokenMeta.batchInternalId >> 8];
+        uint256 updated = cleared ? word | mask : word & ~mask;
+        // unchanged words are not written, most set / clear calls keep the state of the bit
+        if (updated != word) {
+            bitmap[tokenMeta.batchInternalId >> 8] = updated;
+        }
     }
 
     function evmOwnerOf(uint256 tokenId) public view returns (bytes20) {
@@ -314,7 +754,41 @@ contract DualSpaceNFTCore is
         _setEvmOwner(tokenId, ownerEvmAddress);
     }
 
+    function batchClearEvmOwner(uint256[] memory tokenIds) public {
+        bytes20[] memory ownerEvmAddresses = new bytes20[](tokenIds.length);
+        for (uint256 i = 0; i < tokenIds.length; i++) {
+            ownerEvmAddresses[i] = _evmContractAddress;
+        }
+        batchSetEvmOwner(tokenIds, ownerEvmAddresses);
+    }
+
+    // setEvmOwner for several tokens with a single callEVM
+    function batchSetEvmOwner(
+        uint256[] memory tokenIds,
+        bytes20[] memory ownerEvmAddresses
+    ) public {
+        require(tokenIds.length == ownerEvmAddresses.length, "token id and owner array must have same length");
+        for (uint256 i = 0; i < tokenIds.length; i++) {
+            require(
+                msg.sender == ownerOf(tokenIds[i]),
+                "caller is not core token owner"
+            );
+        }
+        for (uint256 i = 0; i < tokenIds.length; i++) {
+            _setEvmOwnerCleared(tokenIds[i], ownerEvmAddresses[i] == _evmContractAddress);
+        }
+        _crossSpaceCall.callEVM(
+            _evmContractAddress,
+            abi.encodeWithSignature(
+                "batchSetEvmOwner(uint256[],bytes20[])",
+                tokenIds,
+                ownerEvmAddresses
+            )
+        );
+    }
+
     function _setEvmOwner(uint256 tokenId, bytes20 ownerEvmAddress) internal {
+        _setEvmOwnerCleared(tokenId, ownerEvmAddress == _evmContractAddress);
         _crossSpaceCall.callEVM(
             _evmContractAddress,
             abi.encodeWithSignature(
@@ -367,6 +841,45 @@ contract DualSpaceNFTCore is
         super.safeTransferFrom(from, to, tokenId);
     }
 
+    // safeTransferFrom for several tokens, evm owners are checked with a single staticCallEVM
+    function batchSafeTransferFrom(
+        address from,
+        address to,
+        uint256[] memory tokenIds
+    ) public {
+        if (to != address(this) && !_areEvmOwnersCleared(tokenIds)) {
+            address[] memory evmOwners = abi.decode(
+                _crossSpaceCall.staticCallEVM(
+                    _evmContractAddress,
+                    abi.encodeWithSignature(
+                        "batchOwnerOf(uint256[])",
+                        tokenIds
+                    )
+                ),
+                (address[])
+            );
+            for (uint256 i = 0; i < tokenIds.length; i++) {
+                require(
+                    bytes20(evmOwners[i]) == _evmContractAddress,
+                    "This token is not transferable because its evm space owner is set. Clear evm space owner and try again"
+                );
+            }
+        }
+        for (uint256 i = 0; i < tokenIds.length; i++) {
+            require(_isApprovedOrOwner(msg.sender, tokenIds[i]), "ERC721: caller is not token owner or approved");
+            _safeTransfer(from, to, tokenIds[i], "");
+        }
+    }
+
+    function _areEvmOwnersCleared(uint256[] memory tokenIds) internal view returns (bool) {
+        for (uint256 i = 0; i < tokenIds.length; i++) {
+            if (!_isEvmOwnerCleared(tokenIds[i])) {
+                return false;
+            }
+        }
+        return true;
+    }
+
     function _transfer(
         address from,
         address to,
@@ -12,17 +12,20 @@ import "./DualSpaceGeneral.sol";
 // finally bind from core (bind from core->espace)
 contract DualSpaceNFTEvm is DualSpaceGeneral {
     address _coreContractMappingAddress;
-    // the token should be able to move directly at espace only if the core space owner is not set
-    // or after
-    mapping(uint256 => bool) _evmTransferable;
+    // packed into the slot of _coreContractMappingAddress, set once migrateLegacyStorage is finished
+    // (or on initialize) so the legacy mappings are not read anymore
+    bool _legacyStorageMigrated;
+    // legacy, moved to _evmTransferableBitmap
+    mapping(uint256 => bool) _legacyEvmTransferable;
 
+    // legacy layout of the batch setting, kept for the upgradeable storage layout
     struct ExpirationSetting {
         uint startBlock;
         uint8 ratio;
     }
 
-    // token batch setting is placed at espace for dual space visit
-    mapping(uint128 => ExpirationSetting) _batchExpirationSetting;
+    // legacy, moved to _batchSetting
+    mapping(uint128 => ExpirationSetting) _legacyBatchExpirationSetting;
     uint _baseExpirationBlockInterval;
 
     // name_ and symbol_ should be same as core side
@@ -34,6 +37,7 @@ contract DualSpaceNFTEvm is DualSpaceGeneral {
         __ERC721_init(name_, symbol_);
         _coreContractMappingAddress = _coreContractMappingAddress_;
         _baseExpirationBlockInterval = 30 days * 2; // 2 block per second
+        _legacyStorageMigrated = true;
     }
 
     function _authorizeUpgrade(address newImplementation) internal override fromCore() {
@@ -53,14 +57,53 @@ contract DualSpaceNFTEvm is DualSpaceGeneral {
         _mint(address(ownerEvmAddress), tokenId);
     }
 
+    function batchMint(
+        bytes20[] memory ownerEvmAddresses,
+        uint256[] memory tokenIds,
+        bool[] memory transferables
+    ) public fromCore {
+        for (uint256 i = 0; i < tokenIds.length; i++) {
+            if (transferables[i]) {
+                _setEvmTransferable(tokenIds[i], true);
+            }
+            _mint(address(ownerEvmAddresses[i]), tokenIds[i]);
+        }
+    }
+
     string public baseURI = "";
 
+    // storage appended after the legacy layout
+
+    // ExpirationSetting in one slot
+    struct BatchSetting {
+        uint64 startBlock;
+        uint8 ratio;
+    }
+
+    // token batch setting is placed at espace for dual space visit
+    mapping(uint128 => BatchSetting) _batchSetting;
+    // the token should be able to move directly at espace only if the core space owner is not set
+    // or after
+    // batchNbr => batchInternalId / 256 => transferable bits, tokens minted together share a slot
+    mapping(uint128 => mapping(uint256 => uint256)) _evmTransferableBitmap;
+    OwnerTokenIndex _ownerTokens;
+
+    function _ownerTokenIndex() internal view override returns (OwnerTokenIndex storage) {
+        return _ownerTokens;
+    }
+
+    // see DualSpaceNFTCore.indexTokens
+    function indexTokens(uint256[] memory tokenIds) public fromCore {
+        _indexTokens(tokenIds);
+    }
+
     function _baseURI() internal view override returns (string memory) {
         return baseURI;
     }
 
     function setBaseURI(string memory baseURI_) external fromCore {
         baseURI = baseURI_;
+        emit BaseURIChange(baseURI_);
     }
 
     function resolveTokenId(
@@ -75,9 +118,7 @@ contract DualSpaceNFTEvm is DualSpaceGeneral {
         uint256 tokenId
     ) public view override returns (uint256 exp) {
         TokenMeta memory tokenMeta = _resolveTokenId(tokenId);
-        ExpirationSetting memory expSetting = _batchExpirationSetting[
-            tokenMeta.batchNbr
-        ];
+        BatchSetting memory expSetting = _batchSettingOf(tokenMeta.batchNbr);
         exp =
             expSetting.startBlock +
             expSetting.ratio *
@@ -85,12 +126,76 @@ contract DualSpaceNFTEvm is DualSpaceGeneral {
             _baseExpirationBlockInterval;
     }
 
-    function startBatch(uint128 batchNbr, uint8 ratio) public fromCore {
-        _batchExpirationSetting[batchNbr] = ExpirationSetting(
-            block.number,
+    // aggregated view of ownerOf / getPrivilegeExpiration / isPrivilegeExpired / tokenURI
+    function batchTokenState(
+        uint256[] memory tokenIds
+    ) public view returns (TokenState[] memory states) {
+        states = new TokenState[](tokenIds.length);
+        for (uint256 i = 0; i < tokenIds.length; i++) {
+            address tokenOwner = _ownerOf(tokenIds[i]);
+            if (tokenOwner == address(0)) {
+                continue;
+            }
+            uint256 exp = getPrivilegeExpiration(tokenIds[i]);
+            states[i] = TokenState(
+                tokenOwner,
+                exp,
+                block.number > exp,
+                _tokenURI(tokenIds[i])
+            );
+        }
+    }
+
+    // view of the batch setting for batches not migrated yet
+    function _batchSettingOf(
+        uint128 batchNbr
+    ) internal view returns (BatchSetting memory setting) {
+        setting = _batchSetting[batchNbr];
+        if (!_legacyStorageMigrated && setting.startBlock == 0) {
+            ExpirationSetting memory legacySetting = _legacyBatchExpirationSetting[batchNbr];
+            setting = BatchSetting(uint64(legacySetting.startBlock), legacySetting.ratio);
+        }
+    }
+
+    // returns what DualSpaceNFTCore mirrors to compute expirations without staticCallEVM
+    function startBatch(
+        uint128 batchNbr,
+        uint8 ratio
+    ) public fromCore returns (uint256 startBlock, uint256 baseExpirationBlockInterval) {
+        _batchSetting[batchNbr] = BatchSetting(
+            uint64(block.number),
             ratio
         );
         emit BatchStart(block.number, batchNbr, ratio);
+        return (block.number, _baseExpirationBlockInterval);
+    }
+
+    // see DualSpaceNFTCore.migrateLegacyStorage
+    function migrateLegacyStorage(
+        uint128[] memory batchNbrs,
+        uint256[] memory transferableTokenIds,
+        bool finished
+    ) public fromCore {
+        require(!_legacyStorageMigrated, "legacy storage already migrated");
+        for (uint256 i = 0; i < batchNbrs.length; i++) {
+            ExpirationSetting memory legacySetting = _legacyBatchExpirationSetting[batchNbrs[i]];
+            if (_batchSetting[batchNbrs[i]].startBlock == 0 && legacySetting.startBlock != 0) {
+                _batchSetting[batchNbrs[i]] = BatchSetting(
+                    uint64(legacySetting.startBlock),
+                    legacySetting.ratio
+                );
+            }
+            delete _legacyBatchExpirationSetting[batchNbrs[i]];
+        }
+        for (uint256 i = 0; i < transferableTokenIds.length; i++) {
+            if (_legacyEvmTransferable[transferableTokenIds[i]]) {
+                _setEvmTransferable(transferableTokenIds[i], true);
+                delete _legacyEvmTransferable[transferableTokenIds[i]];
+            }
+        }
+        if (finished) {
+            _legacyStorageMigrated = true;
+        }
     }
 
     // Indeed, this is not a "transfer" action
@@ -105,15 +210,53 @@ contract DualSpaceNFTEvm is DualSpaceGeneral {
         _transfer(ownerOf(tokenId), address(ownerEvmAddress), tokenId);
     }
 
+    function batchSetEvmOwner(
+        uint256[] memory tokenIds,
+        bytes20[] memory ownerEvmAddresses
+    ) public fromCore {
+        for (uint256 i = 0; i < tokenIds.length; i++) {
+            _transfer(ownerOf(tokenIds[i]), address(ownerEvmAddresses[i]), tokenIds[i]);
+        }
+    }
+
+    // zero address for tokens not minted
+    function batchOwnerOf(
+        uint256[] memory tokenIds
+    ) public view returns (address[] memory owners) {
+        owners = new address[](tokenIds.length);
+        for (uint256 i = 0; i < tokenIds.length; i++) {
+            owners[i] = _ownerOf(tokenIds[i]);
+        }
+    }
+
     function setTransferableTable(
         uint256 tokenId,
         bool transferable
     ) public fromCore {
-        _evmTransferable[tokenId] = transferable;
+        _setEvmTransferable(tokenId, transferable);
+    }
+
+    function _setEvmTransferable(uint256 tokenId, bool transferable) internal {
+        TokenMeta memory tokenMeta = _resolveTokenId(tokenId);
+        uint256 mask = uint256(1) << (tokenMeta.batchInternalId & 0xff);
+        mapping(uint256 => uint256) storage bitmap = _evmTransferableBitmap[tokenMeta.batchNbr];
+        if (transferable) {
+            bitmap[tokenMeta.batchInternalId >> 8] |= mask;
+        } else {
+            bitmap[tokenMeta.batchInternalId >> 8] &= ~mask;
+            if (!_legacyStorageMigrated && _legacyEvmTransferable[tokenId]) {
+                delete _legacyEvmTransferable[tokenId];
+            }
+        }
     }
 
     function _isEvmTransferable(uint256 tokenId) internal view returns (bool) {
-        return _evmTransferable[tokenId];
+        TokenMeta memory tokenMeta = _resolveTokenId(tokenId);
+        uint256 mask = uint256(1) << (tokenMeta.batchInternalId & 0xff);
+        if ((_evmTransferableBitmap[tokenMeta.batchNbr][tokenMeta.batchInternalId >> 8] & mask) != 0) {
+            return true;
+        }
+        return !_legacyStorageMigrated && _legacyEvmTransferable[tokenId];
     }
 
     function safeTransferFrom(
@@ -129,4 +272,14 @@ contract DualSpaceNFTEvm is DualSpaceGeneral {
         }
         super.safeTransferFrom(from, to, tokenId);
     }
+
+    function batchSafeTransferFrom(
+        address from,
+        address to,
+        uint256[] memory tokenIds
+    ) public {
+        for (uint256 i = 0; i < tokenIds.length; i++) {
+            safeTransferFrom(from, to, tokenIds[i]);
+        }
+    }
 }
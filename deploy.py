@@ -2,8 +2,13 @@ from conflux_web3 import Web3 as ConfluxWeb3
 from web3 import Web3
 from web3.middleware.signing import construct_sign_and_send_raw_middleware
 
-import os, json, dotenv
-from typing import Any, TypedDict
+import os, dotenv
+
+from scripts.artifacts import registry
+from scripts.instrumentation import export_from_env
+from scripts.providers import make_provider
+from scripts.receipt_pool import CORE_RECEIPT_METHOD, EVM_RECEIPT_METHOD
+from scripts.deploy_graph import DeploymentGraph, SpaceConfig, Step
 
 dotenv.load_dotenv()
 
@@ -13,28 +18,15 @@ def get_sk() -> str:
 
 
 def get_e_web3() -> Web3:
-    return Web3(Web3.HTTPProvider(os.environ["EVM_URL"]))
+    return Web3(make_provider(os.environ["EVM_URL"]))
 
 
 def get_c_web3() -> ConfluxWeb3:
-    return ConfluxWeb3(ConfluxWeb3.HTTPProvider(os.environ["CORE_URL"]))
-
-
-class Metadata(TypedDict):
-    abi: Any
-    bytecode: Any
-
-
-def get_metadata(name: str) -> Metadata:
-    with open(f"build/contracts/{name}.json") as f:
-        d = json.load(f)
-        return {
-            "abi": d["abi"],
-            "bytecode": d["bytecode"]
-        }
+    return ConfluxWeb3(make_provider(os.environ["CORE_URL"]))
 
 
 def main():
+    export_from_env()
     c_web3 = get_c_web3()
     e_web3 = get_e_web3()
     c_web3.cfx.default_account = c_web3.account.from_key(get_sk())
@@ -48,46 +40,91 @@ def main():
     symbol = os.environ["CORE_CONTRACT_SYMBOL"]
     default_oracle_life = int(os.environ["DEFAULT_ORACLE_LIFE"])
 
-    DualSpaceNFTCore = c_web3.cfx.contract(**get_metadata("DualSpaceNFTCore"))
-    DualSpaceNFTEvm = e_web3.eth.contract(**get_metadata("DualSpaceNFTEvm"))
-    DeploymentProxyCore = c_web3.cfx.contract(**get_metadata("DeploymentProxy"))
-    DeploymentProxyEvm = e_web3.eth.contract(**get_metadata("DeploymentProxy"))
+    DualSpaceNFTCore = registry.contract(c_web3, "DualSpaceNFTCore")
+    DualSpaceNFTEvm = registry.contract(e_web3, "DualSpaceNFTEvm")
+    DeploymentProxyCore = registry.contract(c_web3, "DeploymentProxy")
+    DeploymentProxyEvm = registry.contract(e_web3, "DeploymentProxy")
     espace_chain_id = e_web3.eth.chain_id
     
+    evm_tx = {"gasPrice": 2 * 10 **10}
+
+    # independent steps are sent together, core space and espace steps run concurrently
+    steps = [
+        Step(
+            "core_impl", "core",
+            lambda results, tx: DualSpaceNFTCore.constructor().transact(tx),
+            result=lambda receipt, results: receipt["contractCreated"],
+        ),
+        Step(
+            "evm_impl", "evm",
+            lambda results, tx: DualSpaceNFTEvm.constructor().transact({**evm_tx, **tx}),
+            result=lambda receipt, results: Web3.to_checksum_address(receipt["contractAddress"]),
+        ),
+        Step(
+            "core_proxy", "core",
+            lambda results, tx: DeploymentProxyCore.constructor(results["core_impl"], "0x").transact(tx),
+            deps=("core_impl",),
+            result=lambda receipt, results: receipt["contractCreated"],
+        ),
+        Step(
+            "evm_proxy", "evm",
+            lambda results, tx: DeploymentProxyEvm.constructor(results["evm_impl"], "0x").transact({**evm_tx, **tx}),
+            deps=("evm_impl",),
+            result=lambda receipt, results: Web3.to_checksum_address(receipt["contractAddress"]),
+        ),
+        Step(
+            "core_initialize", "core",
+            lambda results, tx: DualSpaceNFTCore(results["core_proxy"]).functions.initialize(
+                name, symbol, results["evm_proxy"], csc_address, espace_chain_id, default_oracle_life
+            ).transact(tx),
+            deps=("core_proxy", "evm_proxy"),
+        ),
+        Step(
+            "evm_initialize", "evm",
+            lambda results, tx: DualSpaceNFTEvm(results["evm_proxy"]).functions.initialize(
+                name, symbol, c_web3.address.calculate_mapped_evm_space_address(results["core_proxy"])
+            ).transact({**evm_tx, **tx}),
+            deps=("core_proxy", "evm_proxy"),
+        ),
+        Step(
+            "sponsor_privilege", "core",
+            lambda results, tx: sponsor_whitelist_control.functions.addPrivilegeByAdmin(
+                results["core_proxy"], [c_web3.address.zero_address()]
+            ).transact(tx),
+            deps=("core_proxy",),
+        ),
+        Step(
+            "sponsor_collateral", "core",
+            lambda results, tx: sponsor_whitelist_control.functions.setSponsorForCollateral(
+                results["core_proxy"]
+            ).transact({**tx, "value": 5 * 10**19}),
+            deps=("core_proxy",),
+        ),
+        Step(
+            "sponsor_gas", "core",
+            lambda results, tx: sponsor_whitelist_control.functions.setSponsorForGas(
+                results["core_proxy"], 10**16
+            ).transact({**tx, "value": 10**19}),
+            deps=("core_proxy",),
+        ),
+    ]
+    spaces = {
+        "core": SpaceConfig(
+            os.environ["CORE_URL"], CORE_RECEIPT_METHOD,
+            lambda: c_web3.cfx.get_next_nonce(c_web3.cfx.default_account),
+        ),
+        "evm": SpaceConfig(
+            os.environ["EVM_URL"], EVM_RECEIPT_METHOD,
+            lambda: e_web3.eth.get_transaction_count(e_account.address, "pending"),
+        ),
+    }
+
     print(f"deploying...")
-    core_impl_addr = DualSpaceNFTCore.constructor().transact().executed()["contractCreated"]
-    print(f"core contract impl deployed at {core_impl_addr}")
-    core_contract = DualSpaceNFTCore(DeploymentProxyCore.constructor(core_impl_addr, "0x").transact().executed()["contractCreated"])
-    print(f"core contract proxy deployed at {core_contract.address}")
-    
-    evm_impl_addr = e_web3.eth.wait_for_transaction_receipt(DualSpaceNFTEvm.constructor().transact({
-        "gasPrice": 2 * 10 **10
-    }))["contractAddress"]
-    print(f"evm contract impl deployed at {evm_impl_addr}")
-    evm_contract = DualSpaceNFTEvm(e_web3.eth.wait_for_transaction_receipt(DeploymentProxyEvm.constructor(evm_impl_addr, "0x").transact({
-        "gasPrice": 2 * 10 **10
-    }))["contractAddress"])
-    print(f"evm contract proxy deployed at {evm_contract.address}")
-    
-    print("initializing contracts...")
-    mapped_address = c_web3.address.calculate_mapped_evm_space_address(core_contract.address)
-    evm_contract.functions.initialize(
-        name, symbol, mapped_address
-    ).transact({
-        "gasPrice": 2 * 10 **10
-    })
-    core_contract.functions.initialize(
-        name, symbol, evm_contract.address, csc_address, espace_chain_id, default_oracle_life
-    ).transact().executed()
-    
-    print("setting sponsor...")
-    sponsor_whitelist_control.functions.addPrivilegeByAdmin(core_contract.address, [c_web3.address.zero_address()]).transact().executed()
-    sponsor_whitelist_control.functions.setSponsorForCollateral(core_contract.address).transact({
-        "value": 5 * 10**19
-    }).executed()
-    sponsor_whitelist_control.functions.setSponsorForGas(core_contract.address, 10**16).transact({
-        "value": 10**19
-    }).executed()
+    results = DeploymentGraph(steps, spaces, os.environ.get("DEPLOY_MANIFEST", "deployment.json")).run()
+    print(f"core contract impl deployed at {results['core_impl']}")
+    print(f"core contract proxy deployed at {results['core_proxy']}")
+    print(f"evm contract impl deployed at {results['evm_impl']}")
+    print(f"evm contract proxy deployed at {results['evm_proxy']}")
 
 if __name__ == "__main__":
     main()
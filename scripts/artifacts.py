@@ -0,0 +1,183 @@
+"""
+contract artifact registry
+
+brownie artifacts in `build/contracts` carry ast, source maps and sources next to abi and bytecode.
+the registry extracts only abi and bytecode (streamed with `ijson` when it is installed),
+caches them with function selectors and event topics in `build/.artifact-cache` keyed by the artifact hash,
+and builds contract factories lazily.
+
+    DualSpaceNFTCore = registry.contract(c_w3, "DualSpaceNFTCore")
+    core_contract = registry.contract(c_w3, "DualSpaceNFTCore", address)
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, TypedDict
+
+from eth_utils import keccak
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+BUILD_DIR = "build/contracts"
+CACHE_DIR = "build/.artifact-cache"
+CACHE_VERSION = 1
+
+
+class Metadata(TypedDict):
+    abi: Any
+    bytecode: Any
+
+
+@dataclass(frozen=True)
+class Artifact:
+    name: str
+    abi: List[Dict[str, Any]]
+    bytecode: str
+    # "mint(bytes20,uint256)" => "0x..."
+    selectors: Dict[str, str]
+    # "Transfer(address,address,uint256)" => "0x..."
+    topics: Dict[str, str]
+
+    def metadata(self) -> Metadata:
+        return {"abi": self.abi, "bytecode": self.bytecode}
+
+
+def _canonical_type(param: Dict[str, Any]) -> str:
+    type_ = param["type"]
+    if type_.startswith("tuple"):
+        components = ",".join(_canonical_type(c) for c in param["components"])
+        return f"({components}){type_[len('tuple'):]}"
+    return type_
+
+
+def _signature(item: Dict[str, Any]) -> str:
+    return f"{item['name']}({','.join(_canonical_type(p) for p in item.get('inputs', []))})"
+
+
+def _hashes(abi: List[Dict[str, Any]]) -> Tuple[Dict[str, str], Dict[str, str]]:
+    selectors = {}
+    topics = {}
+    for item in abi:
+        if item.get("type") == "function":
+            selectors[_signature(item)] = "0x" + keccak(text=_signature(item))[:4].hex()
+        elif item.get("type") == "event":
+            topics[_signature(item)] = "0x" + keccak(text=_signature(item)).hex()
+    return selectors, topics
+
+
+def _parse(path: str) -> Tuple[Any, Any]:
+    """
+    returns (abi, bytecode) without materializing the other fields if ijson is available
+    """
+    if ijson is None:
+        with open(path) as f:
+            d = json.load(f)
+        return d["abi"], d["bytecode"]
+    found: Dict[str, Any] = {}
+    current: Optional[str] = None
+    builder: Any = None
+    with open(path, "rb") as f:
+        for prefix, event, value in ijson.parse(f):
+            if current is not None:
+                builder.event(event, value)
+                if prefix == current and event in ("end_map", "end_array"):
+                    found[current] = builder.value
+                    current = None
+            elif prefix in ("abi", "bytecode"):
+                if event in ("start_map", "start_array"):
+                    current = prefix
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+                else:
+                    found[prefix] = value
+            if len(found) == 2:
+                break
+    return found["abi"], found["bytecode"]
+
+
+class ArtifactRegistry:
+    def __init__(self, build_dir: str = BUILD_DIR, cache_dir: Optional[str] = CACHE_DIR):
+        self.build_dir = build_dir
+        self.cache_dir = cache_dir
+        # name => ((mtime, size), artifact)
+        self._artifacts: Dict[str, Tuple[Tuple[int, int], Artifact]] = {}
+        # (id(w3), name) => contract factory
+        self._factories: Dict[Tuple[int, str], Any] = {}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.build_dir, f"{name}.json")
+
+    def artifact(self, name: str) -> Artifact:
+        path = self._path(name)
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        memo = self._artifacts.get(name)
+        if memo is not None and memo[0] == stamp:
+            return memo[1]
+        artifact = self._load(name, path)
+        self._artifacts[name] = (stamp, artifact)
+        # factories built from a stale artifact
+        self._factories = {k: v for k, v in self._factories.items() if k[1] != name}
+        return artifact
+
+    def _load(self, name: str, path: str) -> Artifact:
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        cache_path = (
+            os.path.join(self.cache_dir, f"{name}-{digest[:16]}.json") if self.cache_dir else None
+        )
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path) as f:
+                cached = json.load(f)
+            if cached.get("version") == CACHE_VERSION:
+                return Artifact(name, cached["abi"], cached["bytecode"], cached["selectors"], cached["topics"])
+        abi, bytecode = _parse(path)
+        selectors, topics = _hashes(abi)
+        if cache_path:
+            os.makedirs(self.cache_dir, exist_ok=True)  # type: ignore
+            tmp = f"{cache_path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(
+                    {
+                        "version": CACHE_VERSION,
+                        "abi": abi,
+                        "bytecode": bytecode,
+                        "selectors": selectors,
+                        "topics": topics,
+                    },
+                    f,
+                    separators=(",", ":"),
+                )
+            os.replace(tmp, cache_path)
+        return Artifact(name, abi, bytecode, selectors, topics)
+
+    def metadata(self, name: str) -> Metadata:
+        return self.artifact(name).metadata()
+
+    def contract(self, w3: Any, name: str, address: Any = None) -> Any:
+        """
+        returns the contract factory of `name` for a `web3.Web3` or `conflux_web3.Web3` client,
+        or the contract at `address` if specified
+        """
+        artifact = self.artifact(name)
+        key = (id(w3), name)
+        factory = self._factories.get(key)
+        if factory is None:
+            # conflux_web3 clients expose contracts under `cfx`
+            module = w3.cfx if hasattr(w3, "cfx") else w3.eth
+            factory = self._factories[key] = module.contract(**artifact.metadata())
+        if address is None:
+            return factory
+        return factory(address)
+
+
+registry = ArtifactRegistry()
+
+
+def get_metadata(name: str) -> Metadata:
+    return registry.metadata(name)
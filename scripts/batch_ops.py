@@ -0,0 +1,136 @@
+"""
+helpers driving the batch entry points of `DualSpaceNFTCore`
+
+`batchMint`, `batchSetEvmOwner` / `batchClearEvmOwner` and `batchSafeTransferFrom` coalesce the espace side
+of many tokens into one `callEVM` (or `staticCallEVM`). the helpers split the input into chunks,
+estimate each chunk and submit them through `PipelinedSender`.
+
+    operator = BatchOperator(c_w3, core_contract)
+    with MintSigner(oracle_key) as signer:
+        operator.mint(batch_nbr, requests, signer)
+    operator.sender.flush()
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from scripts.merkle_permission import MerkleIndex
+from scripts.mint_signer import MintRequest, MintSigner, ZERO_ADDRESS
+from scripts.tx_pipeline import CoreSpace, PendingTransaction, PipelinedSender
+
+
+def _chunks(items: Sequence[Any], size: int) -> Iterable[Sequence[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _hex_address(address: Any) -> str:
+    if address is None:
+        return ZERO_ADDRESS
+    return getattr(address, "hex_address", address)
+
+
+class BatchOperator:
+    """
+    chunk_size: tokens per transaction, the espace payload of a chunk is carried by one callEVM
+    """
+
+    def __init__(
+        self,
+        c_w3: Any,
+        core_contract: Any,
+        sender: Optional[PipelinedSender] = None,
+        chunk_size: int = 50,
+    ):
+        self.c_w3 = c_w3
+        self.core_contract = core_contract
+        self.sender = sender or PipelinedSender(CoreSpace(c_w3), c_w3.cfx.default_account)
+        self.chunk_size = chunk_size
+
+    def _submit(self, fn_name: str, args: List[Any]) -> PendingTransaction:
+        tx: Dict[str, Any] = {
+            "from": self.sender.sender,
+            "to": self.core_contract.address,
+            "data": self.core_contract.encodeABI(fn_name=fn_name, args=args),
+        }
+        estimate = self.c_w3.cfx.estimate_gas_and_collateral(tx)
+        tx.update({"gas": estimate["gasLimit"], "storageLimit": estimate["storageCollateralized"]})
+        return self.sender.submit(tx)
+
+    def mint(
+        self, batch_nbr: int, requests: Iterable[MintRequest], signer: MintSigner
+    ) -> List[PendingTransaction]:
+        """
+        usernames should already be authorized for `batch_nbr`
+        """
+        payloads = self._mint_payloads(requests, signer)
+        return [
+            self._submit("batchMint", [batch_nbr, list(chunk)])
+            for chunk in _chunks(payloads, self.chunk_size)
+        ]
+
+    def mint_with_proofs(
+        self, batch_nbr: int, requests: Iterable[MintRequest], signer: MintSigner, merkle_index: MerkleIndex
+    ) -> List[PendingTransaction]:
+        """
+        usernames should be in the tree whose root is the mint permission root of `batch_nbr`
+        """
+        requests = list(requests)
+        proofs = []
+        for r in requests:
+            proof = merkle_index.permission_proof(r.username)
+            if proof is None:
+                raise ValueError(f"{r.username} is not in the mint permission tree")
+            proofs.append(proof.to_args())
+        payloads = self._mint_payloads(requests, signer)
+        return [
+            self._submit(
+                "batchMintWithProof",
+                [batch_nbr, payloads[i : i + self.chunk_size], proofs[i : i + self.chunk_size]],
+            )
+            for i in range(0, len(payloads), self.chunk_size)
+        ]
+
+    def _mint_payloads(self, requests: Iterable[MintRequest], signer: MintSigner) -> List[Any]:
+        requests = list(requests)
+        signatures = signer.sign_many(requests)
+        return [
+            (
+                r.username,
+                # core owners are signed in hex form but encoded as core space addresses
+                r.core_owner if r.core_owner is not None else self.c_w3.address.zero_address(),
+                _hex_address(r.evm_owner),
+                tuple(signature),
+            )
+            for r, signature in zip(requests, signatures)
+        ]
+
+    def set_evm_owners(
+        self, token_ids: Sequence[int], evm_owners: Sequence[str]
+    ) -> List[PendingTransaction]:
+        """
+        the sender should own every token in core space
+        """
+        if len(token_ids) != len(evm_owners):
+            raise ValueError("token_ids and evm_owners must have same length")
+        return [
+            self._submit(
+                "batchSetEvmOwner",
+                [list(token_ids[i : i + self.chunk_size]), list(evm_owners[i : i + self.chunk_size])],
+            )
+            for i in range(0, len(token_ids), self.chunk_size)
+        ]
+
+    def clear_evm_owners(self, token_ids: Sequence[int]) -> List[PendingTransaction]:
+        return [
+            self._submit("batchClearEvmOwner", [list(chunk)])
+            for chunk in _chunks(token_ids, self.chunk_size)
+        ]
+
+    def transfer(self, from_: str, to: str, token_ids: Sequence[int]) -> List[PendingTransaction]:
+        """
+        tokens should have their evm owner cleared unless `to` is the core contract
+        """
+        return [
+            self._submit("batchSafeTransferFrom", [from_, to, list(chunk)])
+            for chunk in _chunks(token_ids, self.chunk_size)
+        ]
@@ -0,0 +1,139 @@
+"""
+batched token state reads through `batchTokenState`
+
+a single call on the core contract returns the states of both spaces
+(the espace side is fetched by one staticCallEVM), a call on the espace contract returns espace states.
+token ids are split into chunks which are read concurrently,
+a chunk that runs out of gas (e.g. exceeds the eth_call gas cap) is halved and retried,
+other errors are raised.
+
+    reader = CoreBatchReader(core_contract)
+    states = reader.read(token_ids)
+
+tokens of a holder are listed with `tokensOfOwner(owner, cursor, limit)` of either space,
+the first page returns the total and the other pages are read concurrently at the block of the first page:
+
+    token_ids = OwnerTokenPager(evm_contract).tokens_of(owner)
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Generic, List, NamedTuple, Optional, Sequence, Tuple, TypeVar
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+T = TypeVar("T")
+
+
+class TokenState(NamedTuple):
+    owner: Any
+    privilege_expiration: int
+    privilege_expired: bool
+    token_uri: str
+
+
+class DualTokenState(NamedTuple):
+    token_id: int
+    # None if the token is not minted
+    core: Optional[TokenState]
+    evm: Optional[TokenState]
+
+
+def _parse(raw: Sequence[Any]) -> Optional[TokenState]:
+    state = TokenState(*raw)
+    owner = getattr(state.owner, "hex_address", state.owner)
+    if int(owner, 16) == 0:
+        return None
+    return state
+
+
+def _is_gas_error(e: Exception) -> bool:
+    # "out of gas", "gas required exceeds allowance", "gas limit exceeds the cap", ...
+    return "gas" in str(e).lower()
+
+
+class _BatchReader(Generic[T]):
+    def __init__(self, contract: Any, chunk_size: int = 200, max_workers: int = 4):
+        self.contract = contract
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        # chunks are read by the executor threads
+        self._lock = threading.Lock()
+
+    def _call(self, token_ids: List[int]) -> List[T]:
+        raise NotImplementedError
+
+    def _read_chunk(self, token_ids: List[int]) -> List[T]:
+        try:
+            return self._call(token_ids)
+        except Exception as e:
+            if len(token_ids) == 1 or not _is_gas_error(e):
+                raise
+            half = len(token_ids) // 2
+            # later chunks start with the size which worked
+            with self._lock:
+                self.chunk_size = min(self.chunk_size, half)
+            return self._read_chunk(token_ids[:half]) + self._read_chunk(token_ids[half:])
+
+    def read(self, token_ids: Sequence[int]) -> List[T]:
+        token_ids = list(token_ids)
+        chunks = [
+            token_ids[i : i + self.chunk_size]
+            for i in range(0, len(token_ids), self.chunk_size)
+        ]
+        if len(chunks) <= 1:
+            return self._read_chunk(token_ids) if token_ids else []
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            results = executor.map(self._read_chunk, chunks)
+            return [state for chunk in results for state in chunk]
+
+
+class CoreBatchReader(_BatchReader[DualTokenState]):
+    def _call(self, token_ids: List[int]) -> List[DualTokenState]:
+        core_states, evm_states = self.contract.functions.batchTokenState(token_ids).call()
+        return [
+            DualTokenState(token_id, _parse(core), _parse(evm))
+            for token_id, core, evm in zip(token_ids, core_states, evm_states)
+        ]
+
+
+class EvmBatchReader(_BatchReader[Optional[TokenState]]):
+    def _call(self, token_ids: List[int]) -> List[Optional[TokenState]]:
+        return [_parse(raw) for raw in self.contract.functions.batchTokenState(token_ids).call()]
+
+
+class OwnerTokenPager:
+    """
+    the index of an owner is reordered when the owner sends a token,
+    so every page is read at the block (epoch for core space) of the first page
+    """
+
+    def __init__(self, contract: Any, page_size: int = 500, max_workers: int = 4):
+        self.contract = contract
+        self.page_size = page_size
+        self.max_workers = max_workers
+
+    def _head(self) -> int:
+        w3 = self.contract.w3
+        if hasattr(w3, "cfx"):
+            # core space state is only readable at executed epochs
+            return w3.cfx.epoch_number("latest_state")
+        return w3.eth.block_number
+
+    def page(self, owner: Any, cursor: int, limit: int, block_identifier: Optional[int] = None) -> Tuple[List[int], int]:
+        """
+        returns (token ids, total count of tokens of owner)
+        """
+        function = self.contract.functions.tokensOfOwner(owner, cursor, limit)
+        token_ids, total = function.call(block_identifier=block_identifier)
+        return list(token_ids), total
+
+    def tokens_of(self, owner: Any) -> List[int]:
+        block = self._head()
+        token_ids, total = self.page(owner, 0, self.page_size, block)
+        cursors = range(self.page_size, total, self.page_size)
+        if not cursors:
+            return token_ids
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            pages = executor.map(lambda cursor: self.page(owner, cursor, self.page_size, block)[0], cursors)
+            return token_ids + [token_id for page in pages for token_id in page]
@@ -0,0 +1,190 @@
+"""
+storage sweeper of expired batches
+
+a batch can be cleared once `expiration + defaultOracleBlockLife` is behind the core block number.
+the sweeper collects batch numbers from core `BatchStart` logs, keeps the clearable ones and frees
+- their mint settings (oracle signer, expiration, authorizer and merkle root) with `batchClearMintSetting`
+- the permissions of usernames that never minted with `clearMintPermissions`, usernames come from the
+  `username,rarity` csv files the batches were authorized with (`bulk_authorize`)
+
+usernames are filtered with `batchCheckMintPermission` first, minted usernames hold no storage anymore.
+chunks are sized from a gas estimation of a sample against the block gas limit and sent through `PipelinedSender`.
+freed storage returns its collateral to the sponsor (or sender) that paid it.
+
+usage (CORE_URL, SECRET_KEY and CORE_CONTRACT_ADDRESS from env):
+    python -m scripts.batch_sweeper --core-start 1000 --permissions 20230401=usernames.csv
+"""
+
+import argparse
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from eth_abi import decode
+
+from scripts.instrumentation import export_from_env
+from scripts.mint_signer import username_hash
+from scripts.ownership_indexer import BATCH_START_TOPIC, LogSource
+from scripts.tx_pipeline import CoreSpace, PendingTransaction, PipelinedSender
+
+
+def started_batches(source: LogSource, address: str, from_block: int, window: int = 1000) -> List[int]:
+    """
+    batch numbers of every `BatchStart` log emitted since `from_block`
+    """
+    batch_nbrs = set()
+    head = source.head()
+    for start in range(from_block, head + 1, window):
+        for log in source.get_logs(address, start, min(head, start + window - 1), [BATCH_START_TOPIC]):
+            _, batch_nbr, _ = decode(["uint256", "uint128", "uint8"], log.data)
+            batch_nbrs.add(batch_nbr)
+    return sorted(batch_nbrs)
+
+
+class BatchSweeper:
+    """
+    gas_fraction: fraction of the block gas limit a single chunk may use
+    """
+
+    def __init__(
+        self,
+        c_w3: Any,
+        core_contract: Any,
+        sender: Optional[PipelinedSender] = None,
+        gas_fraction: float = 0.4,
+        probe_size: int = 32,
+        max_chunk_size: int = 1000,
+        read_chunk_size: int = 1000,
+    ):
+        self.c_w3 = c_w3
+        self.core_contract = core_contract
+        self.sender = sender or PipelinedSender(CoreSpace(c_w3), c_w3.cfx.default_account)
+        self.gas_fraction = gas_fraction
+        self.probe_size = probe_size
+        self.max_chunk_size = max_chunk_size
+        self.read_chunk_size = read_chunk_size
+
+    def _tx(self, fn_name: str, args: List[Any]) -> Dict[str, Any]:
+        return {
+            "from": self.sender.sender,
+            "to": self.core_contract.address,
+            "data": self.core_contract.encodeABI(fn_name=fn_name, args=args),
+        }
+
+    def _estimate(self, fn_name: str, args: List[Any]) -> Dict[str, int]:
+        return self.c_w3.cfx.estimate_gas_and_collateral(self._tx(fn_name, args))  # type: ignore
+
+    def _latest_block(self) -> Dict[str, Any]:
+        return self.c_w3.cfx.get_block_by_epoch_number("latest_state")
+
+    def chunk_size_for(self, fn_name: str, args: Callable[[Sequence[Any]], List[Any]], sample: Sequence[Any]) -> int:
+        """
+        derives how many items fit in one transaction from a gas estimation of `sample`
+        """
+        if len(sample) < 2:
+            return 1
+        # estimation of a single item approximates the fixed cost of a transaction
+        base = self._estimate(fn_name, args(sample[:1]))["gasLimit"]
+        total = self._estimate(fn_name, args(sample))["gasLimit"]
+        per_item = max((total - base) / max(len(sample) - 1, 1), 1)
+        size = int((self._latest_block()["gasLimit"] * self.gas_fraction - base) / per_item)
+        return max(1, min(size, self.max_chunk_size))
+
+    def _submit_chunks(
+        self, fn_name: str, args: Callable[[Sequence[Any]], List[Any]], items: Sequence[Any]
+    ) -> List[PendingTransaction]:
+        if not items:
+            return []
+        size = self.chunk_size_for(fn_name, args, items[: self.probe_size])
+        pending = []
+        for i in range(0, len(items), size):
+            tx = self._tx(fn_name, args(items[i : i + size]))
+            estimate = self.c_w3.cfx.estimate_gas_and_collateral(tx)
+            tx.update({"gas": estimate["gasLimit"], "storageLimit": estimate["storageCollateralized"]})
+            pending.append(self.sender.submit(tx))
+        return pending
+
+    def clearable(self, batch_nbrs: Sequence[int]) -> Tuple[List[int], List[int]]:
+        """
+        returns (batches whose mint setting can be cleared, batches whose permissions can be cleared),
+        the second also holds batches whose mint setting is already cleared,
+        the permissions of those can only be cleared by the contract owner
+        """
+        life = self.core_contract.functions.getDefaultOracleBlockLife().call()
+        block_number = int(self._latest_block()["blockNumber"])
+        settings, permissions = [], []
+        for batch_nbr in batch_nbrs:
+            expiration = self.core_contract.functions.getMintSettingExpiration(batch_nbr).call()
+            # same condition as the contract, checked against the latest block
+            if expiration + life >= block_number:
+                continue
+            permissions.append(batch_nbr)
+            if expiration != 0:
+                settings.append(batch_nbr)
+        return settings, permissions
+
+    def stale_permissions(self, batch_nbr: int, usernames: Sequence[str]) -> List[bytes]:
+        """
+        hashes of the usernames still holding a mint permission
+        """
+        hashes = [username_hash(u) for u in usernames]
+        stale = []
+        for i in range(0, len(hashes), self.read_chunk_size):
+            chunk = hashes[i : i + self.read_chunk_size]
+            rarities = self.core_contract.functions.batchCheckMintPermission(batch_nbr, chunk).call()
+            stale.extend(h for h, rarity in zip(chunk, rarities) if rarity != 0)
+        return stale
+
+    def sweep(self, batch_nbrs: Sequence[int], usernames: Optional[Dict[int, List[str]]] = None) -> Dict[str, int]:
+        """
+        usernames: batch number => usernames the batch was authorized with
+        returns counts of cleared mint settings and permissions
+        """
+        settings, permissions = self.clearable(batch_nbrs)
+        pending = []
+        cleared_permissions = 0
+        for batch_nbr in permissions:
+            stale = self.stale_permissions(batch_nbr, (usernames or {}).get(batch_nbr, []))
+            pending += self._submit_chunks(
+                "clearMintPermissions", lambda chunk, b=batch_nbr: [b, list(chunk)], stale
+            )
+            cleared_permissions += len(stale)
+        # sent after the permissions (later nonces) so anyone can clear them while the batches are still started
+        pending += self._submit_chunks("batchClearMintSetting", lambda chunk: [list(chunk)], settings)
+        for p in pending:
+            self.sender.wait(p)
+        return {"mint_settings": len(settings), "permissions": cleared_permissions}
+
+
+def main():
+    from deploy import get_c_web3, get_sk
+    from scripts.artifacts import registry
+    from scripts.bulk_authorize import read_csv
+    from scripts.ownership_indexer import CoreLogSource
+
+    parser = argparse.ArgumentParser(description="clear mint settings and unused permissions of expired batches")
+    parser.add_argument("--core-start", type=int, default=0, help="core contract deployment epoch")
+    parser.add_argument(
+        "--permissions",
+        action="append",
+        default=[],
+        metavar="BATCH=CSV",
+        help="username,rarity csv a batch was authorized with, repeatable",
+    )
+    parser.add_argument("--batch", type=int, action="append", help="batch to sweep instead of BatchStart logs")
+    args = parser.parse_args()
+    export_from_env()
+
+    c_w3 = get_c_web3()
+    c_w3.cfx.default_account = c_w3.account.from_key(get_sk())
+    core_contract = registry.contract(c_w3, "DualSpaceNFTCore", os.environ["CORE_CONTRACT_ADDRESS"])
+    usernames: Dict[int, List[str]] = {}
+    for item in args.permissions:
+        batch_nbr, path = item.split("=", 1)
+        usernames.setdefault(int(batch_nbr), []).extend(u for u, _ in read_csv(path))
+    batch_nbrs = args.batch or started_batches(CoreLogSource(c_w3), core_contract.address, args.core_start)
+    cleared = BatchSweeper(c_w3, core_contract).sweep(batch_nbrs, usernames)
+    print(f"{cleared['mint_settings']} mint settings and {cleared['permissions']} permissions cleared")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+gas benchmark of every cross space code path on the local development network
+
+    brownie run benchmark-gas
+
+records gas used and wall time of each operation to GAS_REPORT (default build/benchmarks/gas.json)
+and compares the gas against GAS_BASELINE (default benchmarks/gas-baseline.json).
+the run fails if any operation uses more than baseline * (1 + GAS_TOLERANCE) gas,
+without baseline the gas is only reported.
+set UPDATE_GAS_BASELINE=1 to overwrite the baseline with the current report.
+GAS_RUNS sets the repetitions of each single token operation,
+GAS_BATCH_SIZES the username counts of batchAuthorizeMintPermission (default 1,10,100,1000).
+GAS_HOLDINGS the token count of the holder listed by tokensOfOwner (default 500).
+
+transfers and mints pay for the owner index of tokensOfOwner, compare them against a baseline refreshed
+before the index to get the extra gas. `read/*` entries compare listing a holder with tokensOfOwner
+against probing batchTokenState over every minted token id (gas is estimated, seconds are wall time).
+"""
+
+from brownie import (
+    accounts as untyped_accounts,
+    web3,
+)
+
+from brownie.network.contract import Contract
+from brownie.network.account import Accounts, _PrivateKeyAccount, LocalAccount
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Union, cast
+
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from eth_account import (
+    Account as EthAccount,
+)
+
+from scripts.batch_reader import EvmBatchReader, OwnerTokenPager
+from scripts.local_setup import MetatransactionConstructor, deploy_local
+from scripts.merkle_permission import MerkleIndex, build as build_permission_tree
+from scripts.mint_signer import ZERO_ADDRESS, MintRequest, MintSigner, sign_mint_message
+
+REPORT_PATH = os.environ.get("GAS_REPORT", "build/benchmarks/gas.json")
+BASELINE_PATH = os.environ.get("GAS_BASELINE", "benchmarks/gas-baseline.json")
+TOLERANCE = float(os.environ.get("GAS_TOLERANCE", "0.01"))
+RUNS = int(os.environ.get("GAS_RUNS", "5"))
+BATCH_SIZES = [int(s) for s in os.environ.get("GAS_BATCH_SIZES", "1,10,100,1000").split(",")]
+HOLDINGS = int(os.environ.get("GAS_HOLDINGS", "500"))
+
+
+@dataclass
+class Measurement:
+    gas: List[int] = field(default_factory=list)
+    seconds: List[float] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "runs": len(self.gas),
+            "gas_min": min(self.gas),
+            "gas_median": int(statistics.median(self.gas)),
+            "gas_max": max(self.gas),
+            "seconds_mean": statistics.mean(self.seconds),
+        }
+
+
+class GasRecorder:
+    def __init__(self):
+        self.measurements: Dict[str, Measurement] = {}
+
+    def measure(self, name: str, f: Callable, *args, **kwargs) -> Any:
+        start = time.perf_counter()
+        tx = f(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        measurement = self.measurements.setdefault(name, Measurement())
+        measurement.gas.append(tx.gas_used)
+        measurement.seconds.append(elapsed)
+        return tx
+
+    def measure_view(self, name: str, f: Any, *args) -> Any:
+        """
+        views send no transaction, gas is estimated and the wall time is the one of the call
+        """
+        start = time.perf_counter()
+        result = f.call(*args)
+        elapsed = time.perf_counter() - start
+        measurement = self.measurements.setdefault(name, Measurement())
+        measurement.gas.append(f.estimate_gas(*args))
+        measurement.seconds.append(elapsed)
+        return result
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        return {name: m.summary() for name, m in sorted(self.measurements.items())}
+
+
+class Bench:
+    """
+    mints tokens of one batch, the authorizer grants every username right before minting
+    """
+
+    def __init__(
+        self,
+        recorder: GasRecorder,
+        core_contract: Contract,
+        batch_nbr: int,
+        oracle_signer: LocalAccount,
+        authorizer: LocalAccount,
+        sender: _PrivateKeyAccount,
+    ):
+        self.recorder = recorder
+        self.core_contract = core_contract
+        self.batch_nbr = batch_nbr
+        self.oracle_signer = oracle_signer
+        self.authorizer = authorizer
+        self.sender = sender
+        self._username_counter = 0
+
+    def username(self) -> str:
+        self._username_counter += 1
+        return f"bench_{self._username_counter}"
+
+    def mint(
+        self,
+        name: str,
+        core_owner: Union[_PrivateKeyAccount, None],
+        evm_owner: Union[_PrivateKeyAccount, None],
+    ) -> int:
+        username = self.username()
+        self.core_contract.batchAuthorizeMintPermission(
+            self.batch_nbr, [username], [1], {"from": self.authorizer}
+        )
+        core_address = core_owner.address if core_owner else ZERO_ADDRESS
+        evm_address = evm_owner.address if evm_owner else ZERO_ADDRESS
+        signature = sign_mint_message(
+            self.oracle_signer.private_key, self.batch_nbr, username, core_address, evm_address
+        )
+        args = (
+            self.batch_nbr,
+            username,
+            core_address,
+            evm_address,
+            (signature.v, signature.r, signature.s),
+            {"from": self.sender},
+        )
+        token_id = self.core_contract.mint.call(*args)
+        self.recorder.measure(name, self.core_contract.mint, *args)
+        return token_id
+
+
+def compare(report: Dict[str, Dict[str, Any]], baseline: Dict[str, int]) -> List[str]:
+    regressions = []
+    for name, summary in report.items():
+        if name not in baseline:
+            print(f"{name}: {summary['gas_max']} gas (no baseline)")
+            continue
+        expected = baseline[name]
+        actual = summary["gas_max"]
+        if expected == 0:
+            # e.g. a read recorded without gas, any gas is a regression
+            print(f"{name}: {actual} gas (0 in baseline)")
+            if actual > 0:
+                regressions.append(f"{name}: 0 => {actual}")
+            continue
+        change = (actual - expected) / expected
+        print(f"{name}: {actual} gas ({change:+.2%} against {expected})")
+        if actual > expected * (1 + TOLERANCE):
+            regressions.append(f"{name}: {expected} => {actual} ({change:+.2%})")
+    for name in baseline:
+        if name not in report:
+            print(f"{name}: in baseline but not measured")
+    return regressions
+
+
+def _write_json(path: str, value: Any):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(value, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main():
+    accounts = cast(Accounts, untyped_accounts)
+    owner = accounts[0]
+    oracle_signer = accounts.add()
+    authorizer = accounts.add()
+    user = accounts[2]
+    random_sender = accounts[3]
+    core_another_address = accounts[5].address
+    evm_user = accounts.add()
+    evm_another_account = accounts.add()
+    name = "NAME"
+    batch_nbr = 20230401
+
+    owner.transfer(evm_user, "1 ether")  # type: ignore
+    owner.transfer(evm_another_account, "1 ether")  # type: ignore
+
+    deployment = deploy_local(owner, name)
+    core_contract = deployment.core_contract
+    evm_contract = deployment.evm_contract
+    metatransaction_constructor = MetatransactionConstructor(
+        web3.eth.chain_id, name, "v1", core_contract
+    )
+
+    recorder = GasRecorder()
+    for i in range(RUNS):
+        recorder.measure(
+            "startBatch",
+            core_contract.startBatch,
+            batch_nbr + i, oracle_signer, authorizer, 1, {"from": owner},
+        )
+
+    # batchAuthorizeMintPermission, usernames are distinct across runs so every slot is freshly written
+    for size in BATCH_SIZES:
+        for run in range(RUNS if size < 1000 else 1):
+            usernames = [f"authorize_{size}_{run}_{i}" for i in range(size)]
+            recorder.measure(
+                f"batchAuthorizeMintPermission/{size}",
+                core_contract.batchAuthorizeMintPermission,
+                batch_nbr, usernames, [1] * size, {"from": authorizer},
+            )
+
+    bench = Bench(recorder, core_contract, batch_nbr, oracle_signer, authorizer, random_sender)
+    for _ in range(RUNS):
+        both_token = bench.mint("mint/both-owners", user, evm_user)
+        bench.mint("mint/core-only", user, None)
+        evm_token = bench.mint("mint/evm-only", None, evm_user)
+
+        # core owner sets and clears evm owner, then the token is transferable in core space
+        recorder.measure(
+            "setEvmOwner",
+            core_contract.setEvmOwner,
+            both_token, evm_another_account.address, {"from": user},
+        )
+        recorder.measure(
+            "clearEvmOwner", core_contract.clearEvmOwner, both_token, {"from": user}
+        )
+        recorder.measure(
+            "core/safeTransferFrom",
+            core_contract.safeTransferFrom,
+            user, core_another_address, both_token, {"from": user},
+        )
+
+        # the evm owner hands the token to the evm contract in espace, core is not told
+        # and reads the evm owner through staticCallEVM
+        fallback_token = bench.mint("mint/both-owners", user, evm_user)
+        evm_contract.transferFrom(
+            evm_user, evm_contract.address, fallback_token, {"from": evm_user}
+        )
+        recorder.measure(
+            "core/safeTransferFrom/fallback",
+            core_contract.safeTransferFrom,
+            user, core_another_address, fallback_token, {"from": user},
+        )
+
+        # expirations of started batches are computed from the mirrored setting,
+        # tokens of batches without mirror (never started or started before the upgrade) read espace
+        unmirrored_token = (batch_nbr + RUNS) * 10**6 + 10**4 + 1
+        for token_id, path in ((both_token, "mirrored"), (unmirrored_token, "staticCallEVM")):
+            recorder.measure_view(
+                f"getPrivilegeExpiration/{path}", core_contract.getPrivilegeExpiration, token_id
+            )
+            recorder.measure_view(
+                f"isPrivilegeExpired/{path}", core_contract.isPrivilegeExpired, token_id
+            )
+
+        # evm only token is transferable in espace, the new evm owner then claims the core side
+        recorder.measure(
+            "evm/safeTransferFrom",
+            evm_contract.safeTransferFrom,
+            evm_user, evm_another_account, evm_token, {"from": evm_user},
+        )
+        recorder.measure(
+            "setCoreOwner",
+            core_contract.setCoreOwner,
+            evm_another_account.address,
+            evm_token,
+            user,
+            EthAccount.sign_message(
+                metatransaction_constructor.construct_eip712_message(
+                    evm_another_account.address, evm_token, user.address
+                ),
+                evm_another_account.private_key,
+            ).signature,
+            {"from": random_sender},
+        )
+        recorder.measure(
+            "clearCoreOwner",
+            core_contract.clearCoreOwner,
+            evm_another_account.address,
+            evm_token,
+            EthAccount.sign_message(
+                metatransaction_constructor.construct_eip712_message(
+                    evm_another_account.address, evm_token, core_contract.address
+                ),
+                evm_another_account.private_key,
+            ).signature,
+            {"from": random_sender},
+        )
+
+    # merkle mint permission, one root for every username instead of one slot per username
+    tree_dir = tempfile.mkdtemp()
+    merkle_usernames = [f"merkle_{i}" for i in range(max(BATCH_SIZES))]
+    build_permission_tree([(u, 1) for u in merkle_usernames], tree_dir)
+    with MerkleIndex(tree_dir) as merkle_index:
+        recorder.measure(
+            "setMintPermissionRoot",
+            core_contract.setMintPermissionRoot,
+            batch_nbr, merkle_index.root, {"from": authorizer},
+        )
+        for username in merkle_usernames[:RUNS]:
+            signature = sign_mint_message(
+                oracle_signer.private_key, batch_nbr, username, user.address, evm_user.address
+            )
+            recorder.measure(
+                "mintWithProof/both-owners",
+                core_contract.mintWithProof,
+                batch_nbr,
+                username,
+                user.address,
+                evm_user.address,
+                (signature.v, signature.r, signature.s),
+                merkle_index.permission_proof(username).to_args(),
+                {"from": random_sender},
+            )
+
+    # one holder with HOLDINGS tokens, listed by the index or found by probing every token id of the batch
+    holder = accounts.add()
+    owner.transfer(holder, "1 ether")  # type: ignore
+    holdings_batch = batch_nbr + RUNS + 1
+    core_contract.startBatch(holdings_batch, oracle_signer, authorizer, 1, {"from": owner})
+    usernames = [f"holder_{i}" for i in range(HOLDINGS)]
+    core_contract.batchAuthorizeMintPermission(
+        holdings_batch, usernames, [1] * HOLDINGS, {"from": authorizer}
+    )
+    signer = MintSigner(oracle_signer.private_key, workers=0)
+    chunk = 50
+    for i in range(0, HOLDINGS, chunk):
+        requests = [
+            MintRequest(holdings_batch, u, ZERO_ADDRESS, holder.address) for u in usernames[i : i + chunk]
+        ]
+        core_contract.batchMint(
+            holdings_batch,
+            [
+                (r.username, ZERO_ADDRESS, r.evm_owner, tuple(sig))
+                for r, sig in zip(requests, signer.sign_many(requests))
+            ],
+            {"from": random_sender},
+        )
+    evm_web3_contract = web3.eth.contract(address=evm_contract.address, abi=evm_contract.abi)
+    pager = OwnerTokenPager(evm_web3_contract)
+    start = time.perf_counter()
+    held = pager.tokens_of(holder.address)
+    elapsed = time.perf_counter() - start
+    assert len(held) == HOLDINGS, len(held)
+    recorder.measurements[f"read/tokensOfOwner/{HOLDINGS}"] = Measurement(
+        [sum(
+            evm_contract.tokensOfOwner.estimate_gas(holder.address, cursor, pager.page_size)
+            for cursor in range(0, HOLDINGS, pager.page_size)
+        )],
+        [elapsed],
+    )
+    probed_ids = [holdings_batch * 10**6 + 10**4 + i for i in range(1, HOLDINGS + 1)]
+    reader = EvmBatchReader(evm_web3_contract)
+    start = time.perf_counter()
+    states = reader.read(probed_ids)
+    elapsed = time.perf_counter() - start
+    assert sum(1 for state in states if state is not None and state.owner == holder.address) == HOLDINGS
+    recorder.measurements[f"read/batchTokenState-probe/{HOLDINGS}"] = Measurement(
+        [sum(
+            evm_contract.batchTokenState.estimate_gas(probed_ids[i : i + reader.chunk_size])
+            for i in range(0, HOLDINGS, reader.chunk_size)
+        )],
+        [elapsed],
+    )
+    # the holder sends the first token, the last one is swapped into its position
+    recorder.measure(
+        "evm/safeTransferFrom/large-holder",
+        evm_contract.safeTransferFrom,
+        holder, evm_another_account, held[0], {"from": holder},
+    )
+
+    report = recorder.report()
+    _write_json(REPORT_PATH, {"chain_id": web3.eth.chain_id, "results": report})
+    print(f"gas report written to {REPORT_PATH}")
+
+    if os.environ.get("UPDATE_GAS_BASELINE") == "1":
+        _write_json(BASELINE_PATH, {name: summary["gas_max"] for name, summary in report.items()})
+        print(f"gas baseline written to {BASELINE_PATH}")
+        return
+    if not os.path.exists(BASELINE_PATH):
+        # nothing to compare against, e.g. a fresh checkout: report only
+        for name, summary in report.items():
+            print(f"{name}: {summary['gas_max']} gas")
+        print(f"no gas baseline at {BASELINE_PATH}, regression check skipped")
+        return
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline)
+    if regressions:
+        raise Exception("gas regressions:\n" + "\n".join(regressions))
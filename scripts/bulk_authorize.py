@@ -0,0 +1,279 @@
+"""
+bulk uploader for `DualSpaceNFTCore.batchAuthorizeMintPermission`
+
+usernames are packed into chunks sized from `estimate_gas_and_collateral` against the block gas limit,
+several chunks are kept in flight through `PipelinedSender`,
+and progress is checkpointed to disk so an interrupted upload can be resumed.
+
+usage:
+    python -m scripts.bulk_authorize usernames.csv 20230401 --checkpoint authorize.json
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from conflux_web3 import Web3 as ConfluxWeb3
+from conflux_web3.contract import ConfluxContract
+
+from scripts.artifacts import registry
+from scripts.instrumentation import export_from_env, record_transaction
+from scripts.tx_pipeline import CoreSpace, PendingTransaction, PipelinedSender
+
+
+# (username, rarity)
+MintPermission = Tuple[str, int]
+
+
+def read_csv(path: str) -> Iterator[MintPermission]:
+    """
+    reads `username,rarity` rows, a header row is skipped if present
+    """
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        first = True
+        for row in reader:
+            if not row or row[0].startswith("#"):
+                continue
+            if len(row) < 2:
+                raise ValueError(f"{path}:{reader.line_num}: expected username,rarity")
+            username, rarity = row[0].strip(), row[1].strip()
+            if not rarity.isdigit():
+                if first:
+                    # header
+                    first = False
+                    continue
+                raise ValueError(f"{path}:{reader.line_num}: rarity {rarity!r} is not a number")
+            first = False
+            yield username, int(rarity)
+
+
+@dataclass
+class Checkpoint:
+    path: str
+    batch_nbr: int
+    # [start, end) ranges of the input already authorized on chain
+    done: List[List[int]] = field(default_factory=list)
+    # [start, end, tx hash, nonce] of chunks sent but not yet confirmed
+    pending: List[List[Any]] = field(default_factory=list)
+
+    @classmethod
+    def load(cls, path: str, batch_nbr: int) -> "Checkpoint":
+        if not os.path.exists(path):
+            return cls(path, batch_nbr)
+        with open(path) as f:
+            d = json.load(f)
+        if d["batch_nbr"] != batch_nbr:
+            raise ValueError(f"checkpoint {path} belongs to batch {d['batch_nbr']}")
+        return cls(path, batch_nbr, d["done"], d["pending"])
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(
+                {"batch_nbr": self.batch_nbr, "done": self.done, "pending": self.pending}, f
+            )
+        os.replace(tmp, self.path)
+
+    def mark_done(self, start: int, end: int):
+        self.done.append([start, end])
+        self.done.sort()
+        merged: List[List[int]] = []
+        for s, e in self.done:
+            if merged and s <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], e)
+            else:
+                merged.append([s, e])
+        self.done = merged
+
+    def is_done(self, index: int) -> bool:
+        return any(s <= index < e for s, e in self.done)
+
+
+class BulkAuthorizer:
+    def __init__(
+        self,
+        c_w3: ConfluxWeb3,
+        core_contract: ConfluxContract,
+        batch_nbr: int,
+        sender: Optional[str] = None,
+        max_in_flight: int = 4,
+        gas_fraction: float = 0.4,
+        probe_size: int = 32,
+        max_chunk_size: int = 2000,
+    ):
+        """
+        gas_fraction: fraction of the block gas limit a single chunk may use
+        """
+        self.c_w3 = c_w3
+        self.core_contract = core_contract
+        self.batch_nbr = batch_nbr
+        self.sender = sender or c_w3.cfx.default_account
+        self.max_in_flight = max_in_flight
+        self.gas_fraction = gas_fraction
+        self.probe_size = probe_size
+        self.max_chunk_size = max_chunk_size
+        self.pipeline = PipelinedSender(
+            CoreSpace(c_w3), self.sender, window=max_in_flight
+        )
+
+    def _tx(self, chunk: List[MintPermission]) -> Dict[str, Any]:
+        return {
+            "from": self.sender,
+            "to": self.core_contract.address,
+            "data": self.core_contract.encodeABI(
+                fn_name="batchAuthorizeMintPermission",
+                args=[self.batch_nbr, [u for u, _ in chunk], [r for _, r in chunk]],
+            ),
+        }
+
+    def _estimate(self, chunk: List[MintPermission]) -> Dict[str, int]:
+        return self.c_w3.cfx.estimate_gas_and_collateral(self._tx(chunk))  # type: ignore
+
+    def gas_target(self) -> int:
+        block = self.c_w3.cfx.get_block_by_epoch_number("latest_state")
+        return int(block["gasLimit"] * self.gas_fraction)
+
+    def chunk_size_for(self, sample: List[MintPermission]) -> int:
+        """
+        derives how many usernames fit in one transaction from a gas estimation of `sample`
+        """
+        if len(sample) < 2:
+            return 1
+        # estimation of a single item approximates the fixed cost of a transaction
+        base = self._estimate(sample[:1])["gasLimit"]
+        total = self._estimate(sample)["gasLimit"]
+        per_item = max((total - base) / max(len(sample) - 1, 1), 1)
+        size = int((self.gas_target() - base) / per_item)
+        return max(1, min(size, self.max_chunk_size))
+
+    def _send(self, chunk: List[MintPermission]) -> PendingTransaction:
+        estimate = self._estimate(chunk)
+        tx = self._tx(chunk)
+        tx.update(
+            {
+                "gas": estimate["gasLimit"],
+                "storageLimit": estimate["storageCollateralized"],
+            }
+        )
+        return self.pipeline.submit(tx)
+
+    def _wait(self, tx_hash) -> bool:
+        receipt = self.c_w3.cfx.wait_for_transaction_receipt(tx_hash)
+        success = receipt["outcomeStatus"] == 0
+        # resumed from the checkpoint, the send time is unknown
+        record_transaction("core", "batchAuthorizeMintPermission", None, receipt, failed=not success)
+        return success
+
+    def _chunks(
+        self, indexed: Iterator[Tuple[int, MintPermission]], chunk_size: int
+    ) -> Iterator[Tuple[int, int, List[MintPermission]]]:
+        """
+        yields (start, end, chunk), a chunk never spans an index gap caused by resumed ranges
+        """
+        chunk: List[MintPermission] = []
+        start = end = -1
+        for index, permission in indexed:
+            if chunk and (index != end or len(chunk) >= chunk_size):
+                yield start, end, chunk
+                chunk = []
+            if not chunk:
+                start = index
+            chunk.append(permission)
+            end = index + 1
+        if chunk:
+            yield start, end, chunk
+
+    def resume(self, checkpoint: Checkpoint):
+        """
+        settles chunks left pending by an interrupted run,
+        a chunk is sent again only if its transaction failed or is dropped (unknown with its nonce still free)
+        """
+        for entry in list(checkpoint.pending):
+            start, end, tx_hash = entry[:3]
+            # checkpoints of older runs do not record the nonce
+            nonce = entry[3] if len(entry) > 3 else None
+            if self.c_w3.cfx.get_transaction_by_hash(tx_hash) is None:
+                if nonce is None or self.c_w3.cfx.get_next_nonce(self.sender) > nonce:
+                    raise Exception(
+                        f"transaction {tx_hash} of input [{start}, {end}) is unknown and its nonce may be used, "
+                        "check whether the chunk is authorized before resuming"
+                    )
+            elif self._wait(tx_hash):
+                checkpoint.mark_done(start, end)
+            # errors of _wait (e.g. still pending at timeout) propagate and keep the chunk pending
+            checkpoint.pending.remove(entry)
+            checkpoint.save()
+
+    def upload(
+        self, permissions: Iterable[MintPermission], checkpoint: Checkpoint
+    ) -> int:
+        """
+        returns the count of usernames authorized by this run
+        """
+        self.resume(checkpoint)
+        indexed = (
+            (i, p) for i, p in enumerate(permissions) if not checkpoint.is_done(i)
+        )
+        sample = list(itertools.islice(indexed, self.probe_size))
+        chunk_size = self.chunk_size_for([p for _, p in sample])
+
+        authorized = 0
+        in_flight: List[Tuple[int, int, PendingTransaction]] = []
+
+        def settle_oldest():
+            nonlocal authorized
+            start, end, pending = in_flight.pop(0)
+            try:
+                self.pipeline.wait(pending)
+            except Exception as e:
+                raise Exception(f"authorization of input [{start}, {end}) failed: {e}")
+            checkpoint.pending = [p for p in checkpoint.pending if p[0] != start]
+            checkpoint.mark_done(start, end)
+            checkpoint.save()
+            authorized += end - start
+
+        for start, end, chunk in self._chunks(itertools.chain(sample, indexed), chunk_size):
+            pending = self._send(chunk)
+            in_flight.append((start, end, pending))
+            checkpoint.pending.append([start, end, pending.hash.hex(), pending.nonce])
+            checkpoint.save()
+            if len(in_flight) >= self.max_in_flight:
+                settle_oldest()
+        while in_flight:
+            settle_oldest()
+        return authorized
+
+
+def main():
+    from deploy import get_c_web3, get_sk
+
+    parser = argparse.ArgumentParser(description="bulk authorize mint permission")
+    parser.add_argument("csv", help="csv file of username,rarity rows")
+    parser.add_argument("batch_nbr", type=int)
+    parser.add_argument("--checkpoint", default=None)
+    parser.add_argument("--in-flight", type=int, default=4)
+    args = parser.parse_args()
+    export_from_env()
+
+    c_w3 = get_c_web3()
+    c_w3.cfx.default_account = c_w3.account.from_key(get_sk())
+    core_contract = registry.contract(
+        c_w3, "DualSpaceNFTCore", os.environ["CORE_CONTRACT_ADDRESS"]
+    )
+    checkpoint = Checkpoint.load(
+        args.checkpoint or f"authorize-{args.batch_nbr}.json", args.batch_nbr
+    )
+    uploader = BulkAuthorizer(
+        c_w3, core_contract, args.batch_nbr, max_in_flight=args.in_flight
+    )
+    authorized = uploader.upload(read_csv(args.csv), checkpoint)
+    print(f"{authorized} usernames authorized for batch {args.batch_nbr}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+declarative deployment graph
+
+each `Step` sends one transaction once the steps it depends on are finished.
+steps whose dependencies are satisfied are sent together (nonces are allocated locally per space)
+and their receipts are awaited concurrently through `ReceiptPool`.
+finished steps are recorded to a JSON manifest, a failed deployment resumes from it on next run.
+a transaction not executed in `step_timeout` seconds is sent again with its nonce if the node has dropped it,
+otherwise its step fails and the transaction is awaited again on next run.
+"""
+
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from scripts.instrumentation import record_transaction
+from scripts.receipt_pool import CORE_RECEIPT_METHOD, EVM_RECEIPT_METHOD, Receipt, ReceiptPool
+
+# results of finished steps, keyed by step name
+Results = Dict[str, Any]
+
+_TRANSACTION_METHODS = {
+    CORE_RECEIPT_METHOD: "cfx_getTransactionByHash",
+    EVM_RECEIPT_METHOD: "eth_getTransactionByHash",
+}
+
+
+def _no_result(receipt: Receipt, results: Results) -> Any:
+    return receipt["transactionHash"]
+
+
+@dataclass
+class Step:
+    name: str
+    # key of `DeploymentGraph.spaces`
+    space: str
+    # (results, tx params with allocated nonce) -> tx hash
+    send: Callable[[Results, Dict[str, Any]], Any]
+    deps: Tuple[str, ...] = ()
+    # (receipt, results) -> JSON serializable value recorded as the step result
+    result: Callable[[Receipt, Results], Any] = _no_result
+
+
+@dataclass
+class SpaceConfig:
+    url: str
+    receipt_method: str
+    # next nonce of the deployer, pooled transactions included when the space reports them
+    next_nonce: Callable[[], int]
+
+
+class DeploymentGraph:
+    def __init__(
+        self,
+        steps: Sequence[Step],
+        spaces: Dict[str, SpaceConfig],
+        manifest_path: str,
+        step_timeout: float = 600,
+        poll_interval: float = 1.0,
+    ):
+        names = [step.name for step in steps]
+        if len(set(names)) != len(names):
+            raise ValueError("duplicated step name")
+        for step in steps:
+            for dep in step.deps:
+                if dep not in names:
+                    raise ValueError(f"step {step.name} depends on unknown step {dep}")
+            if step.space not in spaces:
+                raise ValueError(f"step {step.name} runs on unknown space {step.space}")
+        self.steps = {step.name: step for step in steps}
+        self.spaces = spaces
+        self.manifest_path = manifest_path
+        self.step_timeout = step_timeout
+        self.poll_interval = poll_interval
+        self.results: Results = {}
+        # step name => hash of a sent but unfinished transaction
+        self.sent: Dict[str, str] = {}
+        # step name => nonce of its sent transaction
+        self.nonces: Dict[str, int] = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        self.results = manifest["results"]
+        self.sent = manifest["sent"]
+        # absent from manifests of older runs
+        self.nonces = manifest.get("nonces", {})
+
+    def _save(self):
+        tmp = f"{self.manifest_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"results": self.results, "sent": self.sent, "nonces": self.nonces}, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def run(self) -> Results:
+        return asyncio.run(self._run())
+
+    def _first_nonce(self, space: str) -> int:
+        # resumed transactions may still be pooled, their nonces are taken
+        resumed = [self.nonces[name] + 1 for name in self.sent if name in self.nonces and self.steps[name].space == space]
+        return max([self.spaces[space].next_nonce(), *resumed])
+
+    async def _is_known(self, pool: ReceiptPool, space: str, tx_hash: str) -> bool:
+        method = _TRANSACTION_METHODS[self.spaces[space].receipt_method]
+        [result] = await asyncio.to_thread(pool.provider.batch_request, [(method, [tx_hash])])
+        if isinstance(result, Exception):
+            raise result
+        return result is not None
+
+    async def _run(self) -> Results:
+        pools = {
+            name: ReceiptPool(space.url, space.receipt_method, poll_interval=self.poll_interval)
+            for name, space in self.spaces.items()
+        }
+        nonces: Dict[str, Optional[int]] = {name: None for name in self.spaces}
+        pending: Dict[asyncio.Future, str] = {}
+        # step name => send time, unknown for steps resumed from the manifest
+        sent_at: Dict[str, Optional[float]] = {}
+        errors: List[str] = []
+
+        def send(step: Step, nonce: int) -> str:
+            tx_hash = step.send(self.results, {"nonce": nonce})
+            tx_hash = "0x" + bytes(tx_hash).hex() if isinstance(tx_hash, bytes) else tx_hash
+            self.sent[step.name] = tx_hash
+            self.nonces[step.name] = nonce
+            self._save()
+            sent_at[step.name] = time.monotonic()
+            return tx_hash
+
+        def track(step: Step, tx_hash: str):
+            future = asyncio.ensure_future(pools[step.space].wait(tx_hash, self.step_timeout))
+            pending[future] = step.name
+
+        def schedule():
+            for step in self.steps.values():
+                if step.name in self.results or step.name in pending.values():
+                    continue
+                if not all(dep in self.results for dep in step.deps):
+                    continue
+                tx_hash = self.sent.get(step.name)
+                if tx_hash is None:
+                    nonce = nonces[step.space]
+                    if nonce is None:
+                        nonce = self._first_nonce(step.space)
+                    tx_hash = send(step, nonce)
+                    nonces[step.space] = nonce + 1
+                    print(f"{step.name} sent: {tx_hash}")
+                else:
+                    sent_at[step.name] = None
+                    print(f"{step.name} resumed: {tx_hash}")
+                track(step, tx_hash)
+
+        async def timed_out(step: Step) -> Optional[str]:
+            """
+            sends a dropped transaction again, returns the error of the step if it cannot be
+            """
+            tx_hash, nonce = self.sent[step.name], self.nonces.get(step.name)
+            if await self._is_known(pools[step.space], step.space, tx_hash):
+                # still pooled (e.g. underpriced), awaited again on next run
+                return f"transaction {tx_hash} is not executed in {self.step_timeout} seconds"
+            if nonce is None or self.spaces[step.space].next_nonce() > nonce:
+                # the nonce is used by another transaction, the step is sent again on next run
+                del self.sent[step.name]
+                self.nonces.pop(step.name, None)
+                return f"transaction {tx_hash} is dropped and its nonce is used"
+            tx_hash = send(step, nonce)
+            print(f"{step.name} dropped, sent again: {tx_hash}")
+            track(step, tx_hash)
+            return None
+
+        try:
+            schedule()
+            while pending:
+                finished, _ = await asyncio.wait(
+                    pending.keys(), return_when=asyncio.FIRST_COMPLETED
+                )
+                for future in finished:
+                    name = pending.pop(future)
+                    step = self.steps[name]
+                    started = sent_at.pop(name)
+                    try:
+                        receipt = future.result()
+                    except asyncio.TimeoutError:
+                        error = await timed_out(step)
+                        if error is not None:
+                            record_transaction(step.space, name, None, None, failed=True)
+                            errors.append(f"{name}: {error}")
+                        continue
+                    except Exception as e:
+                        # failed transactions are sent again on next run
+                        del self.sent[name]
+                        self.nonces.pop(name, None)
+                        record_transaction(step.space, name, None, None, failed=True)
+                        errors.append(f"{name}: {e}")
+                        continue
+                    del self.sent[name]
+                    self.nonces.pop(name, None)
+                    record_transaction(step.space, name, None if started is None else time.monotonic() - started, receipt)
+                    self.results[name] = step.result(receipt, self.results)
+                    print(f"{name} finished: {self.results[name]}")
+                self._save()
+                # stop scheduling once any step failed but let in flight steps finish
+                if not errors:
+                    schedule()
+        finally:
+            for pool in pools.values():
+                await pool.close()
+
+        if errors:
+            raise Exception(f"deployment failed, rerun to resume: {'; '.join(errors)}")
+        unfinished = [name for name in self.steps if name not in self.results]
+        if unfinished:
+            raise Exception(f"steps with unsatisfiable dependencies: {unfinished}")
+        return self.results
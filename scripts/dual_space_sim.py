@@ -0,0 +1,405 @@
+"""
+in-process dual space simulator
+
+runs core space and espace contracts on one py-evm chain (through eth-tester) with a python precompile at the
+`CrossSpaceCall` address `0x0888000000000000000000000000000000000006`:
+
+- `callEVM(to, data)` / `staticCallEVM(to, data)` run `data` against `to` as a nested message whose sender is
+  the mapped espace address of the calling core contract, keccak256(core address)[12:].
+  the output is returned abi encoded as `bytes`, reverts bubble up with the espace revert data,
+  and espace writes are reverted together with the core transaction
+- `transferEVM`, `withdrawFromMapped`, `mappedBalance` and `mappedNonce` move and read the balance of the mapped account
+
+core and espace addresses share one state, `Call` / `Outcome` events of the internal contract are not emitted,
+and storage collateral / sponsorship are not simulated.
+
+`make_backend` returns the simulator, or `NodeBackend` with the same interface against real nodes
+when DUAL_SPACE_BACKEND=node, so the same tests run on both.
+
+    sim = DualSpaceSimulator()
+    deployment = sim.deploy_dual_space(sim.accounts[0], "NAME", "symbol", 1000)
+    sim.transact(deployment.core_contract.functions.startBatch(20230401, signer, authorizer, 1), sim.accounts[0])
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from eth.exceptions import Revert, WriteProtection
+from eth.vm.forks import ShanghaiVM
+from eth.vm.message import Message
+from eth_abi import decode, encode
+from eth_account import Account
+from eth_account.signers.local import LocalAccount
+from eth_tester import EthereumTester, PyEVMBackend
+from eth_utils import function_signature_to_4byte_selector, keccak, to_canonical_address, to_checksum_address
+from web3 import Web3
+from web3.providers.eth_tester import EthereumTesterProvider
+
+from scripts.artifacts import ArtifactRegistry, registry as default_registry
+from scripts.mint_signer import ZERO_ADDRESS
+
+CROSS_SPACE_CALL_ADDRESS = "0x0888000000000000000000000000000000000006"
+# gas charged by the precompile itself, the nested message is charged as usual
+CROSS_SPACE_CALL_GAS = 700
+
+
+def mapped_evm_address(core_address: Any) -> str:
+    # `Base32Address.mapped_evm_space_address`
+    core_address = getattr(core_address, "hex_address", core_address)
+    return to_checksum_address(keccak(to_canonical_address(core_address))[12:])
+
+
+def _selector(signature: str) -> bytes:
+    return function_signature_to_4byte_selector(signature)
+
+
+CALL_EVM = _selector("callEVM(bytes20,bytes)")
+STATIC_CALL_EVM = _selector("staticCallEVM(bytes20,bytes)")
+TRANSFER_EVM = _selector("transferEVM(bytes20)")
+WITHDRAW_FROM_MAPPED = _selector("withdrawFromMapped(uint256)")
+MAPPED_BALANCE = _selector("mappedBalance(address)")
+MAPPED_NONCE = _selector("mappedNonce(address)")
+
+
+def _nested_call(computation: Any, to: bytes, data: bytes, is_static: bool) -> bytes:
+    mapped = keccak(computation.msg.sender)[12:]
+    value = computation.msg.value
+    if value:
+        # value received by the internal contract is moved to the mapped account before the call
+        computation.state.delta_balance(computation.msg.storage_address, -value)
+        computation.state.delta_balance(mapped, value)
+    gas = computation.get_gas_remaining()
+    # all but one 64th, as for CALL
+    child_gas = gas - gas // 64
+    computation.consume_gas(child_gas, reason="CrossSpaceCall nested message")
+    child = computation.apply_child_computation(
+        Message(
+            gas=child_gas,
+            to=to,
+            sender=mapped,
+            value=value,
+            data=data,
+            code=computation.state.get_code(to),
+            depth=computation.msg.depth + 1,
+            is_static=is_static,
+        )
+    )
+    if child.should_return_gas:
+        computation.return_gas(child.get_gas_remaining())
+    if child.is_error:
+        computation.output = child.output
+        raise Revert(child.output)
+    return child.output
+
+
+def cross_space_call(computation: Any) -> Any:
+    """
+    py-evm precompile of the `CrossSpaceCall` internal contract
+    """
+    computation.consume_gas(CROSS_SPACE_CALL_GAS, reason="CrossSpaceCall")
+    data = bytes(computation.msg.data)
+    selector, args = data[:4], data[4:]
+    if selector in (CALL_EVM, TRANSFER_EVM, WITHDRAW_FROM_MAPPED) and computation.msg.is_static:
+        raise WriteProtection("cannot modify espace state in a static context")
+
+    if selector in (CALL_EVM, STATIC_CALL_EVM):
+        to, call_data = decode(["bytes20", "bytes"], args)
+        output = _nested_call(computation, to, call_data, selector == STATIC_CALL_EVM)
+        computation.output = encode(["bytes"], [output])
+    elif selector == TRANSFER_EVM:
+        (to,) = decode(["bytes20"], args)
+        output = _nested_call(computation, to, b"", False)
+        computation.output = encode(["bytes"], [output])
+    elif selector == WITHDRAW_FROM_MAPPED:
+        (value,) = decode(["uint256"], args)
+        mapped = keccak(computation.msg.sender)[12:]
+        if computation.state.get_balance(mapped) < value:
+            raise Revert(b"")
+        computation.state.delta_balance(mapped, -value)
+        computation.state.delta_balance(computation.msg.sender, value)
+    elif selector == MAPPED_BALANCE:
+        (address,) = decode(["address"], args)
+        mapped = keccak(to_canonical_address(address))[12:]
+        computation.output = encode(["uint256"], [computation.state.get_balance(mapped)])
+    elif selector == MAPPED_NONCE:
+        (address,) = decode(["address"], args)
+        mapped = keccak(to_canonical_address(address))[12:]
+        computation.output = encode(["uint256"], [computation.state.get_nonce(mapped)])
+    else:
+        # createEVM is not simulated
+        raise Revert(b"")
+    return computation
+
+
+_Computation = ShanghaiVM.get_state_class().computation_class
+
+
+class CrossSpaceComputation(_Computation):  # type: ignore
+    _precompiles = {
+        **_Computation.get_precompiles(),
+        to_canonical_address(CROSS_SPACE_CALL_ADDRESS): cross_space_call,
+    }
+
+
+class CrossSpaceState(ShanghaiVM.get_state_class()):  # type: ignore
+    computation_class = CrossSpaceComputation
+
+
+class CrossSpaceVM(ShanghaiVM):
+    _state_class = CrossSpaceState
+
+
+class TransactionFailed(Exception):
+    pass
+
+
+def hex_address(address: Any) -> str:
+    # accepts hex addresses, conflux Base32Address and accounts
+    address = getattr(address, "address", address)
+    return getattr(address, "hex_address", address)
+
+
+@dataclass
+class DualSpaceDeployment:
+    core_contract: Any
+    evm_contract: Any
+    mapped_address: str
+
+
+class DualSpaceSimulator:
+    """
+    accounts: funded local accounts, transactions are signed locally so any of them can be the sender
+
+    every simulator owns its chain, test processes running in parallel each build their own
+    """
+
+    supports_snapshot = True
+
+    def __init__(self, artifact_registry: Optional[ArtifactRegistry] = None, account_count: int = 10):
+        self.registry = artifact_registry or default_registry
+        backend = PyEVMBackend(
+            genesis_state=PyEVMBackend.generate_genesis_state(num_accounts=account_count),
+            vm_configuration=((0, CrossSpaceVM),),
+        )
+        self.tester = EthereumTester(backend)
+        self.w3 = Web3(EthereumTesterProvider(self.tester))
+        # keys of the genesis accounts, eth_call needs the sender key to be known to the backend
+        self.accounts: List[LocalAccount] = [Account.from_key(key.to_bytes()) for key in backend.account_keys]
+        self.w3.eth.default_account = self.accounts[0].address
+        self.core_zero_address = ZERO_ADDRESS
+
+    @property
+    def owner(self) -> LocalAccount:
+        return self.accounts[0]
+
+    def core_account(self) -> LocalAccount:
+        return self.new_account()
+
+    def evm_account(self) -> LocalAccount:
+        return self.new_account()
+
+    def new_account(self, value: int = 10**21) -> LocalAccount:
+        """
+        returns a fresh account funded with `value`
+        """
+        account = Account.create()
+        self.tester.add_account(account.key.hex())
+        self.w3.eth.send_transaction({"from": self.accounts[0].address, "to": account.address, "value": value})
+        return account
+
+    @property
+    def espace_chain_id(self) -> int:
+        return self.w3.eth.chain_id
+
+    def transact(self, fn: Any, sender: LocalAccount, value: int = 0) -> Dict[str, Any]:
+        """
+        sends the contract function call (or constructor) from `sender` and returns the receipt,
+        raises `TransactionFailed` with the revert reason if it reverts
+        """
+        tx_params = {"from": sender.address, "value": value, "nonce": self.w3.eth.get_transaction_count(sender.address)}
+        try:
+            tx = fn.build_transaction(tx_params)
+        except Exception as e:
+            # gas estimation executes the transaction and surfaces the revert reason
+            raise TransactionFailed(str(e)) from e
+        signed = sender.sign_transaction(tx)
+        tx_hash = self.w3.eth.send_raw_transaction(signed.rawTransaction)
+        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        if receipt["status"] != 1:
+            raise TransactionFailed(f"transaction {tx_hash.hex()} failed")
+        return receipt
+
+    def deploy(self, name: str, sender: LocalAccount, *args: Any) -> Any:
+        factory = self.registry.contract(self.w3, name)
+        receipt = self.transact(factory.constructor(*args), sender)
+        return factory(receipt["contractAddress"])
+
+    def deploy_proxied(self, name: str, sender: LocalAccount) -> Any:
+        implementation = self.deploy(name, sender)
+        proxy = self.deploy("DeploymentProxy", sender, implementation.address, b"")
+        return self.registry.contract(self.w3, name, proxy.address)
+
+    def deploy_dual_space(
+        self,
+        owner: LocalAccount,
+        name: str = "NAME",
+        symbol: str = "symbol",
+        oracle_expiration: int = 1000,
+    ) -> DualSpaceDeployment:
+        """
+        same deployment as `deploy.py`, against the simulated `CrossSpaceCall`
+        """
+        core_contract = self.deploy_proxied("DualSpaceNFTCore", owner)
+        evm_contract = self.deploy_proxied("DualSpaceNFTEvm", owner)
+        mapped_address = mapped_evm_address(core_contract.address)
+        self.transact(evm_contract.functions.initialize(name, symbol, mapped_address), owner)
+        self.transact(
+            core_contract.functions.initialize(
+                name,
+                symbol,
+                bytes.fromhex(evm_contract.address[2:]),
+                CROSS_SPACE_CALL_ADDRESS,
+                self.espace_chain_id,
+                oracle_expiration,
+            ),
+            owner,
+        )
+        return DualSpaceDeployment(core_contract, evm_contract, mapped_address)
+
+    def mine(self, blocks: int = 1):
+        self.tester.mine_blocks(blocks)
+
+    def snapshot(self) -> int:
+        return self.tester.take_snapshot()
+
+    def revert(self, snapshot_id: int):
+        """
+        the snapshot stays valid and can be reverted to again
+        """
+        self.tester.revert_to_snapshot(snapshot_id)
+
+
+class NodeBackend:
+    """
+    same interface as `DualSpaceSimulator` against real core space and espace nodes,
+    the deployer key funds espace accounts and the core space `Faucet` funds core accounts (testnet only).
+    snapshots are not supported and `mine` waits for the core space epoch number to advance.
+    """
+
+    supports_snapshot = False
+
+    def __init__(self, core_url: str, evm_url: str, private_key: str, artifact_registry: Optional[ArtifactRegistry] = None):
+        from conflux_web3 import Web3 as CWeb3
+        from web3.middleware.signing import construct_sign_and_send_raw_middleware
+
+        from scripts.providers import make_provider
+
+        self.registry = artifact_registry or default_registry
+        self.c_w3 = CWeb3(make_provider(core_url))
+        self.w3 = Web3(make_provider(evm_url))
+        self.c_owner = self.c_w3.account.from_key(private_key)
+        self.c_w3.cfx.default_account = self.c_owner
+        self.e_owner = Account.from_key(private_key)
+        self.w3.eth.default_account = self.e_owner.address
+        self._sign_middleware = construct_sign_and_send_raw_middleware
+        self.w3.middleware_onion.add(construct_sign_and_send_raw_middleware(self.e_owner))
+        self.core_zero_address = self.c_w3.address.zero_address()
+
+    @property
+    def owner(self) -> Any:
+        return self.c_owner
+
+    @property
+    def espace_chain_id(self) -> int:
+        return self.w3.eth.chain_id
+
+    def core_account(self) -> Any:
+        account = self.c_w3.account.create()
+        self.c_w3.wallet.add_account(account)
+        self.c_w3.cfx.contract(name="Faucet").functions.claimCfx().transact({"from": account.address}).executed()
+        return account
+
+    def evm_account(self, value: int = 10**17) -> LocalAccount:
+        account = Account.create()
+        self.w3.middleware_onion.add(self._sign_middleware(account))
+        tx_hash = self.w3.eth.send_transaction({"from": self.e_owner.address, "to": account.address, "value": value})
+        self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        return account
+
+    def transact(self, fn: Any, sender: Any, value: int = 0) -> Dict[str, Any]:
+        if hasattr(fn.w3, "cfx"):
+            # core accounts are added to the wallet by `core_account`
+            try:
+                receipt = fn.transact({"from": sender.address, "value": value}).executed()
+            except Exception as e:
+                raise TransactionFailed(str(e)) from e
+            if receipt["outcomeStatus"] != 0:
+                raise TransactionFailed(f"transaction {receipt['transactionHash'].hex()} failed")
+            return receipt
+        try:
+            tx_hash = fn.transact({"from": sender.address, "value": value})
+        except Exception as e:
+            raise TransactionFailed(str(e)) from e
+        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        if receipt["status"] != 1:
+            raise TransactionFailed(f"transaction {tx_hash.hex()} failed")
+        return receipt
+
+    def deploy_dual_space(
+        self,
+        owner: Any,
+        name: str = "NAME",
+        symbol: str = "symbol",
+        oracle_expiration: int = 1000,
+    ) -> DualSpaceDeployment:
+        """
+        same deployment as `deploy.py` without sponsorship, `owner` is ignored and the deployer key owns both contracts
+        """
+        core_impl = self.registry.contract(self.c_w3, "DualSpaceNFTCore").constructor().transact().executed()
+        core_proxy = (
+            self.registry.contract(self.c_w3, "DeploymentProxy")
+            .constructor(core_impl["contractCreated"], b"")
+            .transact()
+            .executed()
+        )
+        evm_impl = self.transact(self.registry.contract(self.w3, "DualSpaceNFTEvm").constructor(), self.e_owner)
+        evm_proxy = self.transact(
+            self.registry.contract(self.w3, "DeploymentProxy").constructor(evm_impl["contractAddress"], b""),
+            self.e_owner,
+        )
+        core_contract = self.registry.contract(self.c_w3, "DualSpaceNFTCore", core_proxy["contractCreated"])
+        evm_contract = self.registry.contract(self.w3, "DualSpaceNFTEvm", evm_proxy["contractAddress"])
+        mapped_address = core_contract.address.mapped_evm_space_address
+        self.transact(evm_contract.functions.initialize(name, symbol, mapped_address), self.e_owner)
+        self.transact(
+            core_contract.functions.initialize(
+                name,
+                symbol,
+                bytes.fromhex(evm_contract.address[2:]),
+                self.c_w3.cfx.contract(name="CrossSpaceCall").address,
+                self.espace_chain_id,
+                oracle_expiration,
+            ),
+            self.c_owner,
+        )
+        return DualSpaceDeployment(core_contract, evm_contract, mapped_address)
+
+    def mine(self, blocks: int = 1):
+        target = self.c_w3.cfx.epoch_number + blocks
+        while self.c_w3.cfx.epoch_number < target:
+            time.sleep(0.5)
+
+
+def make_backend() -> Any:
+    """
+    DUAL_SPACE_BACKEND=sim (default) runs the in-process simulator,
+    DUAL_SPACE_BACKEND=node uses CORE_URL, EVM_URL and SECRET_KEY
+    """
+    backend = os.environ.get("DUAL_SPACE_BACKEND", "sim")
+    if backend == "sim":
+        return DualSpaceSimulator()
+    if backend == "node":
+        return NodeBackend(os.environ["CORE_URL"], os.environ["EVM_URL"], os.environ["SECRET_KEY"])
+    raise ValueError(f"unknown DUAL_SPACE_BACKEND {backend}")
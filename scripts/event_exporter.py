@@ -0,0 +1,320 @@
+"""
+streaming export of `Transfer` and `BatchStart` logs of both spaces to parquet
+
+events are decoded with the ABIs of `build/contracts` and written as hive partitions by batch number:
+
+    out_dir/Transfer/batch_nbr=20230401/part-core-<from block>-<to block>-0.parquet
+    out_dir/BatchStart/batch_nbr=20230401/part-evm-<from block>-<to block>-0.parquet
+
+`Transfer` rows carry the batch / rarity / batch internal id split of the token id (`token_codec.decode`).
+addresses are exported in hex form for both spaces.
+
+logs are fetched in block (epoch for core space) windows that halve when the node answers with a "too many results"
+error and double again after successful windows. decoded rows are buffered up to `max_rows` and flushed
+as one file per partition, so memory does not depend on the history length.
+the cursor of each space is saved to `out_dir/_state.json` after every flush, files of a flush that was interrupted
+before its cursor got saved are removed on the next run, so appends are resumable.
+
+    pyarrow.dataset.dataset("out_dir/Transfer", partitioning="hive").to_table()
+
+usage (CORE_URL, EVM_URL, CORE_CONTRACT_ADDRESS and EVM_CONTRACT_ADDRESS from env):
+    python -m scripts.event_exporter out_dir --core-start 1000 --evm-start 2000
+"""
+
+import argparse
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from eth_abi import decode
+
+from scripts.artifacts import ArtifactRegistry, registry as default_registry
+from scripts.instrumentation import export_from_env
+from scripts.ownership_indexer import CORE, EVM, Log, LogSource
+from scripts.token_codec import decode as decode_token_ids
+
+STATE_FILE = "_state.json"
+VERSION = 1
+EVENTS = ("Transfer", "BatchStart")
+
+# messages of public core space / espace nodes when a log query is over their result or range limit
+TOO_MANY_RESULTS = re.compile(
+    r"too many|more than \d+|exceed|response size|range .*too (large|big|wide)",
+    re.IGNORECASE,
+)
+PART_FILE = re.compile(r"part-(core|evm)-(\d+)-(\d+)-\d+\.parquet$")
+
+
+def _arrow_type(abi_type: str) -> pa.DataType:
+    if abi_type == "address":
+        return pa.string()
+    if abi_type.startswith("uint"):
+        # token ids, batch numbers and blocks fit in uint64 (`token_codec`)
+        return pa.uint64()
+    if abi_type.startswith("bytes"):
+        return pa.binary()
+    raise ValueError(f"unsupported event parameter type {abi_type}")
+
+
+class EventDecoder:
+    """
+    decodes the logs of `EVENTS` with the contract ABI
+    """
+
+    def __init__(self, abi: List[Dict[str, Any]], topics: Dict[str, str]):
+        # topic => (event name, inputs)
+        self.events: Dict[bytes, Tuple[str, List[Dict[str, Any]]]] = {}
+        by_name = {item["name"]: item for item in abi if item.get("type") == "event"}
+        for signature, topic in topics.items():
+            name = signature.split("(")[0]
+            if name in EVENTS:
+                self.events[bytes.fromhex(topic[2:])] = (name, by_name[name]["inputs"])
+
+    @property
+    def topics(self) -> List[bytes]:
+        return list(self.events)
+
+    def schema(self, name: str) -> pa.Schema:
+        inputs = next(inputs for event, inputs in self.events.values() if event == name)
+        fields = [
+            pa.field("space", pa.string()),
+            pa.field("block", pa.uint64()),
+            pa.field("transaction_hash", pa.binary()),
+            pa.field("log_index", pa.uint32()),
+        ]
+        fields += [pa.field(i["name"], _arrow_type(i["type"])) for i in inputs]
+        if name == "Transfer":
+            fields += [pa.field("rarity", pa.uint64()), pa.field("internal_id", pa.uint64())]
+        fields.append(pa.field("batch_nbr", pa.uint64()))
+        return pa.schema(fields)
+
+    def decode(self, space: str, log: Log) -> Optional[Tuple[str, Dict[str, Any]]]:
+        event = self.events.get(log.topics[0])
+        if event is None:
+            return None
+        name, inputs = event
+        indexed = iter(log.topics[1:])
+        values = iter(decode([i["type"] for i in inputs if not i["indexed"]], log.data))
+        row: Dict[str, Any] = {
+            "space": space,
+            "block": log.block,
+            "transaction_hash": log.transaction_hash,
+            "log_index": log.log_index,
+        }
+        for i in inputs:
+            if i["indexed"]:
+                value: Any = decode([i["type"]], next(indexed))[0]
+            else:
+                value = next(values)
+            row[i["name"]] = value.lower() if i["type"] == "address" else value
+        return name, row
+
+
+class AdaptiveWindow:
+    def __init__(self, size: int = 1000, minimum: int = 1, maximum: int = 100000):
+        self.size = size
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def shrink(self) -> bool:
+        """
+        returns False if the window is already at its minimum
+        """
+        if self.size <= self.minimum:
+            return False
+        self.size = max(self.minimum, self.size // 2)
+        return True
+
+    def grow(self):
+        self.size = min(self.maximum, self.size * 2)
+
+
+class PartitionWriter:
+    """
+    buffers rows of one event as columns
+    """
+
+    def __init__(self, out_dir: str, name: str, schema: pa.Schema):
+        self.path = os.path.join(out_dir, name)
+        self.name = name
+        self.schema = schema
+        self.columns: Dict[str, List[Any]] = {f.name: [] for f in schema}
+
+    def __len__(self) -> int:
+        return len(self.columns["block"])
+
+    def append(self, row: Dict[str, Any]):
+        for key, column in self.columns.items():
+            column.append(row.get(key))
+
+    def _table(self) -> pa.Table:
+        if self.name == "Transfer":
+            batch_nbrs, rarities, internal_ids = decode_token_ids(np.array(self.columns["tokenId"], dtype=np.uint64))
+            self.columns["batch_nbr"] = batch_nbrs
+            self.columns["rarity"] = rarities
+            self.columns["internal_id"] = internal_ids
+        else:
+            self.columns["batch_nbr"] = self.columns["batchNbr"]
+        return pa.table({key: pa.array(column, type=self.schema.field(key).type) for key, column in self.columns.items()})
+
+    def flush(self, space: str, from_block: int, to_block: int):
+        if len(self):
+            pq.write_to_dataset(
+                self._table(),
+                self.path,
+                partition_cols=["batch_nbr"],
+                basename_template=f"part-{space}-{from_block:012d}-{to_block:012d}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+            )
+        self.columns = {f.name: [] for f in self.schema}
+
+
+class EventExporter:
+    """
+    sources: space => (log source, contract address, first block to export)
+    confirmations: blocks behind the head that are not exported yet, exported rows are never rolled back
+    """
+
+    def __init__(
+        self,
+        out_dir: str,
+        sources: Dict[str, Tuple[LogSource, str, int]],
+        artifact_registry: Optional[ArtifactRegistry] = None,
+        window: int = 1000,
+        max_window: int = 100000,
+        max_rows: int = 100000,
+        confirmations: int = 64,
+    ):
+        artifact_registry = artifact_registry or default_registry
+        self.out_dir = out_dir
+        self.sources = sources
+        self.decoders = {
+            CORE: self._decoder(artifact_registry, "DualSpaceNFTCore"),
+            EVM: self._decoder(artifact_registry, "DualSpaceNFTEvm"),
+        }
+        self.window = window
+        self.max_window = max_window
+        self.max_rows = max_rows
+        self.confirmations = confirmations
+        # space => last exported block
+        self.cursors = {space: start - 1 for space, (_, _, start) in sources.items()}
+        self._load_state()
+
+    @staticmethod
+    def _decoder(artifact_registry: ArtifactRegistry, name: str) -> EventDecoder:
+        artifact = artifact_registry.artifact(name)
+        return EventDecoder(artifact.abi, artifact.topics)
+
+    def _state_path(self) -> str:
+        return os.path.join(self.out_dir, STATE_FILE)
+
+    def _load_state(self):
+        if os.path.exists(self._state_path()):
+            with open(self._state_path()) as f:
+                state = json.load(f)
+            if state.get("version") != VERSION:
+                raise ValueError(f"unsupported export version {state.get('version')}")
+            self.cursors.update(state["cursors"])
+        self._remove_unsaved()
+
+    def _save_state(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        tmp = self._state_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": VERSION, "cursors": self.cursors}, f)
+        os.replace(tmp, self._state_path())
+
+    def _remove_unsaved(self):
+        # files written after the last saved cursor of their space
+        for root, _, files in os.walk(self.out_dir):
+            for file in files:
+                match = PART_FILE.match(file)
+                if match and match.group(1) in self.cursors and int(match.group(2)) > self.cursors[match.group(1)]:
+                    os.remove(os.path.join(root, file))
+
+    def _get_logs(self, space: str, window: AdaptiveWindow, from_block: int, head: int) -> Tuple[List[Log], int]:
+        source, address, _ = self.sources[space]
+        while True:
+            to_block = min(head, from_block + window.size - 1)
+            try:
+                logs = source.get_logs(address, from_block, to_block, self.decoders[space].topics)
+            except Exception as e:
+                if TOO_MANY_RESULTS.search(str(e)) and window.shrink():
+                    continue
+                raise
+            window.grow()
+            return logs, to_block
+
+    def sync_space(self, space: str) -> int:
+        """
+        exports `space` up to its confirmed head, returns the count of exported rows
+        """
+        source, _, _ = self.sources[space]
+        decoder = self.decoders[space]
+        writers = {name: PartitionWriter(self.out_dir, name, decoder.schema(name)) for name in EVENTS}
+        window = AdaptiveWindow(self.window, maximum=self.max_window)
+        head = source.head() - self.confirmations
+        exported = 0
+        flushed = self.cursors[space]
+        cursor = flushed
+
+        def flush():
+            nonlocal flushed
+            for writer in writers.values():
+                writer.flush(space, flushed + 1, cursor)
+            self.cursors[space] = flushed = cursor
+            self._save_state()
+
+        while cursor < head:
+            logs, cursor = self._get_logs(space, window, cursor + 1, head)
+            for log in logs:
+                decoded = decoder.decode(space, log)
+                if decoded is not None:
+                    writers[decoded[0]].append(decoded[1])
+                    exported += 1
+            if sum(len(w) for w in writers.values()) >= self.max_rows:
+                flush()
+        if cursor > flushed:
+            flush()
+        return exported
+
+    def sync(self) -> Dict[str, int]:
+        return {space: self.sync_space(space) for space in self.sources}
+
+
+def main():
+    from deploy import get_c_web3, get_e_web3
+    from scripts.ownership_indexer import CoreLogSource, EvmLogSource
+
+    parser = argparse.ArgumentParser(description="export Transfer and BatchStart logs to parquet")
+    parser.add_argument("out_dir")
+    parser.add_argument("--core-start", type=int, default=0, help="core contract deployment epoch")
+    parser.add_argument("--evm-start", type=int, default=0, help="espace contract deployment block")
+    parser.add_argument("--window", type=int, default=1000, help="initial blocks per log query")
+    parser.add_argument("--max-rows", type=int, default=100000, help="buffered rows before a flush")
+    parser.add_argument("--confirmations", type=int, default=64)
+    args = parser.parse_args()
+    export_from_env()
+
+    c_w3 = get_c_web3()
+    e_w3 = get_e_web3()
+    exporter = EventExporter(
+        args.out_dir,
+        {
+            CORE: (CoreLogSource(c_w3), os.environ["CORE_CONTRACT_ADDRESS"], args.core_start),
+            EVM: (EvmLogSource(e_w3), os.environ["EVM_CONTRACT_ADDRESS"], args.evm_start),
+        },
+        window=args.window,
+        max_rows=args.max_rows,
+        confirmations=args.confirmations,
+    )
+    for space, count in exporter.sync().items():
+        print(f"{space}: {count} events exported up to block {exporter.cursors[space]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+prometheus style metrics of chain interactions
+
+    rpc_request_seconds{method}                      histogram, every JSON-RPC request sent by `providers`
+    rpc_errors_total{method} / rpc_retries_total{method}
+    transaction_gas_used{space, function}            histogram, receipts settled by `PipelinedSender` and `DeploymentGraph`
+    transaction_confirmation_seconds{space, function} histogram, send to receipt
+    transaction_failures_total{space, function}
+
+function is the contract function name resolved from the selector with the ABIs of `build/contracts`,
+"constructor" for deployments and the selector itself if it is unknown.
+
+`export_from_env` is called by the command line scripts:
+METRICS_PORT serves the text exposition format on http://127.0.0.1:METRICS_PORT/metrics (JSON on /metrics.json),
+METRICS_DUMP writes the JSON dump to a file when the process exits.
+"""
+
+import atexit
+import json
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, math.inf)
+GAS_BUCKETS = (21000, 50000, 100000, 200000, 500000, 1000000, 2000000, 5000000, 10000000, 30000000, math.inf)
+
+# contracts whose selectors name the `function` label
+KNOWN_CONTRACTS = ("DualSpaceNFTCore", "DualSpaceNFTEvm", "DeploymentProxy")
+
+Labels = Tuple[str, ...]
+
+
+class Counter:
+    def __init__(self, name: str, help: str, label_names: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> List[Tuple[str, Labels, Tuple[Tuple[str, str], ...], float]]:
+        with self._lock:
+            return [(self.name, labels, (), value) for labels, value in self.values.items()]
+
+    def to_json(self) -> Dict[str, Any]:
+        with self._lock:
+            return {",".join(labels): value for labels, value in self.values.items()}
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, label_names: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels => [bucket counts..., sum, count]
+        self.values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self) -> List[Tuple[str, Labels, Tuple[Tuple[str, str], ...], float]]:
+        samples = []
+        with self._lock:
+            for labels, state in self.values.items():
+                for bound, count in zip(self.buckets, state):
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    samples.append((f"{self.name}_bucket", labels, (("le", le),), count))
+                samples.append((f"{self.name}_sum", labels, (), state[-2]))
+                samples.append((f"{self.name}_count", labels, (), state[-1]))
+        return samples
+
+    def to_json(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                ",".join(labels): {
+                    "count": state[-1],
+                    "sum": state[-2],
+                    "avg": state[-2] / state[-1] if state[-1] else 0,
+                    "buckets": {
+                        ("+Inf" if bound == math.inf else repr(bound)): count
+                        for bound, count in zip(self.buckets, state)
+                    },
+                }
+                for labels, state in self.values.items()
+            }
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, Any] = {}
+
+    def counter(self, name: str, help: str, label_names: Sequence[str] = ()) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, help, label_names))
+
+    def histogram(
+        self, name: str, help: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(name, help, label_names, buckets))
+
+    def render(self) -> str:
+        """
+        prometheus text exposition format
+        """
+        lines = []
+        for metric in self.metrics.values():
+            kind = "counter" if isinstance(metric, Counter) else "histogram"
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {kind}")
+            for name, labels, extra, value in metric.samples():
+                pairs = list(zip(metric.label_names, labels)) + list(extra)
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self) -> Dict[str, Any]:
+        return {name: metric.to_json() for name, metric in self.metrics.items()}
+
+    def dump(self, path: str):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_json(), f, indent=2, sort_keys=True)
+        os.replace(tmp, path)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.render().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(registry.to_json()).encode(), "application/json"
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+registry = MetricsRegistry()
+
+RPC_SECONDS = registry.histogram("rpc_request_seconds", "JSON-RPC request latency", ("method",))
+RPC_ERRORS = registry.counter("rpc_errors_total", "failed JSON-RPC requests", ("method",))
+RPC_RETRIES = registry.counter("rpc_retries_total", "retried JSON-RPC requests", ("method",))
+GAS_USED = registry.histogram("transaction_gas_used", "gas used per transaction", ("space", "function"), GAS_BUCKETS)
+CONFIRMATION_SECONDS = registry.histogram(
+    "transaction_confirmation_seconds", "seconds from send to receipt", ("space", "function")
+)
+TRANSACTION_FAILURES = registry.counter(
+    "transaction_failures_total", "reverted or replaced transactions", ("space", "function")
+)
+
+
+def record_rpc(method: str, seconds: float, error: bool = False, retry: bool = False):
+    RPC_SECONDS.observe(seconds, method)
+    if error:
+        RPC_ERRORS.inc(method)
+    if retry:
+        RPC_RETRIES.inc(method)
+
+
+_function_names: Optional[Dict[str, str]] = None
+_function_names_lock = threading.Lock()
+
+
+def function_name(tx: Dict[str, Any]) -> str:
+    """
+    name of the contract function called by `tx`
+    """
+    global _function_names
+    if not tx.get("to"):
+        return "constructor"
+    data = tx.get("data") or b""
+    selector = data[:10] if isinstance(data, str) else "0x" + bytes(data[:4]).hex()
+    if len(selector) < 10:
+        return "transfer"
+    with _function_names_lock:
+        if _function_names is None:
+            from scripts.artifacts import registry as artifact_registry
+
+            _function_names = {}
+            for name in KNOWN_CONTRACTS:
+                try:
+                    selectors = artifact_registry.artifact(name).selectors
+                except Exception:
+                    # artifacts are not compiled, selectors are reported as is
+                    continue
+                for signature, known_selector in selectors.items():
+                    _function_names.setdefault(known_selector, signature.split("(")[0])
+    return _function_names.get(selector.lower(), selector)
+
+
+def _int(value: Any) -> int:
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+def record_transaction(
+    space: str, function: str, seconds: Optional[float], receipt: Optional[Dict[str, Any]], failed: bool = False
+):
+    """
+    seconds: send to receipt latency, None if unknown (e.g. a resumed transaction)
+    """
+    if receipt is not None and receipt.get("gasUsed") is not None:
+        GAS_USED.observe(_int(receipt["gasUsed"]), space, function)
+    if seconds is not None and receipt is not None:
+        CONFIRMATION_SECONDS.observe(seconds, space, function)
+    if failed:
+        TRANSACTION_FAILURES.inc(space, function)
+
+
+def export_from_env():
+    port = os.environ.get("METRICS_PORT")
+    if port:
+        registry.serve(int(port))
+        print(f"metrics served on http://127.0.0.1:{port}/metrics")
+    dump_path = os.environ.get("METRICS_DUMP")
+    if dump_path:
+        atexit.register(registry.dump, dump_path)
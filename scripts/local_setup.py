@@ -0,0 +1,155 @@
+"""
+local deployment and helpers shared by brownie scripts running against the development network
+"""
+
+from brownie import (
+    MockCrossSpaceCall,  # type:ignore # ContractContainer
+    DualSpaceNFTCore,  # type:ignore
+    DualSpaceNFTEvm,  # type:ignore
+    MockMappedAddress,  # type:ignore
+    DeploymentProxy, # type: ignore
+    web3,
+)
+
+from brownie.network.contract import Contract
+from brownie.network.account import Account, _PrivateKeyAccount, LocalAccount
+from dataclasses import dataclass
+from typing import cast, Callable, Union
+from brownie.exceptions import (
+    VirtualMachineError,
+)
+
+from eth_account.messages import SignableMessage
+
+from scripts.metatransaction import domain_separator, signable_message
+from scripts.mint_signer import sign_mint_message
+
+
+def should_revert(expected_revert_msg: str, f: Callable, *args, **kwargs):
+    try:
+        f(*args, **kwargs)
+    except VirtualMachineError as e:
+        if expected_revert_msg:
+            if expected_revert_msg not in e.message:
+                print(e)
+                raise Exception(
+                    f"no expected string in exception: {expected_revert_msg}"
+                )
+        return
+    else:
+        raise Exception("expect to fail")
+
+
+@dataclass
+class LocalDeployment:
+    cross_space_call: Contract
+    core_contract: Contract
+    evm_contract: Contract
+    mapped_address: str
+
+
+def deploy_local(
+    owner: Account,
+    name: str = "NAME",
+    symbol: str = "symbol",
+    oracle_expiration: int = 1000, # should set to 30 * 24 * 60 * 60 * 2 in deployment env
+) -> LocalDeployment:
+    """
+    deploys the mock cross space call and both contracts behind proxies
+    """
+    espace_chain_id = web3.eth.chain_id
+    cross_space_call = cast(Contract, MockCrossSpaceCall.deploy({"from": owner}))
+    core_contract_impl = cast(
+        Contract,
+        DualSpaceNFTCore.deploy({"from": owner}),
+    )
+    core_contract_proxy = cast(Contract, DeploymentProxy.deploy(core_contract_impl.address, bytes(0), {"from": owner}))
+    addr = core_contract_proxy.address
+    DeploymentProxy.remove(DeploymentProxy[-1])
+    core_contract = DualSpaceNFTCore.at(core_contract_proxy.address)
+
+    mapped_address = cast(
+        Contract, MockMappedAddress.deploy(core_contract.address, {"from": owner})
+    ).address
+    cross_space_call.setMockMapped(core_contract.address, mapped_address)
+    evm_contract_impl = cast(
+        Contract, DualSpaceNFTEvm.deploy({"from": owner})
+    )
+    evm_contract_proxy = cast(Contract, DeploymentProxy.deploy(evm_contract_impl.address, bytes(0), {"from": owner}))
+    addr = evm_contract_proxy.address
+    DeploymentProxy.remove(DeploymentProxy[-1])
+    evm_contract = cast(Contract, DualSpaceNFTEvm.at(addr))
+
+    evm_contract.initialize(name, symbol, mapped_address, {"from": owner})
+    core_contract.initialize(
+        name, symbol, evm_contract.address, cross_space_call.address, espace_chain_id, oracle_expiration, {"from": owner} # set life to 1000 for tests
+    )
+    return LocalDeployment(cross_space_call, core_contract, evm_contract, mapped_address)
+
+
+class MetatransactionConstructor:
+    def __init__(self, chain_id: int, name: str, version: str, contract: Contract):
+        self.name = name
+        self.version = version
+        self.contract = contract
+        self.chain_id = chain_id
+        self.domain_separator = domain_separator(name, version, chain_id, contract.address)
+
+    def construct_eip712_message(
+        self, evm_signer_address: str, token_id: int, new_owner_address: str
+    ) -> SignableMessage:
+        return signable_message(
+            self.domain_separator,
+            self.contract.getMetatransactionNonce(evm_signer_address),
+            token_id,
+            new_owner_address,
+        )
+
+
+def mint_to(
+    core_contract: Contract,
+    batch_nbr: int,
+    oracle_signer: LocalAccount,
+    authorizer: LocalAccount,
+    username: str,
+    rarity: int,
+    core_owner: Union[_PrivateKeyAccount, None],
+    evm_owner: Union[_PrivateKeyAccount, None],
+    random_sender: _PrivateKeyAccount,
+) -> int:
+    core_contract.batchAuthorizeMintPermission(
+        batch_nbr, [username], [rarity], {"from": authorizer}
+    )
+
+    core_address = core_owner.address if core_owner else "0x0000000000000000000000000000000000000000"
+    evm_address = evm_owner.address if evm_owner else "0x0000000000000000000000000000000000000000"
+    signature = sign_mint_message(
+        oracle_signer.private_key, batch_nbr, username, core_address, evm_address
+    )
+    token_id = core_contract.mint.call(
+        batch_nbr,
+        username,
+        core_address,
+        evm_address,
+        (
+            signature.v,
+            signature.r,
+            signature.s,
+        ),
+        {"from": random_sender},
+    )
+
+    mint_tx = core_contract.mint(
+        batch_nbr,
+        username,
+        core_address,
+        evm_address,
+        (
+            signature.v,
+            signature.r,
+            signature.s,
+        ),
+        {"from": random_sender},
+    )
+    # print(mint_tx.events)
+    return token_id
@@ -0,0 +1,280 @@
+"""
+merkle tree of mint permissions for `DualSpaceNFTCore.setMintPermissionRoot` / `mintWithProof`
+
+instead of one `_authorizedRarityMintPermission` SSTORE per username, the authorizer posts the root of a tree whose leaves are
+    keccak256(keccak256(abi.encode(uint256 index, bytes32 usernameHash, uint8 rarity)))
+pairs are hashed sorted (`MerkleProof.verify`) and an odd node is carried up to the next level unchanged.
+leaf indices follow the input order, so appending usernames to the input keeps the index of claimed leaves.
+
+the tree is built in a streaming way: leaves are written to disk while reading the input and every level is hashed
+from the previous one on disk. the username lookup table is external-sorted in runs of `run_size` rows,
+so memory is bounded by `run_size` regardless of the username count.
+
+    tree_dir/meta.json      root, leaf count and the offsets of every level
+    tree_dir/nodes.bin      32 bytes nodes, leaves first and the root last
+    tree_dir/usernames.bin  sorted (usernameHash, uint32 index, uint8 rarity) rows
+
+usage:
+    python -m scripts.merkle_permission build usernames.csv tree_dir
+    python -m scripts.merkle_permission proof tree_dir hello_poap
+    python -m scripts.merkle_permission publish tree_dir 20230401
+"""
+
+import argparse
+import heapq
+import json
+import mmap
+import os
+import tempfile
+from typing import BinaryIO, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from eth_utils import keccak
+
+from scripts.mint_signer import username_hash
+
+META_FILE = "meta.json"
+NODES_FILE = "nodes.bin"
+USERNAMES_FILE = "usernames.bin"
+VERSION = 1
+
+NODE_SIZE = 32
+# usernameHash + uint32 index + uint8 rarity
+ROW_SIZE = 32 + 4 + 1
+
+
+class PermissionProof(NamedTuple):
+    index: int
+    rarity: int
+    proof: List[bytes]
+
+    def to_args(self) -> Tuple[int, int, List[bytes]]:
+        # `MintPermissionProof` tuple
+        return (self.index, self.rarity, self.proof)
+
+
+def leaf(index: int, hashed_username: bytes, rarity: int) -> bytes:
+    return keccak(keccak(index.to_bytes(32, "big") + hashed_username + rarity.to_bytes(32, "big")))
+
+
+def hash_pair(a: bytes, b: bytes) -> bytes:
+    return keccak(a + b) if a < b else keccak(b + a)
+
+
+def verify(root: bytes, leaf_hash: bytes, proof: Iterable[bytes]) -> bool:
+    node = leaf_hash
+    for sibling in proof:
+        node = hash_pair(node, sibling)
+    return node == root
+
+
+def _write_run(rows: List[bytes], directory: str) -> str:
+    rows.sort()
+    fd, path = tempfile.mkstemp(dir=directory, suffix=".run")
+    with os.fdopen(fd, "wb") as f:
+        f.writelines(rows)
+    return path
+
+
+def _read_rows(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            row = f.read(ROW_SIZE)
+            if not row:
+                return
+            yield row
+
+
+def _hash_level(nodes: BinaryIO, reader: BinaryIO, offset: int, length: int) -> int:
+    """
+    appends the parents of the `length` nodes at `offset` to `nodes`, returns the parent count
+    """
+    reader.seek(offset * NODE_SIZE)
+    parents = 0
+    for _ in range(length // 2):
+        pair = reader.read(2 * NODE_SIZE)
+        nodes.write(hash_pair(pair[:NODE_SIZE], pair[NODE_SIZE:]))
+        parents += 1
+    if length % 2:
+        nodes.write(reader.read(NODE_SIZE))
+        parents += 1
+    return parents
+
+
+def build(permissions: Iterable[Tuple[str, int]], tree_dir: str, run_size: int = 100000) -> bytes:
+    """
+    writes the tree of `permissions` to `tree_dir` and returns the root
+    """
+    os.makedirs(tree_dir, exist_ok=True)
+    nodes_path = os.path.join(tree_dir, NODES_FILE)
+    runs: List[str] = []
+    rows: List[bytes] = []
+    count = 0
+    try:
+        with open(nodes_path, "wb") as nodes:
+            for index, (username, rarity) in enumerate(permissions):
+                if not 0 < rarity < 100:
+                    raise ValueError(f"invalid rarity {rarity} of {username}")
+                if index >= 1 << 32:
+                    raise ValueError("too many usernames")
+                hashed = username_hash(username)
+                nodes.write(leaf(index, hashed, rarity))
+                rows.append(hashed + index.to_bytes(4, "big") + bytes([rarity]))
+                count = index + 1
+                if len(rows) >= run_size:
+                    runs.append(_write_run(rows, tree_dir))
+                    rows = []
+            if rows:
+                runs.append(_write_run(rows, tree_dir))
+                rows = []
+        if count == 0:
+            raise ValueError("no username to authorize")
+
+        # username lookup table, merged from the sorted runs
+        with open(os.path.join(tree_dir, USERNAMES_FILE), "wb") as f:
+            previous = None
+            for row in heapq.merge(*(_read_rows(run) for run in runs)):
+                if previous is not None and row[:32] == previous[:32]:
+                    raise ValueError(
+                        f"duplicated username at index {int.from_bytes(row[32:36], 'big')}"
+                    )
+                f.write(row)
+                previous = row
+
+        levels = [(0, count)]
+        with open(nodes_path, "ab") as nodes, open(nodes_path, "rb") as reader:
+            while levels[-1][1] > 1:
+                offset, length = levels[-1]
+                nodes.flush()
+                levels.append((offset + length, _hash_level(nodes, reader, offset, length)))
+            nodes.flush()
+            reader.seek(levels[-1][0] * NODE_SIZE)
+            root = reader.read(NODE_SIZE)
+    finally:
+        for run in runs:
+            os.remove(run)
+
+    with open(os.path.join(tree_dir, META_FILE), "w") as f:
+        json.dump({"version": VERSION, "root": "0x" + root.hex(), "count": count, "levels": levels}, f)
+    return root
+
+
+class MerkleIndex:
+    """
+    serves proofs from a tree built by `build`, the files are memory mapped and never loaded as a whole
+    """
+
+    def __init__(self, tree_dir: str):
+        with open(os.path.join(tree_dir, META_FILE)) as f:
+            meta = json.load(f)
+        if meta.get("version") != VERSION:
+            raise ValueError(f"unsupported tree version {meta.get('version')}")
+        self.root = bytes.fromhex(meta["root"][2:])
+        self.count: int = meta["count"]
+        self.levels: List[Tuple[int, int]] = [tuple(level) for level in meta["levels"]]  # type: ignore
+        self._files = [
+            open(os.path.join(tree_dir, NODES_FILE), "rb"),
+            open(os.path.join(tree_dir, USERNAMES_FILE), "rb"),
+        ]
+        self._nodes = mmap.mmap(self._files[0].fileno(), 0, access=mmap.ACCESS_READ)
+        self._usernames = mmap.mmap(self._files[1].fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _node(self, position: int) -> bytes:
+        return self._nodes[position * NODE_SIZE : (position + 1) * NODE_SIZE]
+
+    def lookup(self, username: str) -> Optional[Tuple[int, int]]:
+        """
+        returns (index, rarity) of `username`
+        """
+        hashed = username_hash(username)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            row = self._usernames[middle * ROW_SIZE : (middle + 1) * ROW_SIZE]
+            if row[:32] < hashed:
+                low = middle + 1
+            elif row[:32] > hashed:
+                high = middle
+            else:
+                return int.from_bytes(row[32:36], "big"), row[36]
+        return None
+
+    def proof(self, index: int) -> List[bytes]:
+        proof = []
+        for offset, length in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < length:
+                proof.append(self._node(offset + sibling))
+            index >>= 1
+        return proof
+
+    def permission_proof(self, username: str) -> Optional[PermissionProof]:
+        found = self.lookup(username)
+        if found is None:
+            return None
+        index, rarity = found
+        return PermissionProof(index, rarity, self.proof(index))
+
+    def close(self):
+        self._nodes.close()
+        self._usernames.close()
+        for f in self._files:
+            f.close()
+
+    def __enter__(self) -> "MerkleIndex":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="merkle mint permission tree")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="build the tree of a username,rarity csv")
+    build_parser.add_argument("csv")
+    build_parser.add_argument("tree_dir")
+    build_parser.add_argument("--run-size", type=int, default=100000)
+    proof_parser = subparsers.add_parser("proof", help="print the proof of a username")
+    proof_parser.add_argument("tree_dir")
+    proof_parser.add_argument("username")
+    publish_parser = subparsers.add_parser("publish", help="set the root as mint permission root of a batch")
+    publish_parser.add_argument("tree_dir")
+    publish_parser.add_argument("batch_nbr", type=int)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from scripts.bulk_authorize import read_csv
+
+        root = build(read_csv(args.csv), args.tree_dir, args.run_size)
+        print(f"root 0x{root.hex()}")
+    elif args.command == "proof":
+        with MerkleIndex(args.tree_dir) as index:
+            permission_proof = index.permission_proof(args.username)
+        if permission_proof is None:
+            raise SystemExit(f"{args.username} is not in the tree")
+        print(
+            json.dumps(
+                {
+                    "index": permission_proof.index,
+                    "rarity": permission_proof.rarity,
+                    "proof": ["0x" + p.hex() for p in permission_proof.proof],
+                }
+            )
+        )
+    else:
+        from deploy import get_c_web3, get_sk
+        from scripts.artifacts import registry
+
+        c_w3 = get_c_web3()
+        c_w3.cfx.default_account = c_w3.account.from_key(get_sk())
+        core_contract = registry.contract(
+            c_w3, "DualSpaceNFTCore", os.environ["CORE_CONTRACT_ADDRESS"]
+        )
+        with MerkleIndex(args.tree_dir) as index:
+            root = index.root
+        core_contract.functions.setMintPermissionRoot(args.batch_nbr, root).transact().executed()
+        print(f"mint permission root of batch {args.batch_nbr} set to 0x{root.hex()}")
+
+
+if __name__ == "__main__":
+    main()
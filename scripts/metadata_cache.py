@@ -0,0 +1,226 @@
+"""
+read-through cache of token uris and metadata
+
+`DualSpaceGeneral.tokenURI` is `baseURI + tokenId / 10^4`, every token of the same batch and rarity shares its metadata.
+`MetadataService` reads `baseURI` once, builds uris locally (`token_codec.metadata_ids`) and fetches the metadata json
+once per (batch, rarity) into an LRU cache with TTL. concurrent lookups of the same uri share one fetch.
+
+the cache is dropped when the base uri changes: `BaseURIChange` logs of the contract are polled through a `LogSource`
+if one is given, otherwise `baseURI` is read again every `base_uri_ttl` seconds.
+tokens are not checked to exist, unlike `tokenURI`.
+
+    service = MetadataService(evm_contract, log_source=EvmLogSource(e_w3), from_block=deployment_block)
+    service.metadata_many(token_ids)
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+from eth_abi import decode
+from eth_utils import keccak
+
+from scripts.ownership_indexer import LogSource
+from scripts.providers import shared_session
+from scripts.token_codec import metadata_ids
+
+BASE_URI_CHANGE_TOPIC = keccak(text="BaseURIChange(string)")
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    thread safe LRU cache whose entries expire `ttl` seconds after they are put
+    """
+
+    def __init__(self, capacity: int = 4096, ttl: float = 3600, clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        # key => (expiration, value)
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self.clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def fetch_json(uri: str) -> Any:
+    response = shared_session().get(uri, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+class MetadataService:
+    """
+    contract: core or espace contract, only `baseURI()` is called
+    fetch: uri => metadata, http(s) json by default
+    """
+
+    def __init__(
+        self,
+        contract: Any,
+        fetch: Callable[[str], Any] = fetch_json,
+        log_source: Optional[LogSource] = None,
+        from_block: int = 0,
+        capacity: int = 4096,
+        ttl: float = 3600,
+        base_uri_ttl: float = 60,
+        max_workers: int = 8,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.contract = contract
+        self.fetch = fetch
+        self.log_source = log_source
+        self.cursor = from_block - 1
+        self.base_uri_ttl = base_uri_ttl
+        self.clock = clock
+        self.cache = LRUCache(capacity, ttl, clock)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # uri => fetch in flight
+        self._in_flight: Dict[str, "Future[Any]"] = {}
+        self._lock = threading.Lock()
+        self._base_uri: Optional[str] = None
+        self._base_uri_expiration = 0.0
+        self.lookups = 0
+        self.fetches = 0
+
+    def _set_base_uri(self, base_uri: str):
+        if base_uri != self._base_uri:
+            self.cache.clear()
+        self._base_uri = base_uri
+
+    def _poll_base_uri_changes(self):
+        head = self.log_source.head()  # type: ignore
+        if head <= self.cursor:
+            return
+        logs = self.log_source.get_logs(  # type: ignore
+            self.contract.address,
+            self.cursor + 1,
+            head,
+            [BASE_URI_CHANGE_TOPIC],
+        )
+        self.cursor = head
+        if logs:
+            self._set_base_uri(decode(["string"], logs[-1].data)[0])
+
+    @property
+    def base_uri(self) -> str:
+        if self._base_uri is None:
+            if self.log_source is not None:
+                # later changes are picked from logs
+                self.cursor = self.log_source.head()
+            self._set_base_uri(self.contract.functions.baseURI().call())
+            self._base_uri_expiration = self.clock() + self.base_uri_ttl
+        elif self.log_source is not None:
+            self._poll_base_uri_changes()
+        elif self.clock() >= self._base_uri_expiration:
+            self._set_base_uri(self.contract.functions.baseURI().call())
+            self._base_uri_expiration = self.clock() + self.base_uri_ttl
+        return self._base_uri  # type: ignore
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        share of token lookups served without a fetch
+        """
+        return 1 - self.fetches / self.lookups if self.lookups else 0.0
+
+    def invalidate(self):
+        """
+        drops cached metadata and reads `baseURI` again on next lookup
+        """
+        self._base_uri = None
+        self.cache.clear()
+
+    def token_uri(self, token_id: int) -> str:
+        return self.token_uris([token_id])[0]
+
+    def token_uris(self, token_ids: Sequence[int]) -> List[str]:
+        base_uri = self.base_uri
+        if not base_uri:
+            return [""] * len(token_ids)
+        return [base_uri + str(i) for i in metadata_ids(token_ids).tolist()]
+
+    def _fetch(self, uri: str) -> "Future[Any]":
+        with self._lock:
+            future = self._in_flight.get(uri)
+            if future is not None:
+                return future
+            future = self._in_flight[uri] = self._executor.submit(self.fetch, uri)
+            self.fetches += 1
+        # outside the lock, the callback runs right away in this thread if the fetch is already done
+        future.add_done_callback(lambda f: self._done(uri, f))
+        return future
+
+    def _done(self, uri: str, future: "Future[Any]"):
+        if future.exception() is None:
+            self.cache.put(uri, future.result())
+        with self._lock:
+            self._in_flight.pop(uri, None)
+
+    def metadata(self, token_id: int) -> Any:
+        return self.metadata_many([token_id])[0]
+
+    def metadata_many(self, token_ids: Sequence[int]) -> List[Any]:
+        """
+        metadata of every token, fetches each distinct (batch, rarity) at most once
+        """
+        uris = self.token_uris(token_ids)
+        self.lookups += len(uris)
+        resolved: Dict[str, Any] = {}
+        futures: Dict[str, "Future[Any]"] = {}
+        for uri in dict.fromkeys(uris):
+            if not uri:
+                resolved[uri] = None
+                continue
+            value = self.cache.get(uri, _MISSING)
+            if value is _MISSING:
+                futures[uri] = self._fetch(uri)
+            else:
+                resolved[uri] = value
+        for uri, future in futures.items():
+            resolved[uri] = future.result()
+        return [resolved[uri] for uri in uris]
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self) -> "MetadataService":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
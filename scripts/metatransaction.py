@@ -0,0 +1,232 @@
+"""
+bulk EIP-712 metatransaction builder for `setCoreOwner` / `clearCoreOwner`
+
+the digest verified by `EvmMetatransactionVerifier._recoverWithNonceChange` is
+    keccak256("\\x19\\x01" || domainSeparator || keccak256(abi.encode(TYPEHASH, nonce, tokenId, newCoreOwner)))
+the domain separator is hashed once per (name, version, chainId, contract) and the struct is hashed directly
+instead of building the typed data JSON for `encode_structured_data` on every message.
+metatransaction nonces are fetched in bulk and tracked locally per evm signer.
+"""
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from eth_account.messages import SignableMessage
+from eth_keys import keys
+from eth_utils import keccak
+
+EIP712_DOMAIN_TYPEHASH = keccak(
+    text="EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)"
+)
+EVM_METATRANSACTION_TYPEHASH = keccak(
+    text="EvmMetatransaction(uint256 metatransactionNonce,uint256 tokenId,address newCoreOwner)"
+)
+
+# evm signer addresses => their current metatransaction nonces
+NonceSource = Callable[[Sequence[str]], List[int]]
+
+
+def _to_bytes(value: Union[str, bytes]) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+
+
+def _address_bytes(address: Any) -> bytes:
+    # accepts hex addresses and conflux Base32Address
+    return _to_bytes(getattr(address, "hex_address", address))
+
+
+def _word(value: Union[int, bytes]) -> bytes:
+    if isinstance(value, bytes):
+        return value.rjust(32, b"\x00")
+    return value.to_bytes(32, "big")
+
+
+@lru_cache(maxsize=64)
+def domain_separator(name: str, version: str, chain_id: int, verifying_contract: str) -> bytes:
+    return keccak(
+        EIP712_DOMAIN_TYPEHASH
+        + keccak(text=name)
+        + keccak(text=version)
+        + _word(chain_id)
+        + _word(_address_bytes(verifying_contract))
+    )
+
+
+def struct_hash(nonce: int, token_id: int, new_core_owner: Any) -> bytes:
+    return keccak(
+        EVM_METATRANSACTION_TYPEHASH
+        + _word(nonce)
+        + _word(token_id)
+        + _word(_address_bytes(new_core_owner))
+    )
+
+
+def signable_message(separator: bytes, nonce: int, token_id: int, new_core_owner: Any) -> SignableMessage:
+    # same value `encode_structured_data` returns for the typed data
+    return SignableMessage(b"\x01", separator, struct_hash(nonce, token_id, new_core_owner))
+
+
+def digest(separator: bytes, nonce: int, token_id: int, new_core_owner: Any) -> bytes:
+    return keccak(b"\x19\x01" + separator + struct_hash(nonce, token_id, new_core_owner))
+
+
+def is_overwhelmingly_same_address(core_address: Any, evm_address: Any) -> bool:
+    # `EvmMetatransactionVerifier.isOverwhelminglySameAddress`, addresses differ only in the first 4 bits
+    core = int.from_bytes(_address_bytes(core_address), "big")
+    evm = int.from_bytes(_address_bytes(evm_address), "big")
+    return (core ^ evm) & ((1 << 156) - 1) == 0
+
+
+def recover_signer(message_digest: bytes, signature: bytes) -> str:
+    if len(signature) != 65:
+        raise ValueError("signature should be 65 bytes")
+    v = signature[64]
+    vrs = (
+        v - 27 if v >= 27 else v,
+        int.from_bytes(signature[:32], "big"),
+        int.from_bytes(signature[32:64], "big"),
+    )
+    public_key = keys.Signature(vrs=vrs).recover_public_key_from_msg_hash(message_digest)
+    return public_key.to_checksum_address()
+
+
+def sign_digest(private_key: bytes, message_digest: bytes) -> bytes:
+    """
+    returns the 65 bytes r || s || v signature accepted by `ECDSA.recover`
+    """
+    signature = keys.PrivateKey(private_key).sign_msg_hash(message_digest)
+    return signature.to_bytes()[:64] + bytes([signature.v + 27])
+
+
+def _sign_chunk(chunk: List[Tuple[bytes, bytes]]) -> List[bytes]:
+    return [sign_digest(private_key, message_digest) for private_key, message_digest in chunk]
+
+
+class Metatransaction(NamedTuple):
+    evm_signer: str
+    nonce: int
+    token_id: int
+    new_core_owner: Any
+    digest: bytes
+
+
+def core_nonce_source(c_w3: Any, core_contract: Any) -> NonceSource:
+    """
+    fetches nonces with one batched `cfx_call` request if the provider supports it (see `make_provider`)
+    """
+
+    def fetch(evm_signers: Sequence[str]) -> List[int]:
+        batch_request = getattr(c_w3.provider, "batch_request", None)
+        if batch_request is None:
+            return [
+                core_contract.functions.getMetatransactionNonce(signer).call()
+                for signer in evm_signers
+            ]
+        results = batch_request(
+            [
+                (
+                    "cfx_call",
+                    [
+                        {
+                            "to": core_contract.address,
+                            "data": core_contract.encodeABI(
+                                fn_name="getMetatransactionNonce", args=[signer]
+                            ),
+                        },
+                        "latest_state",
+                    ],
+                )
+                for signer in evm_signers
+            ]
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return [int(result, 16) for result in results]
+
+    return fetch
+
+
+class MetatransactionBuilder:
+    """
+    nonces are fetched once per evm signer and advanced locally for every built metatransaction,
+    so payloads of one signer must be submitted in build order
+    """
+
+    def __init__(
+        self,
+        chain_id: int,
+        name: str,
+        version: str,
+        core_contract_address: Any,
+        nonce_source: NonceSource,
+        workers: Optional[int] = None,
+        chunk_size: int = 256,
+    ):
+        self.separator = domain_separator(
+            name, version, chain_id, "0x" + _address_bytes(core_contract_address).hex()
+        )
+        self.nonce_source = nonce_source
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self._nonces: Dict[str, int] = {}
+
+    def prefetch_nonces(self, evm_signers: Iterable[str]):
+        missing = list(dict.fromkeys(s.lower() for s in evm_signers if s.lower() not in self._nonces))
+        for i in range(0, len(missing), self.chunk_size):
+            chunk = missing[i : i + self.chunk_size]
+            self._nonces.update(zip(chunk, self.nonce_source(chunk)))
+
+    def peek_nonce(self, evm_signer: str) -> int:
+        """
+        nonce the next built metatransaction of `evm_signer` will use
+        """
+        key = evm_signer.lower()
+        if key not in self._nonces:
+            self.prefetch_nonces([key])
+        return self._nonces[key]
+
+    def reset_nonce(self, evm_signer: str):
+        # e.g. after a payload was dropped without being submitted
+        self._nonces.pop(evm_signer.lower(), None)
+
+    def build(self, evm_signer: str, token_id: int, new_core_owner: Any) -> Metatransaction:
+        nonce = self.peek_nonce(evm_signer)
+        self._nonces[evm_signer.lower()] = nonce + 1
+        return Metatransaction(
+            evm_signer, nonce, token_id, new_core_owner,
+            digest(self.separator, nonce, token_id, new_core_owner),
+        )
+
+    def build_many(self, requests: Iterable[Tuple[str, int, Any]]) -> List[Metatransaction]:
+        requests = list(requests)
+        self.prefetch_nonces(r[0] for r in requests)
+        return [self.build(*r) for r in requests]
+
+    def sign_many(
+        self, requests: Iterable[Tuple[Union[str, bytes], int, Any]]
+    ) -> Iterator[Tuple[Metatransaction, bytes]]:
+        """
+        requests: (evm signer private key, tokenId, new core owner)
+        yields (metatransaction, signature) in input order, signing runs in a process pool
+        """
+        requests = list(requests)
+        signers = [keys.PrivateKey(_to_bytes(k)) for k, _, _ in requests]
+        metatransactions = self.build_many(
+            (signer.public_key.to_checksum_address(), token_id, new_core_owner)
+            for signer, (_, token_id, new_core_owner) in zip(signers, requests)
+        )
+        items = [(s.to_bytes(), m.digest) for s, m in zip(signers, metatransactions)]
+        chunks = [items[i : i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+        if self.workers == 0 or len(chunks) <= 1:
+            signatures: Iterable[bytes] = itertools.chain.from_iterable(map(_sign_chunk, chunks))
+            yield from zip(metatransactions, signatures)
+            return
+        with ProcessPoolExecutor(self.workers or os.cpu_count()) as executor:
+            signatures = itertools.chain.from_iterable(executor.map(_sign_chunk, chunks))
+            yield from zip(metatransactions, signatures)
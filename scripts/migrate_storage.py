@@ -0,0 +1,215 @@
+"""
+storage migration of the packed layout release
+
+after both implementations are upgraded (`upgradeTo` and `upgradeEvmContractTo`), legacy per batch state
+and the per token espace transferable table are still read as fallback.
+`DualSpaceNFTCore.migrateLegacyStorage` moves them to the packed layout chunk by chunk,
+the last chunk sets `finished` and legacy storage is never read again.
+
+batches come from `BatchStart` logs and transferable tokens (core owner cleared) from `Transfer` logs,
+both collected with `OwnershipIndexer`. before the finishing chunk the batches are checked against
+the core contract's own `BatchStart` logs, a started batch missing from the index aborts the migration.
+
+tokens minted before `tokensOfOwner` existed are then added to the owner index of both spaces with `indexTokens`,
+`--owner-index-only` runs this step alone (e.g. after legacy storage is already migrated).
+
+gas used and storage collateralized by every migration chunk are written to `--gas-report`:
+fresh deployments start migrated, so a migration of the legacy layout is where the chunk cost can be measured.
+
+usage (CORE_URL, EVM_URL, SECRET_KEY, CORE_CONTRACT_ADDRESS and EVM_CONTRACT_ADDRESS from env):
+    python -m scripts.migrate_storage --core-start 1000 --evm-start 2000 --index index.json
+"""
+
+import argparse
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from scripts.instrumentation import export_from_env
+from scripts.ownership_indexer import (
+    BATCH_START_TOPIC,
+    CoreLogSource,
+    EvmLogSource,
+    LogSource,
+    OwnershipIndex,
+    OwnershipIndexer,
+)
+from scripts.tx_pipeline import CoreSpace, PendingTransaction, PipelinedSender
+
+
+def migration_targets(index: OwnershipIndex) -> Tuple[List[int], List[int]]:
+    """
+    returns (batch numbers, transferable token ids)
+    """
+    batch_nbrs = sorted(index.batches)
+    token_ids = []
+    for token_id in index.token_ids():
+        ownership = index.owner_of(token_id)
+        if ownership is not None and ownership.evm_transferable:
+            token_ids.append(token_id)
+    return batch_nbrs, sorted(token_ids)
+
+
+def started_batches(source: LogSource, contract: str, from_block: int, chunk_size: int = 1000) -> Set[int]:
+    """
+    batch numbers of every `BatchStart` log of `contract` from `from_block` to the head
+    """
+    head = source.head()
+    batch_nbrs = set()
+    for start in range(from_block, head + 1, chunk_size):
+        for log in source.get_logs(contract, start, min(head, start + chunk_size - 1), [BATCH_START_TOPIC]):
+            batch_nbrs.add(int.from_bytes(log.data[32:64], "big"))
+    return batch_nbrs
+
+
+class StorageMigrator:
+    """
+    chunk_size: batches plus tokens migrated per transaction
+    """
+
+    def __init__(self, c_w3: Any, core_contract: Any, chunk_size: int = 200):
+        self.c_w3 = c_w3
+        self.core_contract = core_contract
+        self.sender = PipelinedSender(CoreSpace(c_w3), c_w3.cfx.default_account)
+        self.chunk_size = chunk_size
+        # (batch count, token count, transaction) of every migration chunk sent
+        self._chunks: List[Tuple[int, int, PendingTransaction]] = []
+
+    def _migrate(self, batch_nbrs: Sequence[int], token_ids: Sequence[int], finished: bool) -> PendingTransaction:
+        tx = {
+            "from": self.sender.sender,
+            "to": self.core_contract.address,
+            "data": self.core_contract.encodeABI(
+                fn_name="migrateLegacyStorage",
+                args=[list(batch_nbrs), list(token_ids), finished],
+            ),
+        }
+        estimate = self.c_w3.cfx.estimate_gas_and_collateral(tx)
+        tx.update({"gas": estimate["gasLimit"], "storageLimit": estimate["storageCollateralized"]})
+        pending = self.sender.submit(tx)
+        self._chunks.append((len(batch_nbrs), len(token_ids), pending))
+        return pending
+
+    def migrate(
+        self,
+        batch_nbrs: Sequence[int],
+        token_ids: Sequence[int],
+        started: Optional[Callable[[], Set[int]]] = None,
+    ) -> int:
+        """
+        started: batch numbers started on chain, checked against `batch_nbrs` before legacy storage is dropped
+        returns the count of migration transactions
+        """
+        items: List[Tuple[str, int]] = [("batch", b) for b in batch_nbrs] + [("token", t) for t in token_ids]
+        chunks = [items[i : i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+        for chunk in chunks[:-1]:
+            self._migrate(
+                [v for kind, v in chunk if kind == "batch"],
+                [v for kind, v in chunk if kind == "token"],
+                False,
+            )
+        # every chunk should be executed before legacy storage is dropped
+        for pending in self.sender.flush():
+            if pending.error is not None:
+                raise Exception(f"migration transaction failed: {pending.error}")
+        if started is not None:
+            missing = sorted(started() - set(batch_nbrs))
+            if missing:
+                # their legacy settings would not be read anymore
+                raise Exception(f"started batches {missing} are not migrated, sync the index and rerun")
+        last = chunks[-1] if chunks else []
+        self.sender.wait(
+            self._migrate(
+                [v for kind, v in last if kind == "batch"],
+                [v for kind, v in last if kind == "token"],
+                True,
+            )
+        )
+        return max(len(chunks), 1)
+
+    def gas_report(self) -> List[Dict[str, Any]]:
+        """
+        gas used and storage collateralized by every executed migration chunk
+        """
+        return [
+            {
+                "batches": batches,
+                "tokens": tokens,
+                "gasUsed": int(pending.receipt["gasUsed"]),
+                "storageCollateralized": int(pending.receipt.get("storageCollateralized") or 0),
+            }
+            for batches, tokens, pending in self._chunks
+            if pending.receipt is not None
+        ]
+
+    def index_tokens(self, token_ids: Sequence[int]) -> int:
+        """
+        returns the count of indexTokens transactions
+        """
+        pending = []
+        for i in range(0, len(token_ids), self.chunk_size):
+            tx = {
+                "from": self.sender.sender,
+                "to": self.core_contract.address,
+                "data": self.core_contract.encodeABI(
+                    fn_name="indexTokens", args=[list(token_ids[i : i + self.chunk_size])]
+                ),
+            }
+            estimate = self.c_w3.cfx.estimate_gas_and_collateral(tx)
+            tx.update({"gas": estimate["gasLimit"], "storageLimit": estimate["storageCollateralized"]})
+            pending.append(self.sender.submit(tx))
+        for p in pending:
+            self.sender.wait(p)
+        return len(pending)
+
+
+def main():
+    from deploy import get_c_web3, get_e_web3, get_sk
+    from scripts.artifacts import registry
+
+    parser = argparse.ArgumentParser(description="migrate legacy storage to the packed layout")
+    parser.add_argument("--core-start", type=int, default=0, help="core contract deployment epoch")
+    parser.add_argument("--evm-start", type=int, default=0, help="espace contract deployment block")
+    parser.add_argument("--index", default=None, help="ownership index state file")
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--owner-index-only", action="store_true", help="only add tokens to the owner index")
+    parser.add_argument("--gas-report", default=None, help="json file of the gas used by every migration chunk")
+    args = parser.parse_args()
+    export_from_env()
+
+    c_w3 = get_c_web3()
+    e_w3 = get_e_web3()
+    c_w3.cfx.default_account = c_w3.account.from_key(get_sk())
+    core_contract = registry.contract(c_w3, "DualSpaceNFTCore", os.environ["CORE_CONTRACT_ADDRESS"])
+    indexer = OwnershipIndexer(
+        CoreLogSource(c_w3),
+        core_contract.address,
+        EvmLogSource(e_w3),
+        os.environ["EVM_CONTRACT_ADDRESS"],
+        core_start=args.core_start,
+        evm_start=args.evm_start,
+        state_path=args.index,
+    )
+    indexer.sync()
+    migrator = StorageMigrator(c_w3, core_contract, args.chunk_size)
+    if not args.owner_index_only:
+        batch_nbrs, token_ids = migration_targets(indexer.index)
+        print(f"migrating {len(batch_nbrs)} batches and {len(token_ids)} transferable tokens")
+        transactions = migrator.migrate(
+            batch_nbrs,
+            token_ids,
+            lambda: started_batches(CoreLogSource(c_w3), core_contract.address, args.core_start),
+        )
+        print(f"legacy storage migrated in {transactions} transactions")
+        report = migrator.gas_report()
+        print(f"{sum(chunk['gasUsed'] for chunk in report)} gas used")
+        if args.gas_report:
+            with open(args.gas_report, "w") as f:
+                json.dump(report, f, indent=2)
+    token_ids = indexer.index.token_ids()
+    transactions = migrator.index_tokens(token_ids)
+    print(f"{len(token_ids)} tokens added to the owner index in {transactions} transactions")
+
+
+if __name__ == "__main__":
+    main()
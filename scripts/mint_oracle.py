@@ -0,0 +1,527 @@
+"""
+reference mint oracle server
+
+`DualSpaceNFTCore.mint` requires a signature of the batch oracle signer over
+(batchNbr, usernameHash, ownerCoreAddress, ownerEvmAddress), the oracle proves the caller owns the username.
+for each request this server
+
+- answers from the signatures already issued, kept in an LRU in front of a sqlite store, so retries cost neither
+  identity checks nor signing. a signature only mints to the owners it names, cached ones are returned as is
+- admits new requests per batch through a token bucket, requests over the limit get 429 with Retry-After
+- checks the caller through a pluggable `IdentityVerifier`, `GithubVerifier` or the local `AllowAllVerifier`
+- queues the request to one signing thread that signs up to `max_batch` requests with `MintSigner.sign_many`
+  and stores them in one sqlite transaction, concurrent requests of the same message share one signature
+
+    POST /sign  {"batchNbr": 20230401, "username": "alice", "coreOwner": "cfx:.." | "0x.." | null,
+                 "evmOwner": "0x.." | null, "credential": "<github token>"}
+        => {"v": 27, "r": "0x..", "s": "0x..", "cached": false}
+    GET  /metrics
+
+usage (ORACLE_SECRET_KEY from env):
+    python -m scripts.mint_oracle serve --port 8546 --batch 20230401 --rate 200
+    python -m scripts.mint_oracle loadtest --count 20000 --concurrency 32
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from cfx_address import Base32Address
+
+from scripts.instrumentation import LATENCY_BUCKETS, export_from_env, registry as metrics_registry
+from scripts.metadata_cache import LRUCache
+from scripts.mint_signer import MintRequest, MintSignature, MintSigner, mint_message_hash
+from scripts.providers import shared_session
+
+REQUEST_SECONDS = metrics_registry.histogram(
+    "oracle_request_seconds", "mint oracle request latency", ("outcome",), (0.0005, 0.001, 0.0025) + LATENCY_BUCKETS
+)
+
+
+class OracleError(Exception):
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class IdentityVerifier:
+    def verify(self, batch_nbr: int, username: str, credential: Optional[str]) -> bool:
+        raise NotImplementedError
+
+
+class AllowAllVerifier(IdentityVerifier):
+    """
+    accepts every caller, for local tests only
+    """
+
+    def verify(self, batch_nbr: int, username: str, credential: Optional[str]) -> bool:
+        return True
+
+
+class GithubVerifier(IdentityVerifier):
+    """
+    credential is a github token whose login must be the username
+    """
+
+    def __init__(self, api_url: str = "https://api.github.com/user"):
+        self.api_url = api_url
+
+    def verify(self, batch_nbr: int, username: str, credential: Optional[str]) -> bool:
+        if not credential:
+            return False
+        response = shared_session().get(self.api_url, headers={"Authorization": f"Bearer {credential}"}, timeout=10)
+        if response.status_code == 401:
+            return False
+        response.raise_for_status()
+        return response.json().get("login", "").lower() == username.lower()
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, clock: Any = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def acquire(self) -> float:
+        """
+        takes one token, returns 0 if admitted otherwise seconds until a token is available
+        """
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionControl:
+    """
+    rate / burst: signatures per second and burst size of each batch
+    batches: served batch numbers, every batch if None
+    """
+
+    def __init__(self, rate: float = 200, burst: float = 400, batches: Optional[Set[int]] = None):
+        self.rate = rate
+        self.burst = burst
+        self.batches = batches
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def admit(self, batch_nbr: int):
+        if self.batches is not None and batch_nbr not in self.batches:
+            raise OracleError(404, f"batch {batch_nbr} is not served")
+        with self._lock:
+            bucket = self._buckets.get(batch_nbr)
+            if bucket is None:
+                bucket = self._buckets[batch_nbr] = TokenBucket(self.rate, self.burst)
+            retry_after = bucket.acquire()
+        if retry_after:
+            raise OracleError(429, f"too many requests for batch {batch_nbr}", retry_after)
+
+
+class SignatureStore:
+    """
+    issued signatures keyed by mint message hash, an LRU of `capacity` entries in front of a sqlite file
+    """
+
+    def __init__(self, path: str = ":memory:", capacity: int = 100000):
+        self.cache = LRUCache(capacity, ttl=math.inf)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS signatures (hash BLOB PRIMARY KEY, v INTEGER, r BLOB, s BLOB) WITHOUT ROWID"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes) -> Optional[MintSignature]:
+        signature = self.cache.get(key)
+        if signature is not None:
+            return signature
+        with self._lock:
+            row = self._db.execute("SELECT v, r, s FROM signatures WHERE hash = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        signature = MintSignature(*row)
+        self.cache.put(key, signature)
+        return signature
+
+    def put_many(self, items: List[Tuple[bytes, MintSignature]]):
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO signatures VALUES (?, ?, ?, ?)",
+                [(key, s.v, s.r, s.s) for key, s in items],
+            )
+        for key, signature in items:
+            self.cache.put(key, signature)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class SigningBatcher:
+    """
+    signs queued requests in groups of up to `max_batch`, a group waits at most `max_delay` seconds to fill
+    """
+
+    def __init__(self, signer: MintSigner, store: SignatureStore, max_batch: int = 256, max_delay: float = 0.002):
+        self.signer = signer
+        self.store = store
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: "queue.Queue[Optional[Tuple[bytes, MintRequest, Future]]]" = queue.Queue()
+        # message hash => signature in progress
+        self._in_flight: Dict[bytes, "Future[MintSignature]"] = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, key: bytes, request: MintRequest) -> "Future[MintSignature]":
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._in_flight[key] = Future()
+                self._queue.put((key, request, future))
+            return future
+
+    @property
+    def pending(self) -> int:
+        return len(self._in_flight)
+
+    def _next_group(self) -> Optional[List[Tuple[bytes, MintRequest, Future]]]:
+        item = self._queue.get()
+        if item is None:
+            return None
+        group = [item]
+        deadline = time.monotonic() + self.max_delay
+        while len(group) < self.max_batch:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is None:
+                # sign what is queued, stop on next call
+                self._queue.put(None)
+                break
+            group.append(item)
+        return group
+
+    def _run(self):
+        while True:
+            group = self._next_group()
+            if group is None:
+                return
+            try:
+                signatures = list(self.signer.sign_many(request for _, request, _ in group))
+                self.store.put_many([(key, signature) for (key, _, _), signature in zip(group, signatures)])
+            except Exception as e:
+                for _, _, future in group:
+                    future.set_exception(e)
+            else:
+                for (_, _, future), signature in zip(group, signatures):
+                    future.set_result(signature)
+            finally:
+                with self._lock:
+                    for key, _, _ in group:
+                        self._in_flight.pop(key, None)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+def _address(value: Any) -> Optional[str]:
+    if not value:
+        return None
+    if ":" in value:
+        return Base32Address(value).hex_address
+    return value
+
+
+def parse_request(payload: Dict[str, Any]) -> Tuple[MintRequest, Optional[str]]:
+    """
+    returns the request and the identity credential of a /sign payload
+    """
+    try:
+        request = MintRequest(
+            int(payload["batchNbr"]),
+            str(payload["username"]),
+            _address(payload.get("coreOwner")),
+            _address(payload.get("evmOwner")),
+        )
+        credential = payload.get("credential")
+    except Exception as e:
+        raise OracleError(400, f"malformed request: {e}")
+    if not request.username:
+        raise OracleError(400, "malformed request: empty username")
+    return request, credential
+
+
+class MintOracle:
+    def __init__(
+        self,
+        signer: MintSigner,
+        verifier: IdentityVerifier,
+        store: SignatureStore,
+        admission: AdmissionControl,
+        max_batch: int = 256,
+        max_delay: float = 0.002,
+        timeout: float = 10,
+    ):
+        self.signer = signer
+        self.verifier = verifier
+        self.store = store
+        self.admission = admission
+        self.batcher = SigningBatcher(signer, store, max_batch, max_delay)
+        self.timeout = timeout
+
+    def sign(self, request: MintRequest, credential: Optional[str] = None) -> Tuple[MintSignature, bool]:
+        """
+        returns the signature and whether it was issued before
+        """
+        try:
+            key = mint_message_hash(*request)
+        except ValueError as e:
+            raise OracleError(400, f"malformed request: {e}")
+        signature = self.store.get(key)
+        if signature is not None:
+            return signature, True
+        self.admission.admit(request.batch_nbr)
+        if not self.verifier.verify(request.batch_nbr, request.username, credential):
+            raise OracleError(403, f"caller is not {request.username}")
+        return self.batcher.submit(key, request).result(self.timeout), False
+
+    def close(self):
+        self.batcher.close()
+        self.signer.close()
+        self.store.close()
+
+    def __enter__(self) -> "MintOracle":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def make_handler(oracle: MintOracle):
+    class OracleHandler(BaseHTTPRequestHandler):
+        # keep-alive, clients retry and poll over one connection
+        protocol_version = "HTTP/1.1"
+
+        def _reply(
+            self, code: int, body: Any, content_type: str = "application/json", headers: Optional[Dict[str, str]] = None
+        ):
+            data = body if isinstance(body, bytes) else json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            start = time.perf_counter()
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path != "/sign":
+                return self._reply(404, {"error": "not found"})
+            outcome = "error"
+            try:
+                request, credential = parse_request(json.loads(body))
+                signature, cached = oracle.sign(request, credential)
+                outcome = "cached" if cached else "signed"
+                self._reply(
+                    200,
+                    {
+                        "v": signature.v,
+                        "r": "0x" + signature.r.hex(),
+                        "s": "0x" + signature.s.hex(),
+                        "cached": cached,
+                    },
+                )
+            except OracleError as e:
+                outcome = str(e.status)
+                headers = {"Retry-After": str(math.ceil(e.retry_after))} if e.retry_after else {}
+                self._reply(e.status, {"error": str(e)}, headers=headers)
+            except json.JSONDecodeError as e:
+                outcome = "400"
+                self._reply(400, {"error": f"malformed request: {e}"})
+            except Exception as e:
+                self._reply(500, {"error": str(e)})
+            finally:
+                REQUEST_SECONDS.observe(time.perf_counter() - start, outcome)
+
+        def do_GET(self):
+            if self.path != "/metrics":
+                return self._reply(404, {"error": "not found"})
+            self._reply(200, metrics_registry.render().encode(), "text/plain; version=0.0.4")
+
+        def log_message(self, *args):
+            pass
+
+    return OracleHandler
+
+
+class OracleServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # clients open many keep-alive connections at once, the default backlog of 5 resets them
+    request_queue_size = 1024
+
+
+def serve(oracle: MintOracle, host: str = "127.0.0.1", port: int = 8546) -> ThreadingHTTPServer:
+    return OracleServer((host, port), make_handler(oracle))
+
+
+def _serve_local(port_queue: Any, rate: float, workers: Optional[int]):
+    # load test server process, a fresh key and an in-memory store
+    oracle = MintOracle(
+        MintSigner(os.urandom(32), workers=workers),
+        AllowAllVerifier(),
+        SignatureStore(),
+        AdmissionControl(rate, rate),
+    )
+    server = serve(oracle, port=0)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def load_test(url: str, payloads: Iterable[Dict[str, Any]], concurrency: int = 32) -> Dict[str, float]:
+    """
+    posts every payload to `url` over `concurrency` keep-alive connections, returns latency percentiles in ms
+    """
+    parsed = urlparse(url)
+    payload_iter = iter(payloads)
+    iter_lock = threading.Lock()
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    results_lock = threading.Lock()
+
+    def worker():
+        connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+        local_latencies = []
+        local_statuses: Dict[int, int] = {}
+        while True:
+            with iter_lock:
+                payload = next(payload_iter, None)
+            if payload is None:
+                break
+            body = json.dumps(payload)
+            start = time.perf_counter()
+            try:
+                connection.request("POST", parsed.path or "/sign", body, {"Content-Type": "application/json"})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                # counted as status 0, the next request reconnects
+                connection.close()
+                status = 0
+            local_latencies.append(time.perf_counter() - start)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+        connection.close()
+        with results_lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return {
+        "requests": len(latencies),
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": percentile(0.5),
+        "p90_ms": percentile(0.9),
+        "p99_ms": percentile(0.99),
+        "max_ms": latencies[-1] * 1000,
+        **{f"status_{status}": count for status, count in sorted(statuses.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="mint oracle server")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8546)
+    serve_parser.add_argument("--batch", type=int, action="append", help="served batch number, repeatable")
+    serve_parser.add_argument("--store", default="oracle-signatures.sqlite")
+    serve_parser.add_argument("--rate", type=float, default=200, help="new signatures per second per batch")
+    serve_parser.add_argument("--burst", type=float, default=400)
+    serve_parser.add_argument("--workers", type=int, default=0, help="signing processes, 0 to sign in process")
+    serve_parser.add_argument("--verifier", choices=("github", "allow-all"), default="github")
+    load_parser = subparsers.add_parser("loadtest", help="load test a local oracle, or --url")
+    load_parser.add_argument("--url", default=None)
+    load_parser.add_argument("--count", type=int, default=20000)
+    load_parser.add_argument("--unique", type=int, default=None, help="distinct usernames, count / 2 by default")
+    load_parser.add_argument("--concurrency", type=int, default=32)
+    load_parser.add_argument("--batch", type=int, default=20230401)
+    load_parser.add_argument("--workers", type=int, default=None, help="signing processes of the local oracle")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        export_from_env()
+        oracle = MintOracle(
+            MintSigner(os.environ["ORACLE_SECRET_KEY"], workers=args.workers),
+            GithubVerifier() if args.verifier == "github" else AllowAllVerifier(),
+            SignatureStore(args.store),
+            AdmissionControl(args.rate, args.burst, set(args.batch) if args.batch else None),
+        )
+        server = serve(oracle, args.host, args.port)
+        print(f"mint oracle of {oracle.signer.address} listening on {args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        finally:
+            oracle.close()
+        return
+
+    process = None
+    url = args.url
+    if url is None:
+        port_queue: Any = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_serve_local, args=(port_queue, 10**6, args.workers), daemon=True)
+        process.start()
+        url = f"http://127.0.0.1:{port_queue.get()}/sign"
+    unique = args.unique or max(args.count // 2, 1)
+    # usernames come round robin, requests after the first `unique` ones are retries
+    payloads = (
+        {"batchNbr": args.batch, "username": f"user_{i % unique}", "coreOwner": None, "evmOwner": f"0x{i % unique:040x}"}
+        for i in itertools.islice(itertools.count(), args.count)
+    )
+    try:
+        print(json.dumps(load_test(url, payloads, args.concurrency), indent=2))
+    finally:
+        if process is not None:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
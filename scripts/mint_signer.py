@@ -0,0 +1,234 @@
+"""
+bulk mint oracle signer
+
+the oracle signature verified by `DualSpaceNFTCore.mint` is
+    ecrecover(keccak256(abi.encodePacked(batchNbr, usernameHash, ownerCoreAddress, ownerEvmAddress)))
+`mint_to` in setup-contracts computes it via solidityKeccak + signHash for each username,
+this module builds the packed message by hand (the uint128 batch prefix is packed once per batch)
+and spreads the secp256k1 work over a process pool.
+
+benchmark:
+    python -m scripts.mint_signer --count 20000 --workers 8
+"""
+
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from eth_keys import keys
+from eth_utils import keccak
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+AddressLike = Union[str, bytes, None]
+
+
+class MintRequest(NamedTuple):
+    batch_nbr: int
+    username: str
+    # hex address, `None` or zero address means the token is held by the contract in that space
+    core_owner: AddressLike
+    evm_owner: AddressLike
+
+
+class MintSignature(NamedTuple):
+    v: int
+    r: bytes
+    s: bytes
+
+
+def _address_bytes(address: AddressLike) -> bytes:
+    if address is None:
+        return bytes(20)
+    if isinstance(address, bytes):
+        if len(address) != 20:
+            raise ValueError(f"invalid address length: {len(address)}")
+        return address
+    # Base32Address exposes the hex form via `hex_address`
+    address = getattr(address, "hex_address", address)
+    raw = bytes.fromhex(address[2:] if address.startswith("0x") else address)
+    if len(raw) != 20:
+        raise ValueError(f"invalid address: {address}")
+    return raw
+
+
+@lru_cache(maxsize=1024)
+def batch_prefix(batch_nbr: int) -> bytes:
+    # abi.encodePacked(uint128)
+    return batch_nbr.to_bytes(16, "big")
+
+
+def username_hash(username: str) -> bytes:
+    # keccak256(abi.encodePacked(username))
+    return keccak(text=username)
+
+
+def mint_message_hash(
+    batch_nbr: int, username: str, core_owner: AddressLike, evm_owner: AddressLike
+) -> bytes:
+    return keccak(
+        batch_prefix(batch_nbr)
+        + username_hash(username)
+        + _address_bytes(core_owner)
+        + _address_bytes(evm_owner)
+    )
+
+
+def sign_mint_message(
+    private_key: Union[str, bytes],
+    batch_nbr: int,
+    username: str,
+    core_owner: AddressLike,
+    evm_owner: AddressLike,
+) -> MintSignature:
+    return _sign_hash(
+        _private_key(private_key),
+        mint_message_hash(batch_nbr, username, core_owner, evm_owner),
+    )
+
+
+def _private_key(private_key: Union[str, bytes]) -> keys.PrivateKey:
+    if isinstance(private_key, str):
+        private_key = bytes.fromhex(private_key[2:] if private_key.startswith("0x") else private_key)
+    return keys.PrivateKey(private_key)
+
+
+def _sign_hash(private_key: keys.PrivateKey, message_hash: bytes) -> MintSignature:
+    signature = private_key.sign_msg_hash(message_hash)
+    # ecrecover expects v in {27, 28}
+    return MintSignature(
+        signature.v + 27,
+        signature.r.to_bytes(32, "big"),
+        signature.s.to_bytes(32, "big"),
+    )
+
+
+# per worker process state, set by `_init_worker`
+_worker_key: Optional[keys.PrivateKey] = None
+
+
+def _init_worker(private_key: bytes):
+    global _worker_key
+    _worker_key = keys.PrivateKey(private_key)
+
+
+def _sign_chunk(chunk: List[Tuple[int, str, bytes, bytes]]) -> List[MintSignature]:
+    assert _worker_key is not None, "worker is not initialized"
+    prefixes: Dict[int, bytes] = {}
+    signatures = []
+    for batch_nbr, username, core_owner, evm_owner in chunk:
+        prefix = prefixes.get(batch_nbr)
+        if prefix is None:
+            prefix = prefixes[batch_nbr] = batch_prefix(batch_nbr)
+        signatures.append(
+            _sign_hash(
+                _worker_key,
+                keccak(prefix + username_hash(username) + core_owner + evm_owner),
+            )
+        )
+    return signatures
+
+
+@dataclass
+class MintSigner:
+    """
+    signs a stream of `MintRequest` with the oracle signer key, signatures are yielded in input order
+
+    `workers=0` signs in the calling process
+    """
+
+    private_key: Union[str, bytes]
+    workers: Optional[int] = None
+    chunk_size: int = 512
+
+    def __post_init__(self):
+        self._key = _private_key(self.private_key)
+        self._executor: Optional[Executor] = None
+        if self.workers != 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self._key.to_bytes(),),
+            )
+
+    @property
+    def address(self) -> str:
+        return self._key.public_key.to_checksum_address()
+
+    def sign(self, request: MintRequest) -> MintSignature:
+        return _sign_hash(self._key, mint_message_hash(*request))
+
+    def sign_many(self, requests: Iterable[MintRequest]) -> Iterator[MintSignature]:
+        chunks = self._chunks(requests)
+        if self._executor is None:
+            _init_worker(self._key.to_bytes())
+            for chunk in chunks:
+                yield from _sign_chunk(chunk)
+            return
+        # executor.map would drain the whole input first, keep a bounded window of chunks in flight
+        window = (self.workers or os.cpu_count() or 1) * 2
+        pending = []
+        for chunk in chunks:
+            pending.append(self._executor.submit(_sign_chunk, chunk))
+            if len(pending) >= window:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+    def _chunks(self, requests: Iterable[MintRequest]) -> Iterator[List[Tuple[int, str, bytes, bytes]]]:
+        # addresses are normalized here so malformed input fails in the caller process
+        normalized = (
+            (r[0], r[1], _address_bytes(r[2]), _address_bytes(r[3])) for r in requests
+        )
+        while True:
+            chunk = list(itertools.islice(normalized, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> "MintSigner":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def benchmark(count: int, workers: Optional[int], chunk_size: int = 512) -> float:
+    """
+    returns signatures per second
+    """
+    private_key = os.urandom(32)
+    requests = (
+        MintRequest(20230401, f"user_{i}", f"0x{i:040x}", f"0x{i:040x}")
+        for i in range(count)
+    )
+    with MintSigner(private_key, workers=workers, chunk_size=chunk_size) as signer:
+        start = time.perf_counter()
+        signed = sum(1 for _ in signer.sign_many(requests))
+        elapsed = time.perf_counter() - start
+    assert signed == count
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="mint signature throughput benchmark")
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=None, help="0 to sign in process")
+    parser.add_argument("--chunk-size", type=int, default=512)
+    args = parser.parse_args()
+    rate = benchmark(args.count, args.workers, args.chunk_size)
+    print(f"{args.count} signatures, {rate:.0f} signatures/s ({rate * 60:.0f}/min)")
+
+
+if __name__ == "__main__":
+    main()
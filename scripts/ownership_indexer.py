@@ -0,0 +1,361 @@
+"""
+off-chain ownership mirror of both spaces
+
+`DualSpaceNFTCore.evmOwnerOf` and `getPrivilegeExpiration` go through `CrossSpaceCall.staticCallEVM` for every token.
+this indexer follows `Transfer` and `BatchStart` logs of the core and espace contracts in block range chunks
+and keeps a tokenId => (core owner, evm owner) index in memory.
+progress is saved as a cursor per space, and the last `reorg_depth` blocks can be rolled back on reorg.
+
+    indexer = OwnershipIndexer(CoreLogSource(c_w3), core_address, EvmLogSource(e_w3), evm_address, state_path="index.json")
+    indexer.sync()
+    indexer.index.owner_of(token_id)
+"""
+
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from eth_utils import keccak
+
+TRANSFER_TOPIC = keccak(text="Transfer(address,address,uint256)")
+BATCH_START_TOPIC = keccak(text="BatchStart(uint256,uint128,uint8)")
+
+ZERO_ADDRESS = "0x" + "00" * 20
+
+CORE = "core"
+EVM = "evm"
+
+
+def _hex_address(address: Any) -> str:
+    # accepts hex addresses and conflux Base32Address
+    address = getattr(address, "hex_address", address)
+    return address.lower()
+
+
+class Log(NamedTuple):
+    block: int
+    topics: List[bytes]
+    data: bytes
+    transaction_hash: bytes = b""
+    log_index: int = 0
+
+
+class LogSource:
+    """
+    block (or epoch for core space) based log access of one space
+    """
+
+    def head(self) -> int:
+        raise NotImplementedError
+
+    def block_hash(self, number: int) -> str:
+        raise NotImplementedError
+
+    def get_logs(
+        self, address: str, from_block: int, to_block: int, topics: Optional[List[bytes]] = None
+    ) -> List[Log]:
+        """
+        topics: accepted first topics, `Transfer` and `BatchStart` by default
+        """
+        raise NotImplementedError
+
+
+def _topic_filter(topics: Optional[List[bytes]]) -> List[List[str]]:
+    return [["0x" + t.hex() for t in (topics or [TRANSFER_TOPIC, BATCH_START_TOPIC])]]
+
+
+def _to_bytes(value: Any) -> bytes:
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
+
+
+class CoreLogSource(LogSource):
+    def __init__(self, c_w3):
+        self.w3 = c_w3
+
+    def head(self) -> int:
+        return self.w3.cfx.epoch_number("latest_state")
+
+    def block_hash(self, number: int) -> str:
+        return _to_bytes(self.w3.cfx.get_block_by_epoch_number(number)["hash"]).hex()
+
+    def get_logs(
+        self, address: str, from_block: int, to_block: int, topics: Optional[List[bytes]] = None
+    ) -> List[Log]:
+        logs = self.w3.cfx.get_logs(
+            {
+                "fromEpoch": from_block,
+                "toEpoch": to_block,
+                "address": address,
+                "topics": _topic_filter(topics),
+            }
+        )
+        return [
+            Log(
+                int(log["epochNumber"]),
+                [_to_bytes(t) for t in log["topics"]],
+                _to_bytes(log["data"]),
+                _to_bytes(log["transactionHash"]),
+                int(log["logIndex"]),
+            )
+            for log in logs
+        ]
+
+
+class EvmLogSource(LogSource):
+    def __init__(self, e_w3):
+        self.w3 = e_w3
+
+    def head(self) -> int:
+        return self.w3.eth.block_number
+
+    def block_hash(self, number: int) -> str:
+        return _to_bytes(self.w3.eth.get_block(number)["hash"]).hex()
+
+    def get_logs(
+        self, address: str, from_block: int, to_block: int, topics: Optional[List[bytes]] = None
+    ) -> List[Log]:
+        logs = self.w3.eth.get_logs(
+            {
+                "fromBlock": from_block,
+                "toBlock": to_block,
+                "address": address,
+                "topics": _topic_filter(topics),
+            }
+        )
+        return [
+            Log(
+                int(log["blockNumber"]),
+                [_to_bytes(t) for t in log["topics"]],
+                _to_bytes(log["data"]),
+                _to_bytes(log["transactionHash"]),
+                int(log["logIndex"]),
+            )
+            for log in logs
+        ]
+
+
+class TokenOwnership(NamedTuple):
+    core_owner: str
+    evm_owner: str
+    # transferable in core space when evm owner is cleared (set to the evm contract)
+    core_transferable: bool
+    # transferable in espace when core owner is cleared (set to the core contract)
+    evm_transferable: bool
+
+
+class BatchSetting(NamedTuple):
+    start_block: int
+    ratio: int
+
+
+class OwnershipIndex:
+    """
+    owners are stored as small integer ids into a shared address table
+    """
+
+    def __init__(self, core_contract: str, evm_contract: str):
+        self.core_contract = _hex_address(core_contract)
+        self.evm_contract = _hex_address(evm_contract)
+        self._addresses: List[str] = []
+        self._address_ids: Dict[str, int] = {}
+        # tokenId => [core owner id, evm owner id], -1 if not seen yet
+        self._owners: Dict[int, List[int]] = {}
+        # batchNbr => espace BatchStart
+        self.batches: Dict[int, BatchSetting] = {}
+
+    def _address_id(self, address: str) -> int:
+        address_id = self._address_ids.get(address)
+        if address_id is None:
+            address_id = self._address_ids[address] = len(self._addresses)
+            self._addresses.append(address)
+        return address_id
+
+    def _set_owner(self, token_id: int, side: int, owner_id: int) -> int:
+        owners = self._owners.get(token_id)
+        if owners is None:
+            owners = self._owners[token_id] = [-1, -1]
+        previous = owners[side]
+        owners[side] = owner_id
+        if owners[0] == owners[1] == -1:
+            del self._owners[token_id]
+        return previous
+
+    def owner_of(self, token_id: int) -> Optional[TokenOwnership]:
+        owners = self._owners.get(token_id)
+        if owners is None:
+            return None
+        core_owner = self._addresses[owners[0]] if owners[0] >= 0 else ZERO_ADDRESS
+        evm_owner = self._addresses[owners[1]] if owners[1] >= 0 else ZERO_ADDRESS
+        return TokenOwnership(
+            core_owner,
+            evm_owner,
+            evm_owner == self.evm_contract,
+            core_owner == self.core_contract,
+        )
+
+    def token_ids(self) -> List[int]:
+        return list(self._owners)
+
+    def __len__(self) -> int:
+        return len(self._owners)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "addresses": self._addresses,
+            "owners": {str(k): v for k, v in self._owners.items()},
+            "batches": {str(k): list(v) for k, v in self.batches.items()},
+        }
+
+    def load_json(self, d: Dict[str, Any]):
+        self._addresses = d["addresses"]
+        self._address_ids = {a: i for i, a in enumerate(self._addresses)}
+        self._owners = {int(k): v for k, v in d["owners"].items()}
+        self.batches = {int(k): BatchSetting(*v) for k, v in d["batches"].items()}
+
+
+@dataclass
+class SpaceState:
+    source: LogSource
+    contract: str
+    # index of the owner slot updated by this space
+    side: int
+    # last processed block
+    cursor: int
+    # [block, hash] of processed chunk ends within reorg depth, oldest first
+    checkpoints: List[Tuple[int, str]] = field(default_factory=list)
+    # [block, tokenId, previous owner id] or [block, -batchNbr - 1, previous batch setting]
+    journal: List[List[Any]] = field(default_factory=list)
+
+
+class OwnershipIndexer:
+    def __init__(
+        self,
+        core_source: LogSource,
+        core_contract: str,
+        evm_source: LogSource,
+        evm_contract: str,
+        core_start: int = 0,
+        evm_start: int = 0,
+        chunk_size: int = 1000,
+        reorg_depth: int = 64,
+        state_path: Optional[str] = None,
+    ):
+        """
+        core_start / evm_start: deployment block (epoch) of the contracts
+        """
+        self.index = OwnershipIndex(core_contract, evm_contract)
+        self.spaces = {
+            CORE: SpaceState(core_source, _hex_address(core_contract), 0, core_start - 1),
+            EVM: SpaceState(evm_source, _hex_address(evm_contract), 1, evm_start - 1),
+        }
+        self.chunk_size = chunk_size
+        self.reorg_depth = reorg_depth
+        self.state_path = state_path
+        if state_path and os.path.exists(state_path):
+            self.load(state_path)
+
+    def sync(self):
+        """
+        catches up both spaces to their current head
+        """
+        for state in self.spaces.values():
+            self._sync_space(state)
+        if self.state_path:
+            self.save(self.state_path)
+
+    def _sync_space(self, state: SpaceState):
+        self._check_reorg(state)
+        head = state.source.head()
+        while state.cursor < head:
+            from_block = state.cursor + 1
+            to_block = min(head, state.cursor + self.chunk_size)
+            for log in state.source.get_logs(state.contract, from_block, to_block):
+                self._apply(state, log)
+            state.cursor = to_block
+            state.checkpoints.append((to_block, state.source.block_hash(to_block)))
+            self._prune(state, head)
+
+    def _apply(self, state: SpaceState, log: Log):
+        if log.topics[0] == TRANSFER_TOPIC:
+            to = "0x" + log.topics[2][-20:].hex()
+            token_id = int.from_bytes(log.topics[3], "big")
+            owner_id = -1 if to == ZERO_ADDRESS else self.index._address_id(to)
+            previous = self.index._set_owner(token_id, state.side, owner_id)
+            state.journal.append([log.block, token_id, previous])
+        elif log.topics[0] == BATCH_START_TOPIC and state.side == 1:
+            # expiration is computed from espace blocks, core BatchStart only mirrors it
+            start_block = int.from_bytes(log.data[0:32], "big")
+            batch_nbr = int.from_bytes(log.data[32:64], "big")
+            ratio = int.from_bytes(log.data[64:96], "big")
+            previous = self.index.batches.get(batch_nbr)
+            self.index.batches[batch_nbr] = BatchSetting(start_block, ratio)
+            state.journal.append([log.block, -batch_nbr - 1, previous])
+
+    def _prune(self, state: SpaceState, head: int):
+        keep_from = head - self.reorg_depth
+        # the newest checkpoint at or below keep_from is kept as rollback target
+        while len(state.checkpoints) > 1 and state.checkpoints[1][0] <= keep_from:
+            state.checkpoints.pop(0)
+        # changes after the oldest checkpoint are needed to roll back to it
+        if state.checkpoints:
+            oldest = state.checkpoints[0][0]
+            state.journal = [entry for entry in state.journal if entry[0] > oldest]
+
+    def _check_reorg(self, state: SpaceState):
+        while state.checkpoints:
+            block, block_hash = state.checkpoints[-1]
+            if state.source.block_hash(block) == block_hash:
+                if block < state.cursor:
+                    self.rollback(state, block)
+                return
+            state.checkpoints.pop()
+        # no known checkpoint survived, fall back to the oldest journaled block
+        if state.journal:
+            self.rollback(state, state.journal[0][0] - 1)
+
+    def rollback(self, state: SpaceState, block: int):
+        """
+        undoes every change of blocks after `block`
+        """
+        while state.journal and state.journal[-1][0] > block:
+            _, key, previous = state.journal.pop()
+            if key >= 0:
+                self.index._set_owner(key, state.side, previous)
+            elif previous is None:
+                self.index.batches.pop(-key - 1, None)
+            else:
+                self.index.batches[-key - 1] = BatchSetting(*previous)
+        state.checkpoints = [c for c in state.checkpoints if c[0] <= block]
+        state.cursor = min(state.cursor, block)
+
+    def save(self, path: str):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(
+                {
+                    "index": self.index.to_json(),
+                    "spaces": {
+                        name: {
+                            "cursor": state.cursor,
+                            "checkpoints": state.checkpoints,
+                            "journal": state.journal,
+                        }
+                        for name, state in self.spaces.items()
+                    },
+                },
+                f,
+            )
+        os.replace(tmp, path)
+
+    def load(self, path: str):
+        with open(path) as f:
+            d = json.load(f)
+        self.index.load_json(d["index"])
+        for name, saved in d["spaces"].items():
+            state = self.spaces[name]
+            state.cursor = saved["cursor"]
+            state.checkpoints = [tuple(c) for c in saved["checkpoints"]]  # type: ignore
+            state.journal = saved["journal"]
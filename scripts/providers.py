@@ -0,0 +1,200 @@
+"""
+shared JSON-RPC provider factory
+
+every provider built here posts through one keep-alive pooled `requests.Session`,
+retries rate limited (HTTP 429 / JSON-RPC -32005) and transient failures with exponential backoff,
+transactions are only sent again when rate limited since a failed send may still have reached the node,
+and records per method latency in `metrics` and the `instrumentation` histograms.
+the provider works for both `web3.Web3` and `conflux_web3.Web3`.
+
+    e_w3 = Web3(make_provider(os.environ["EVM_URL"]))
+    results = e_w3.provider.batch_request([("eth_blockNumber", []), ("eth_chainId", [])])
+"""
+
+import itertools
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from scripts.instrumentation import record_rpc
+
+RATE_LIMIT_ERROR_CODE = -32005
+# not idempotent, sent again after a timeout they fail with "already known" and look like a nonce error
+SEND_METHODS = frozenset(
+    ["cfx_sendRawTransaction", "cfx_sendTransaction", "eth_sendRawTransaction", "eth_sendTransaction"]
+)
+
+
+@dataclass
+class MethodStats:
+    count: int = 0
+    errors: int = 0
+    retries: int = 0
+    total_seconds: float = 0
+    max_seconds: float = 0
+
+
+class RpcMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.methods: Dict[str, MethodStats] = {}
+
+    def record(self, method: str, seconds: float, error: bool = False, retry: bool = False):
+        with self._lock:
+            stats = self.methods.setdefault(method, MethodStats())
+            stats.count += 1
+            stats.errors += error
+            stats.retries += retry
+            stats.total_seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+        record_rpc(method, seconds, error, retry)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                method: {
+                    "count": stats.count,
+                    "errors": stats.errors,
+                    "retries": stats.retries,
+                    "avg_ms": stats.total_seconds / stats.count * 1000,
+                    "max_ms": stats.max_seconds * 1000,
+                }
+                for method, stats in self.methods.items()
+            }
+
+
+metrics = RpcMetrics()
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def shared_session(pool_size: int = 32) -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def _is_rate_limited(response: Any) -> bool:
+    error = response.get("error") if isinstance(response, dict) else None
+    if not error:
+        return False
+    message = str(error.get("message", "")).lower()
+    return error.get("code") == RATE_LIMIT_ERROR_CODE or "rate limit" in message
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """
+    retries: max retry count of a request
+    backoff: base seconds of exponential backoff, jittered
+    """
+
+    def __init__(
+        self,
+        endpoint_uri: str,
+        session: Optional[requests.Session] = None,
+        retries: int = 5,
+        backoff: float = 0.5,
+        timeout: float = 30,
+    ):
+        super().__init__(
+            endpoint_uri,
+            request_kwargs={"timeout": timeout},
+            session=session or shared_session(),
+        )
+        self._pooled_session = session or shared_session()
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._ids = itertools.count()
+
+    def _sleep(self, attempt: int, response: Optional[requests.Response] = None):
+        delay = self.backoff * 2**attempt * (1 + random.random())
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            delay = max(delay, int(response.headers["Retry-After"]))
+        time.sleep(delay)
+
+    def _with_retry(self, method: str, send, idempotent: bool = True) -> Any:
+        """
+        requests which are not idempotent are retried only when rate limited
+        """
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            last_attempt = attempt == self.retries
+            try:
+                response = send()
+            except requests.HTTPError as e:
+                status = e.response.status_code if e.response is not None else 0
+                retriable = status == 429 or (status >= 500 and idempotent)
+                metrics.record(method, time.perf_counter() - start, error=True, retry=retriable and not last_attempt)
+                if not retriable or last_attempt:
+                    raise
+                self._sleep(attempt, e.response)
+                continue
+            except (requests.ConnectionError, requests.Timeout):
+                retriable = idempotent and not last_attempt
+                metrics.record(method, time.perf_counter() - start, error=True, retry=retriable)
+                if not retriable:
+                    raise
+                self._sleep(attempt)
+                continue
+            responses = response if isinstance(response, list) else [response]
+            if any(_is_rate_limited(r) for r in responses) and not last_attempt:
+                metrics.record(method, time.perf_counter() - start, error=True, retry=True)
+                self._sleep(attempt)
+                continue
+            metrics.record(method, time.perf_counter() - start)
+            return response
+        raise AssertionError("unreachable")
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        return self._with_retry(
+            method,
+            lambda: super(PooledHTTPProvider, self).make_request(method, params),
+            idempotent=method not in SEND_METHODS,
+        )
+
+    def batch_request(self, calls: Sequence[Tuple[str, Sequence[Any]]]) -> List[Any]:
+        """
+        sends calls in one JSON-RPC batch, returns the results in call order
+        failed calls are returned as `Exception` instances instead of being raised
+        """
+        if not calls:
+            return []
+        payload = [
+            {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": list(params)}
+            for method, params in calls
+        ]
+
+        def send():
+            response = self._pooled_session.post(self.endpoint_uri, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+
+        responses = self._with_retry("batch", send, idempotent=all(method not in SEND_METHODS for method, _ in calls))
+        by_id = {r.get("id"): r for r in responses}
+        results = []
+        for request in payload:
+            response = by_id.get(request["id"], {"error": {"message": "missing response"}})
+            if "error" in response:
+                results.append(Exception(f"{request['method']} failed: {response['error']}"))
+            else:
+                results.append(response.get("result"))
+        return results
+
+
+def make_provider(endpoint_uri: str, **kwargs: Any) -> PooledHTTPProvider:
+    return PooledHTTPProvider(endpoint_uri, **kwargs)
@@ -0,0 +1,171 @@
+"""
+asyncio receipt tracking
+
+instead of blocking a thread on `executed()` / `mined()` / `wait_for_transaction_receipt` per transaction,
+hashes are registered to a `ReceiptPool` which polls all of them in one batched JSON-RPC request
+and resolves a future for each hash when its receipt lands.
+
+    hashes = [faucet.functions.claimCfx().transact({"from": a.address}) for a in accounts]
+    receipts = wait_for_receipts(CORE_URL, hashes, CORE_RECEIPT_METHOD)
+"""
+
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import requests
+
+from scripts.providers import make_provider
+
+CORE_RECEIPT_METHOD = "cfx_getTransactionReceipt"
+EVM_RECEIPT_METHOD = "eth_getTransactionReceipt"
+
+Receipt = Dict[str, Any]
+HashLike = Union[str, bytes]
+
+
+def _to_hex(tx_hash: HashLike) -> str:
+    if isinstance(tx_hash, bytes):
+        return "0x" + bytes(tx_hash).hex()
+    return tx_hash if tx_hash.startswith("0x") else "0x" + tx_hash
+
+
+def is_success(receipt: Receipt) -> bool:
+    # raw JSON-RPC receipts, core space reports outcomeStatus and eSpace reports status
+    if "outcomeStatus" in receipt:
+        return int(receipt["outcomeStatus"], 16) == 0
+    return int(receipt["status"], 16) == 1
+
+
+class ReceiptPool:
+    """
+    raise_on_failure: if set, futures of failed transactions raise instead of returning the receipt
+    """
+
+    def __init__(
+        self,
+        url: str,
+        method: str = EVM_RECEIPT_METHOD,
+        poll_interval: float = 1.0,
+        max_batch: int = 100,
+        raise_on_failure: bool = True,
+        session: Optional[requests.Session] = None,
+    ):
+        self.url = url
+        self.method = method
+        self.poll_interval = poll_interval
+        self.max_batch = max_batch
+        self.raise_on_failure = raise_on_failure
+        self.provider = make_provider(url, session=session)
+        self._futures: Dict[str, asyncio.Future] = {}
+        # count of `wait` calls on each hash, its future is dropped when the last one gives up
+        self._waiters: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def track(self, tx_hash: HashLike) -> "asyncio.Future[Receipt]":
+        """
+        the future is polled until it resolves, `close` is called, or every `wait` on the hash times out
+        """
+        key = _to_hex(tx_hash)
+        future = self._futures.get(key)
+        if future is None:
+            future = self._futures[key] = asyncio.get_running_loop().create_future()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return future
+
+    async def wait(self, tx_hash: HashLike, timeout: Optional[float] = None) -> Receipt:
+        key = _to_hex(tx_hash)
+        future = self.track(key)
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        finally:
+            self._release(key)
+
+    def _release(self, key: str):
+        waiters = self._waiters.pop(key, 0) - 1
+        if waiters > 0:
+            self._waiters[key] = waiters
+            return
+        # timed out or cancelled, stop polling the hash
+        future = self._futures.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    async def wait_all(
+        self, tx_hashes: Iterable[HashLike], timeout: Optional[float] = None
+    ) -> List[Receipt]:
+        tasks = [asyncio.ensure_future(self.wait(h)) for h in tx_hashes]
+        try:
+            return list(await asyncio.wait_for(asyncio.gather(*tasks), timeout))
+        finally:
+            # a failed transaction or the timeout stops waiting for the others
+            for task in tasks:
+                task.cancel()
+
+    def _fetch(self, hashes: List[str]) -> Dict[str, Optional[Receipt]]:
+        results = self.provider.batch_request([(self.method, [h]) for h in hashes])
+        for tx_hash, result in zip(hashes, results):
+            if isinstance(result, Exception):
+                raise Exception(f"failed to fetch receipt of {tx_hash}: {result}")
+        return dict(zip(hashes, results))
+
+    async def _run(self):
+        while True:
+            # drop futures nobody waits for anymore
+            for key in [k for k, f in self._futures.items() if f.done()]:
+                del self._futures[key]
+            if not self._futures:
+                return
+            keys = list(self._futures)
+            for i in range(0, len(keys), self.max_batch):
+                try:
+                    receipts = await asyncio.to_thread(self._fetch, keys[i : i + self.max_batch])
+                except Exception:
+                    # transient RPC errors are retried on next poll
+                    continue
+                for key, receipt in receipts.items():
+                    future = self._futures.get(key)
+                    if receipt is None or future is None or future.done():
+                        continue
+                    if self.raise_on_failure and not is_success(receipt):
+                        future.set_exception(Exception(f"transaction {key} failed"))
+                    else:
+                        future.set_result(receipt)
+            await asyncio.sleep(self.poll_interval)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+        self._waiters.clear()
+
+    async def __aenter__(self) -> "ReceiptPool":
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+def wait_for_receipts(
+    url: str,
+    tx_hashes: Iterable[HashLike],
+    method: str = EVM_RECEIPT_METHOD,
+    timeout: Optional[float] = 300,
+    poll_interval: float = 1.0,
+) -> List[Receipt]:
+    """
+    blocking helper for synchronous callers, waits for all receipts concurrently
+    """
+
+    async def run():
+        async with ReceiptPool(url, method, poll_interval=poll_interval) as pool:
+            return await pool.wait_all(tx_hashes, timeout)
+
+    return asyncio.run(run())
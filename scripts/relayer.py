@@ -0,0 +1,309 @@
+"""
+gasless relayer for `DualSpaceNFTCore.setCoreOwner` / `clearCoreOwner`
+
+accepts signed metatransactions over HTTP, checks them off-chain before spending gas
+(signature recovers to an address overwhelmingly same as evmSigner, nonce is the next one of evmSigner,
+evmSigner owns the token in espace), coalesces duplicated (evmSigner, nonce) submissions
+and submits through `PipelinedSender`.
+
+    POST /relay  {"evmSigner": "0x..", "tokenId": 1, "newCoreOwner": "cfx:.." | null, "signature": "0x..", "nonce": 0}
+    GET  /status?hash=0x..
+    GET  /metrics  (`instrumentation` metrics in prometheus text format)
+
+newCoreOwner null (or omitted) clears the core owner. nonce is optional and defaults to the next nonce.
+
+usage (CORE_URL, SECRET_KEY and CORE_CONTRACT_ADDRESS from env):
+    python -m scripts.relayer --port 8545
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from cfx_address import Base32Address
+from eth_utils import to_canonical_address
+
+from scripts.instrumentation import export_from_env, registry as metrics_registry
+from scripts.metatransaction import (
+    MetatransactionBuilder,
+    core_nonce_source,
+    digest,
+    is_overwhelmingly_same_address,
+    recover_signer,
+)
+from scripts.tx_pipeline import CoreSpace, PendingTransaction, PipelinedSender, Space
+
+
+class RelayError(Exception):
+    pass
+
+
+@dataclass
+class Relayed:
+    evm_signer: str
+    nonce: int
+    # None while the transaction is being submitted
+    pending: Optional[PendingTransaction] = None
+    # set when submitting raised
+    error: Optional[str] = None
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None or (self.pending is not None and self.pending.error is not None)
+
+    def status(self) -> Dict[str, Any]:
+        if self.failed:
+            status = "failed"
+        elif self.pending is None:
+            status = "submitting"
+        elif self.pending.receipt is not None:
+            status = "executed"
+        else:
+            status = "pending"
+        return {
+            "hash": None if self.pending is None else "0x" + bytes(self.pending.hash).hex(),
+            "evmSigner": self.evm_signer,
+            "nonce": self.nonce,
+            "status": status,
+        }
+
+
+def _hex_bytes(value: str) -> bytes:
+    return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+
+
+class Relayer:
+    """
+    gas / storage_limit: fixed limits of relayed transactions,
+    a queued metatransaction cannot be estimated before the previous one of the same signer is executed
+    space / sender: where relayed transactions are sent from, the core space default account by default.
+    storage_limit is omitted when None (e.g. for a simulated chain)
+
+    the metatransaction nonce is reserved under the relayer lock, the transaction is submitted outside of it
+    so a full window only blocks submissions; a per signer lock keeps the submission order of one signer
+    """
+
+    def __init__(
+        self,
+        c_w3: Any,
+        core_contract: Any,
+        window: int = 16,
+        gas: int = 500000,
+        storage_limit: Optional[int] = 1024,
+        space: Optional[Space] = None,
+        sender: Optional[str] = None,
+    ):
+        self.c_w3 = c_w3
+        self.core_contract = core_contract
+        _, name, version, chain_id, verifying_contract, _, _ = core_contract.functions.eip712Domain().call()
+        self.builder = MetatransactionBuilder(
+            chain_id, name, version, verifying_contract, core_nonce_source(c_w3, core_contract)
+        )
+        self.sender = PipelinedSender(
+            space or CoreSpace(c_w3),
+            sender or c_w3.cfx.default_account,
+            window=window,
+            on_settled=self._settled,
+        )
+        self.gas = gas
+        self.storage_limit = storage_limit
+        self._lock = threading.Lock()
+        # evm signer => lock held while submitting its transactions
+        self._signer_locks: Dict[str, threading.Lock] = {}
+        # (evm signer, nonce) => relayed transaction
+        self._relayed: Dict[Tuple[str, int], Relayed] = {}
+        self._by_hash: Dict[bytes, Relayed] = {}
+        # id of the pending transaction => unsettled relayed transaction
+        self._unsettled: Dict[int, Relayed] = {}
+
+    def relay(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            evm_signer = self.c_w3.to_checksum_address(payload["evmSigner"])
+            token_id = int(payload["tokenId"])
+            signature = _hex_bytes(payload["signature"])
+            nonce = None if payload.get("nonce") is None else int(payload["nonce"])
+            new_core_owner = payload.get("newCoreOwner") or self.core_contract.address
+            if ":" in new_core_owner:
+                new_core_owner = Base32Address(new_core_owner)
+        except Exception as e:
+            raise RelayError(f"malformed request: {e}")
+
+        with self._lock:
+            signer_lock = self._signer_locks.setdefault(evm_signer.lower(), threading.Lock())
+        with signer_lock:
+            relayed, tx = self._reserve(evm_signer, token_id, new_core_owner, signature, nonce)
+            if tx is None:
+                # coalesce retries of an already accepted metatransaction
+                return {**relayed.status(), "duplicate": True}
+            try:
+                pending = self.sender.submit(tx)
+            except Exception as e:
+                with self._lock:
+                    relayed.error = str(e)
+                    self.builder.reset_nonce(evm_signer)
+                raise
+        with self._lock:
+            relayed.pending = pending
+            self._by_hash[bytes(pending.hash)] = relayed
+            if pending.settled:
+                # settled by a poll before it was registered
+                self._on_settled(relayed)
+            else:
+                self._unsettled[id(pending)] = relayed
+            return {**relayed.status(), "duplicate": False}
+
+    def _reserve(
+        self, evm_signer: str, token_id: int, new_core_owner: Any, signature: bytes, nonce: Optional[int]
+    ) -> Tuple[Relayed, Optional[Dict[str, Any]]]:
+        """
+        checks the metatransaction and reserves its nonce (the next one of `evm_signer` when None),
+        returns the relayed transaction and the transaction to submit, None for duplicates
+        """
+        evm_owner = self.core_contract.functions.evmOwnerOf(token_id).call()
+        with self._lock:
+            expected_nonce = self.builder.peek_nonce(evm_signer)
+            if nonce is None:
+                nonce = expected_nonce
+            relayed = self._relayed.get((evm_signer.lower(), nonce))
+            if relayed is not None and not relayed.failed:
+                return relayed, None
+            if nonce != expected_nonce and not any(r.evm_signer == evm_signer for r in self._unsettled.values()):
+                # the signer may have sent metatransactions without the relayer, read the nonce on chain again
+                self.builder.reset_nonce(evm_signer)
+                expected_nonce = self.builder.peek_nonce(evm_signer)
+            if nonce != expected_nonce:
+                raise RelayError(f"invalid nonce {nonce}, expected {expected_nonce}")
+
+            message_digest = digest(self.builder.separator, nonce, token_id, new_core_owner)
+            try:
+                recovered = recover_signer(message_digest, signature)
+            except Exception as e:
+                raise RelayError(f"invalid signature: {e}")
+            if not is_overwhelmingly_same_address(recovered, evm_signer):
+                raise RelayError("signature does not match evmSigner")
+            # `setCoreOwner` requires the exact espace owner
+            if to_canonical_address(evm_owner) != to_canonical_address(evm_signer):
+                raise RelayError("evmSigner is not the espace owner of the token")
+
+            self.builder.build(evm_signer, token_id, new_core_owner)
+            relayed = self._relayed[(evm_signer.lower(), nonce)] = Relayed(evm_signer, nonce)
+        tx = {
+            "to": self.core_contract.address,
+            "data": self.core_contract.encodeABI(
+                fn_name="setCoreOwner",
+                args=[evm_signer, token_id, new_core_owner, signature],
+            ),
+            "gas": self.gas,
+        }
+        if self.storage_limit is not None:
+            tx["storageLimit"] = self.storage_limit
+        return relayed, tx
+
+    def _settled(self, pending: PendingTransaction):
+        # called by the sender for settlements of every path, including polls inside `submit`
+        with self._lock:
+            relayed = self._unsettled.pop(id(pending), None)
+            if relayed is not None:
+                self._on_settled(relayed)
+
+    def _on_settled(self, relayed: Relayed):
+        if relayed.failed:
+            # metatransaction nonce is not consumed, refetch it from chain
+            self.builder.reset_nonce(relayed.evm_signer)
+
+    def status(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            relayed = self._by_hash.get(_hex_bytes(tx_hash))
+            return relayed.status() if relayed else None
+
+    def poll(self):
+        self.sender.poll()
+
+    def run_poller(self, interval: float = 1.0) -> threading.Thread:
+        def loop():
+            while True:
+                try:
+                    self.poll()
+                except Exception as e:
+                    print(f"poll failed: {e}")
+                time.sleep(interval)
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        return thread
+
+
+def make_handler(relayer: Relayer):
+    class RelayHandler(BaseHTTPRequestHandler):
+        def _reply(self, code: int, body: Dict[str, Any]):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if self.path != "/relay":
+                return self._reply(404, {"error": "not found"})
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                self._reply(200, relayer.relay(payload))
+            except (RelayError, json.JSONDecodeError) as e:
+                self._reply(400, {"error": str(e)})
+            except Exception as e:
+                self._reply(500, {"error": str(e)})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/metrics":
+                data = metrics_registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+            if url.path != "/status":
+                return self._reply(404, {"error": "not found"})
+            tx_hash = parse_qs(url.query).get("hash", [""])[0]
+            status = relayer.status(tx_hash) if tx_hash else None
+            if status is None:
+                return self._reply(404, {"error": "unknown transaction"})
+            self._reply(200, status)
+
+    return RelayHandler
+
+
+def serve(relayer: Relayer, host: str = "127.0.0.1", port: int = 8545) -> ThreadingHTTPServer:
+    relayer.run_poller()
+    return ThreadingHTTPServer((host, port), make_handler(relayer))
+
+
+def main():
+    from deploy import get_c_web3, get_sk
+    from scripts.artifacts import registry
+
+    parser = argparse.ArgumentParser(description="setCoreOwner / clearCoreOwner relayer")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8545)
+    parser.add_argument("--window", type=int, default=16)
+    args = parser.parse_args()
+    export_from_env()
+
+    c_w3 = get_c_web3()
+    c_w3.cfx.default_account = c_w3.account.from_key(get_sk())
+    core_contract = registry.contract(c_w3, "DualSpaceNFTCore", os.environ["CORE_CONTRACT_ADDRESS"])
+    server = serve(Relayer(c_w3, core_contract, window=args.window), args.host, args.port)
+    print(f"relayer listening on {args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,27 @@
 from brownie import (
-    MockCrossSpaceCall,  # type:ignore # ContractContainer
     DualSpaceNFTCore,  # type:ignore
     DualSpaceNFTEvm,  # type:ignore
-    MockMappedAddress,  # type:ignore
-    DeploymentProxy, # type: ignore
     accounts as untyped_accounts,
     web3,
     chain,
 )
 
-from brownie.network.contract import Contract, ContractContainer
-from brownie.network.account import Account, Accounts, _PrivateKeyAccount, LocalAccount
-from typing import cast, Callable, List, Mapping, Union
-from brownie.exceptions import (
-    VirtualMachineError,
-)
+from brownie.network.account import Accounts
+from typing import cast
 
 from eth_account import (
     Account as EthAccount,
 )
-from eth_account.messages import encode_structured_data, SignableMessage
 from eth_account.datastructures import (
     SignedMessage,
 )
 
-
-def should_revert(expected_revert_msg: str, f: Callable, *args, **kwargs):
-    try:
-        f(*args, **kwargs)
-    except VirtualMachineError as e:
-        if expected_revert_msg:
-            if expected_revert_msg not in e.message:
-                print(e)
-                raise Exception(
-                    f"no expected string in exception: {expected_revert_msg}"
-                )
-        return
-    else:
-        raise Exception("expect to fail")
+from scripts.local_setup import (
+    MetatransactionConstructor,
+    deploy_local,
+    mint_to,
+    should_revert,
+)
 
 
 def main():
@@ -62,33 +46,10 @@ def main():
     owner.transfer(evm_another_address, "1 ether")  # type: ignore
 
     # setup
-    cross_space_call = cast(Contract, MockCrossSpaceCall.deploy({"from": owner}))
-    core_contract_impl = cast(
-        Contract,
-        DualSpaceNFTCore.deploy({"from": owner}),
-    )
-    core_contract_proxy = cast(Contract, DeploymentProxy.deploy(core_contract_impl.address, bytes(0), {"from": owner}))
-    addr = core_contract_proxy.address
-    DeploymentProxy.remove(DeploymentProxy[-1])
-    core_contract = DualSpaceNFTCore.at(core_contract_proxy.address)
+    deployment = deploy_local(owner, name, symbol, oracle_expiration)
+    core_contract = deployment.core_contract
+    evm_contract = deployment.evm_contract
 
-    mapped_address = cast(
-        Contract, MockMappedAddress.deploy(core_contract.address, {"from": owner})
-    ).address
-    cross_space_call.setMockMapped(core_contract.address, mapped_address)
-    evm_contract_impl = cast(
-        Contract, DualSpaceNFTEvm.deploy({"from": owner})
-    )
-    evm_contract_proxy = cast(Contract, DeploymentProxy.deploy(evm_contract_impl.address, bytes(0), {"from": owner}))
-    addr = evm_contract_proxy.address
-    DeploymentProxy.remove(DeploymentProxy[-1])
-    evm_contract = cast(Contract, DualSpaceNFTEvm.at(addr))
-
-    evm_contract.initialize(name, symbol, mapped_address, {"from": owner})
-    core_contract.initialize(
-        name, symbol, evm_contract.address, cross_space_call.address, espace_chain_id, oracle_expiration, {"from": owner} # set life to 1000 for tests
-    )
-    
     # test upgrade
     new_core_implementation = DualSpaceNFTCore.deploy({"from": owner})
     new_evm_implementation = DualSpaceNFTEvm.deploy({"from": owner})
@@ -112,7 +73,6 @@ def main():
         new_core_implementation.address,
         {"from": oracle_signer}
     )
-
     # start batch
     core_contract.startBatch(batch_nbr, oracle_signer, authorizer, 1, {"from": owner})
 
@@ -335,104 +295,3 @@ def main():
     )
     chain.mine(oracle_expiration)
     core_contract.clearMintSetting(batch_nbr, {"from": random_sender})
-
-
-class MetatransactionConstructor:
-    def __init__(self, chain_id: int, name: str, version: str, contract: Contract):
-        self.name = name
-        self.version = version
-        self.contract = contract
-        self.chain_id = chain_id
-
-    def construct_eip712_message(
-        self, evm_signer_address: str, token_id: int, new_owner_address: str
-    ) -> SignableMessage:
-        raw_json = {
-            "types": {
-                "EIP712Domain": [
-                    {"name": "name", "type": "string"},
-                    {"name": "version", "type": "string"},
-                    {"name": "chainId", "type": "uint256"},
-                    {"name": "verifyingContract", "type": "address"},
-                ],
-                "EvmMetatransaction": [
-                    {"name": "metatransactionNonce", "type": "uint256"},
-                    {"name": "tokenId", "type": "uint256"},
-                    {"name": "newCoreOwner", "type": "address"},
-                ],
-            },
-            "primaryType": "EvmMetatransaction",
-            "domain": {
-                "name": self.name,
-                "version": self.version,
-                "chainId": self.chain_id,
-                "verifyingContract": self.contract.address,
-            },
-            "message": {
-                "metatransactionNonce": self.contract.getMetatransactionNonce(
-                    evm_signer_address
-                ),
-                "tokenId": token_id,
-                "newCoreOwner": new_owner_address,
-            },
-        }
-        return encode_structured_data(raw_json)
-
-
-def mint_to(
-    core_contract: Contract,
-    batch_nbr: int,
-    oracle_signer: LocalAccount,
-    authorizer: LocalAccount,
-    username: str,
-    rarity: int,
-    core_owner: Union[_PrivateKeyAccount, None],
-    evm_owner: Union[_PrivateKeyAccount, None],
-    random_sender: _PrivateKeyAccount,
-) -> int:
-    core_contract.batchAuthorizeMintPermission(
-        batch_nbr, [username], [rarity], {"from": authorizer}
-    )
-
-    core_address = core_owner.address if core_owner else "0x0000000000000000000000000000000000000000"
-    evm_address = evm_owner.address if evm_owner else "0x0000000000000000000000000000000000000000"
-    username_hash = web3.solidityKeccak(["string"], [username])
-    message_hash = web3.solidityKeccak(
-        ["uint128", "bytes32", "address", "address"],
-        [
-            batch_nbr,
-            username_hash,
-            core_address,
-            evm_address,
-        ],
-    )
-    signature: SignedMessage = EthAccount.signHash(
-        message_hash, oracle_signer.private_key
-    )
-    token_id = core_contract.mint.call(
-        batch_nbr,
-        "hello_poap",
-        core_address,
-        evm_address,
-        (
-            signature.v,
-            signature.r,
-            signature.s,
-        ),
-        {"from": random_sender},
-    )
-
-    mint_tx = core_contract.mint(
-        batch_nbr,
-        "hello_poap",
-        core_address,
-        evm_address,
-        (
-            signature.v,
-            signature.r,
-            signature.s,
-        ),
-        {"from": random_sender},
-    )
-    # print(mint_tx.events)
-    return token_id
@@ -0,0 +1,94 @@
+"""
+vectorized token id codec and privilege expiration
+
+token id = batchNbr * 10^6 + rarity * 10^4 + batchInternalId (`DualSpaceGeneral._nextTokenId` / `_resolveTokenId`)
+expiration = startBlock + ratio * rarity * baseExpirationBlockInterval (`DualSpaceNFTEvm.getPrivilegeExpiration`)
+
+batchNbr is below 99999999 (`DualSpaceNFTCore.startBatch`) so every token id fits in uint64.
+"""
+
+from typing import Mapping, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+BATCH_UNIT = 10**6
+RARITY_UNIT = 10**4
+# `_baseExpirationBlockInterval`: 30 days, 2 blocks per second
+BASE_EXPIRATION_BLOCK_INTERVAL = 30 * 24 * 60 * 60 * 2
+
+UintArray = npt.NDArray[np.uint64]
+
+
+def encode(batch_nbrs: npt.ArrayLike, rarities: npt.ArrayLike, internal_ids: npt.ArrayLike) -> UintArray:
+    return (
+        np.asarray(batch_nbrs, dtype=np.uint64) * np.uint64(BATCH_UNIT)
+        + np.asarray(rarities, dtype=np.uint64) * np.uint64(RARITY_UNIT)
+        + np.asarray(internal_ids, dtype=np.uint64)
+    )
+
+
+def decode(token_ids: npt.ArrayLike) -> Tuple[UintArray, UintArray, UintArray]:
+    """
+    returns (batch numbers, rarities, batch internal ids)
+    """
+    token_ids = np.asarray(token_ids, dtype=np.uint64)
+    batch_nbrs, rest = np.divmod(token_ids, np.uint64(BATCH_UNIT))
+    rarities, internal_ids = np.divmod(rest, np.uint64(RARITY_UNIT))
+    return batch_nbrs, rarities, internal_ids
+
+
+def metadata_ids(token_ids: npt.ArrayLike) -> UintArray:
+    # tokenURI suffix, tokens of same batch and rarity share metadata
+    return np.asarray(token_ids, dtype=np.uint64) // np.uint64(RARITY_UNIT)
+
+
+class BatchTable:
+    """
+    sorted lookup table of batch expiration settings
+
+    batches: batchNbr => (startBlock, ratio), e.g. `OwnershipIndex.batches`
+    """
+
+    def __init__(self, batches: Mapping[int, Tuple[int, int]]):
+        items = sorted(batches.items())
+        self.batch_nbrs = np.array([k for k, _ in items], dtype=np.uint64)
+        self.start_blocks = np.array([v[0] for _, v in items], dtype=np.uint64)
+        self.ratios = np.array([v[1] for _, v in items], dtype=np.uint64)
+
+    def lookup(self, batch_nbrs: UintArray) -> Tuple[UintArray, UintArray]:
+        """
+        returns (start blocks, ratios), both are 0 for unknown batches like in contract storage
+        """
+        if len(self.batch_nbrs) == 0:
+            zeros = np.zeros(len(batch_nbrs), dtype=np.uint64)
+            return zeros, zeros.copy()
+        positions = np.searchsorted(self.batch_nbrs, batch_nbrs)
+        positions = np.minimum(positions, len(self.batch_nbrs) - 1)
+        found = self.batch_nbrs[positions] == batch_nbrs
+        start_blocks = np.where(found, self.start_blocks[positions], np.uint64(0))
+        ratios = np.where(found, self.ratios[positions], np.uint64(0))
+        return start_blocks, ratios
+
+
+def privilege_expiration(
+    token_ids: npt.ArrayLike,
+    batches: BatchTable,
+    base_interval: int = BASE_EXPIRATION_BLOCK_INTERVAL,
+) -> UintArray:
+    """
+    note: the contract multiplies ratio and rarity as uint8 and reverts when the product exceeds 255,
+    such tokens get the unchecked value here
+    """
+    batch_nbrs, rarities, _ = decode(token_ids)
+    start_blocks, ratios = batches.lookup(batch_nbrs)
+    return start_blocks + ratios * rarities * np.uint64(base_interval)
+
+
+def is_privilege_expired(
+    token_ids: npt.ArrayLike,
+    batches: BatchTable,
+    block_number: int,
+    base_interval: int = BASE_EXPIRATION_BLOCK_INTERVAL,
+) -> npt.NDArray[np.bool_]:
+    return np.uint64(block_number) > privilege_expiration(token_ids, batches, base_interval)
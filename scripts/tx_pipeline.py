@@ -0,0 +1,271 @@
+"""
+pipelined transaction submission for one sender account
+
+nonces are allocated locally so up to `window` transactions can be unconfirmed at the same time,
+instead of waiting for each receipt before sending the next transaction.
+works with both conflux core space (`conflux_web3`) and eSpace (`web3`) clients.
+
+    sender = PipelinedSender(CoreSpace(c_w3), c_w3.cfx.default_account, window=16)
+    for username in usernames:
+        sender.submit(core_contract.functions.mint(...).build_transaction(...))
+    receipts = sender.flush()
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from conflux_web3 import Web3 as ConfluxWeb3
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+from scripts.instrumentation import function_name, record_transaction
+
+
+class Space:
+    """
+    the chain operations the pipeline relies on, implemented by `CoreSpace` and `ESpace`
+    """
+
+    # `space` label of the transaction metrics
+    name = ""
+
+    def confirmed_nonce(self, address: str) -> int:
+        raise NotImplementedError
+
+    def send(self, tx: Dict[str, Any]) -> bytes:
+        raise NotImplementedError
+
+    def get_receipt(self, tx_hash: bytes) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def is_known(self, tx_hash: bytes) -> bool:
+        raise NotImplementedError
+
+    def is_success(self, receipt: Dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+    def is_nonce_error(self, e: Exception) -> bool:
+        message = str(e).lower()
+        return "nonce" in message or "already known" in message
+
+
+class CoreSpace(Space):
+    name = "core"
+
+    def __init__(self, c_w3: ConfluxWeb3):
+        self.w3 = c_w3
+
+    def confirmed_nonce(self, address: str) -> int:
+        return self.w3.cfx.get_next_nonce(address)  # type: ignore
+
+    def send(self, tx: Dict[str, Any]) -> bytes:
+        return self.w3.cfx.send_transaction(tx)  # type: ignore
+
+    def get_receipt(self, tx_hash: bytes) -> Optional[Dict[str, Any]]:
+        return self.w3.cfx.get_transaction_receipt(tx_hash)  # type: ignore
+
+    def is_known(self, tx_hash: bytes) -> bool:
+        return self.w3.cfx.get_transaction_by_hash(tx_hash) is not None  # type: ignore
+
+    def is_success(self, receipt: Dict[str, Any]) -> bool:
+        return receipt["outcomeStatus"] == 0
+
+
+class ESpace(Space):
+    name = "evm"
+
+    def __init__(self, e_w3: Web3):
+        self.w3 = e_w3
+
+    def confirmed_nonce(self, address: str) -> int:
+        return self.w3.eth.get_transaction_count(address, "latest")  # type: ignore
+
+    def send(self, tx: Dict[str, Any]) -> bytes:
+        return self.w3.eth.send_transaction(tx)  # type: ignore
+
+    def get_receipt(self, tx_hash: bytes) -> Optional[Dict[str, Any]]:
+        try:
+            return self.w3.eth.get_transaction_receipt(tx_hash)  # type: ignore
+        except TransactionNotFound:
+            return None
+
+    def is_known(self, tx_hash: bytes) -> bool:
+        try:
+            self.w3.eth.get_transaction(tx_hash)  # type: ignore
+            return True
+        except TransactionNotFound:
+            return False
+
+    def is_success(self, receipt: Dict[str, Any]) -> bool:
+        return receipt["status"] == 1
+
+
+@dataclass
+class PendingTransaction:
+    tx: Dict[str, Any]
+    nonce: int
+    hash: bytes
+    sent_at: float
+    receipt: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    @property
+    def settled(self) -> bool:
+        return self.receipt is not None or self.error is not None
+
+
+@dataclass
+class PipelinedSender:
+    """
+    window: max count of unconfirmed transactions, `submit` blocks when it is reached
+    resend_after: seconds after which a transaction the node has forgotten is sent again with its nonce
+    on_settled: called with every settled transaction, whichever of `submit`, `poll`, `wait` or `flush` settled it
+
+    the sender can be shared by threads, nonce allocation and polling are serialized by a lock
+    which is not held while waiting for a window slot
+    """
+
+    space: Space
+    sender: str
+    window: int = 8
+    poll_interval: float = 1.0
+    resend_after: float = 30.0
+    timeout: float = 600.0
+    on_settled: Optional[Callable[[PendingTransaction], None]] = None
+    _next_nonce: Optional[int] = field(default=None, init=False)
+    _in_flight: List[PendingTransaction] = field(default_factory=list, init=False)
+    _lock: threading.RLock = field(default_factory=threading.RLock, init=False, repr=False)
+
+    def _allocate(self) -> int:
+        if self._next_nonce is None:
+            self._next_nonce = self.space.confirmed_nonce(self.sender)
+        nonce = self._next_nonce
+        self._next_nonce += 1
+        return nonce
+
+    def _resync(self):
+        # local nonce is behind the chain (e.g. the account is also used elsewhere)
+        self._next_nonce = max(
+            self.space.confirmed_nonce(self.sender),
+            max((p.nonce + 1 for p in self._in_flight), default=0),
+        )
+
+    def submit(self, tx: Dict[str, Any]) -> PendingTransaction:
+        tx = {**tx, "from": self.sender}
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._lock:
+                if len(self._in_flight) < self.window:
+                    pending = self._send(tx)
+                    self._in_flight.append(pending)
+                    return pending
+            # other threads may take the slot first, the wait is bounded by the same timeout
+            self._wait_any(lambda: self.in_flight < self.window, deadline)
+
+    def _send(self, tx: Dict[str, Any]) -> PendingTransaction:
+        # sent again once with a resynced nonce after a nonce error
+        for attempt in range(2):
+            nonce = tx["nonce"] = self._allocate()
+            try:
+                tx_hash = self.space.send(tx)
+            except Exception as e:
+                # nothing was sent, later nonces are not allocated yet so this one can be reused
+                self._next_nonce = nonce
+                if attempt > 0 or not self.space.is_nonce_error(e):
+                    raise
+                self._resync()
+                continue
+            return PendingTransaction(tx, nonce, tx_hash, time.monotonic())
+        raise AssertionError("unreachable")
+
+    def poll(self) -> List[PendingTransaction]:
+        """
+        checks every unconfirmed transaction once, returns those settled since last poll
+        """
+        with self._lock:
+            settled = self._poll()
+        if self.on_settled is not None:
+            for pending in settled:
+                self.on_settled(pending)
+        return settled
+
+    def _poll(self) -> List[PendingTransaction]:
+        settled = []
+        confirmed_nonce: Optional[int] = None
+        for pending in self._in_flight:
+            receipt = self.space.get_receipt(pending.hash)
+            if receipt is not None:
+                pending.receipt = receipt
+                if not self.space.is_success(receipt):
+                    pending.error = f"transaction {pending.hash.hex()} failed"
+                settled.append(pending)
+                record_transaction(
+                    self.space.name,
+                    function_name(pending.tx),
+                    time.monotonic() - pending.sent_at,
+                    receipt,
+                    failed=pending.error is not None,
+                )
+                continue
+            if time.monotonic() - pending.sent_at < self.resend_after:
+                continue
+            if self.space.is_known(pending.hash):
+                continue
+            if confirmed_nonce is None:
+                confirmed_nonce = self.space.confirmed_nonce(self.sender)
+            if confirmed_nonce > pending.nonce:
+                # the nonce is consumed by another transaction
+                pending.error = f"transaction {pending.hash.hex()} is replaced"
+            else:
+                # dropped from the pool, fill the gap so later nonces can be packed
+                try:
+                    pending.hash = self.space.send(pending.tx)
+                    pending.sent_at = time.monotonic()
+                    continue
+                except Exception as e:
+                    # e.g. the nonce got consumed meanwhile, the other transactions are still tracked
+                    pending.error = f"resending transaction {pending.hash.hex()} failed: {e}"
+            settled.append(pending)
+            record_transaction(self.space.name, function_name(pending.tx), None, None, failed=True)
+        self._in_flight = [p for p in self._in_flight if not p.settled]
+        return settled
+
+    def _wait_any(self, done: Callable[[], bool], deadline: Optional[float] = None) -> List[PendingTransaction]:
+        """
+        polls until a transaction settles, or `done` holds because another thread's poll settled it
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+        while True:
+            settled = self.poll()
+            if settled or done():
+                return settled
+            if time.monotonic() > deadline:
+                raise Exception(f"no transaction confirmed in {self.timeout} seconds")
+            time.sleep(self.poll_interval)
+
+    def wait(self, pending: PendingTransaction) -> Dict[str, Any]:
+        """
+        blocks until `pending` is settled and returns its receipt
+        """
+        while not pending.settled:
+            self._wait_any(lambda: pending.settled)
+        if pending.error is not None:
+            raise Exception(pending.error)
+        return pending.receipt  # type: ignore
+
+    def flush(self) -> List[PendingTransaction]:
+        """
+        waits for every unconfirmed transaction
+        """
+        settled = []
+        while self.in_flight:
+            settled.extend(self._wait_any(lambda: not self.in_flight))
+        return settled
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
@@ -0,0 +1,164 @@
+import itertools
+import pytest
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+
+from scripts.dual_space_sim import DualSpaceDeployment, hex_address, make_backend
+from scripts.metatransaction import domain_separator, signable_message
+from scripts.mint_signer import ZERO_ADDRESS, sign_mint_message
+
+NAME = "NAME"
+SYMBOL = "symbol"
+BATCH_NBR = 20230401
+# blocks, kept small so `mine` stays cheap on a real node
+ORACLE_EXPIRATION = 20
+
+
+@dataclass
+class Accounts:
+    owner: Any
+    oracle_signer: Any
+    authorizer: Any
+    user: Any
+    random_sender: Any
+    core_another: Any
+    evm_user: Any
+    evm_another: Any
+
+
+class Minter:
+    """
+    authorizes a username, signs the mint message as oracle and mints from a random sender
+    """
+
+    def __init__(self, backend: Any, core_contract: Any, accounts: Accounts):
+        self.backend = backend
+        self.core_contract = core_contract
+        self.accounts = accounts
+        self._username_counter = itertools.count()
+
+    def username(self) -> str:
+        # unique even without snapshots, usernames can be minted once per batch
+        return f"poap_{next(self._username_counter)}"
+
+    def sign(self, username: str, core_owner: Optional[Any], evm_owner: Optional[Any]) -> Any:
+        return sign_mint_message(
+            self.accounts.oracle_signer.key,
+            BATCH_NBR,
+            username,
+            hex_address(core_owner) if core_owner else ZERO_ADDRESS,
+            evm_owner.address if evm_owner else ZERO_ADDRESS,
+        )
+
+    def authorize(self, usernames: Any, rarity: int = 1):
+        self.backend.transact(
+            self.core_contract.functions.batchAuthorizeMintPermission(BATCH_NBR, list(usernames), [rarity] * len(usernames)),
+            self.accounts.authorizer,
+        )
+
+    def mint(self, username: str, core_owner: Optional[Any], evm_owner: Optional[Any]) -> int:
+        self.authorize([username])
+        fn = self.core_contract.functions.mint(
+            BATCH_NBR,
+            username,
+            core_owner.address if core_owner else self.backend.core_zero_address,
+            evm_owner.address if evm_owner else ZERO_ADDRESS,
+            tuple(self.sign(username, core_owner, evm_owner)),
+        )
+        token_id = fn.call({"from": self.accounts.random_sender.address})
+        self.backend.transact(fn, self.accounts.random_sender)
+        return token_id
+
+
+class Metatransactions:
+    def __init__(self, backend: Any, core_contract: Any):
+        self.core_contract = core_contract
+        self.domain_separator = domain_separator(NAME, "v1", backend.espace_chain_id, core_contract.address)
+
+    def sign(self, evm_signer: Any, token_id: int, new_core_owner: Any) -> bytes:
+        nonce = self.core_contract.functions.getMetatransactionNonce(evm_signer.address).call()
+        return evm_signer.sign_message(
+            signable_message(self.domain_separator, nonce, token_id, new_core_owner)
+        ).signature
+
+
+@pytest.fixture(scope="session")
+def backend() -> Any:
+    return make_backend()
+
+
+@pytest.fixture(scope="session")
+def accounts(backend: Any) -> Accounts:
+    return Accounts(
+        owner=backend.owner,
+        oracle_signer=backend.core_account(),
+        authorizer=backend.core_account(),
+        user=backend.core_account(),
+        random_sender=backend.core_account(),
+        core_another=backend.core_account(),
+        evm_user=backend.evm_account(),
+        evm_another=backend.evm_account(),
+    )
+
+
+@pytest.fixture(scope="session")
+def deployment(backend: Any, accounts: Accounts) -> DualSpaceDeployment:
+    deployment = backend.deploy_dual_space(accounts.owner, NAME, SYMBOL, ORACLE_EXPIRATION)
+    backend.transact(
+        deployment.core_contract.functions.startBatch(
+            BATCH_NBR, accounts.oracle_signer.address, accounts.authorizer.address, 1
+        ),
+        accounts.owner,
+    )
+    return deployment
+
+
+@pytest.fixture(scope="session")
+def deployed_snapshot(backend: Any, deployment: DualSpaceDeployment) -> Optional[int]:
+    """
+    chain state right after deployment, every test starts from it instead of redeploying
+    """
+    if not backend.supports_snapshot:
+        return None
+    return backend.snapshot()
+
+
+@pytest.fixture(autouse=True)
+def isolated(request: Any) -> Iterator[None]:
+    # tests of off-chain scripts against fakes do not build the chain
+    if "deployment" not in request.fixturenames:
+        yield
+        return
+    backend = request.getfixturevalue("backend")
+    deployed_snapshot = request.getfixturevalue("deployed_snapshot")
+    yield
+    if backend.supports_snapshot:
+        backend.revert(deployed_snapshot)
+
+
+@pytest.fixture(scope="session")
+def core_contract(deployment: DualSpaceDeployment) -> Any:
+    return deployment.core_contract
+
+
+@pytest.fixture(scope="session")
+def evm_contract(deployment: DualSpaceDeployment) -> Any:
+    return deployment.evm_contract
+
+
+@pytest.fixture(scope="session")
+def minter(backend: Any, core_contract: Any, accounts: Accounts) -> Minter:
+    return Minter(backend, core_contract, accounts)
+
+
+@pytest.fixture(scope="session")
+def metatransactions(backend: Any, core_contract: Any) -> Metatransactions:
+    return Metatransactions(backend, core_contract)
+
+
+@pytest.fixture
+def token_id(accounts: Accounts, minter: Minter) -> int:
+    """
+    token owned by `user` in core space and `evm_user` in espace
+    """
+    return minter.mint(minter.username(), accounts.user, accounts.evm_user)
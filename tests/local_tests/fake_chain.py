@@ -0,0 +1,237 @@
+"""
+fake core space node, JSON-RPC endpoint and log source for the off-chain scripts
+
+`FakeCore` mimics the `c_w3.cfx` calls of the transaction senders:
+transactions wait in a pool until `mine` executes them in nonce order, and the pool can drop or fail them.
+`FakeRpcServer` serves the same state over HTTP for the JSON-RPC clients.
+`FakeLogSource` holds `Transfer` and `BatchStart` logs of one space for the log readers.
+"""
+
+import itertools
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+from eth_utils import keccak
+
+from scripts.ownership_indexer import BATCH_START_TOPIC, TRANSFER_TOPIC, Log, LogSource
+
+SENDER = "0x1000000000000000000000000000000000000001"
+
+
+class FakeContract:
+    """
+    `encodeABI` returns the call as JSON so the fake node can estimate it and tests can read it back
+    """
+
+    address = "0x2000000000000000000000000000000000000002"
+
+    def encodeABI(self, fn_name: str, args: List[Any]) -> str:
+        return "0x" + json.dumps({"fn": fn_name, "args": args}).encode().hex()
+
+
+def decode_call(data: str) -> Dict[str, Any]:
+    return json.loads(bytes.fromhex(data[2:]))
+
+
+class FakeCore:
+    """
+    auto_mine: pooled transactions are executed whenever a receipt is asked for
+    fails: transactions it returns True for are executed with a failed outcome
+    """
+
+    def __init__(self, auto_mine: bool = True, fails: Optional[Callable[[Dict[str, Any]], bool]] = None):
+        self.cfx = self
+        self.auto_mine = auto_mine
+        self.fails = fails or (lambda tx: False)
+        self.epoch = 0
+        self.nonces: Dict[str, int] = {}
+        # hash => tx, sent and not executed
+        self.pool: Dict[bytes, Dict[str, Any]] = {}
+        self.executed: Dict[bytes, Dict[str, Any]] = {}
+        self.receipts: Dict[bytes, Dict[str, Any]] = {}
+        self.sent: List[Dict[str, Any]] = []
+        self._lock = threading.RLock()
+        self._salt = itertools.count()
+
+    def get_next_nonce(self, address: str) -> int:
+        with self._lock:
+            return self.nonces.get(address, 0)
+
+    def send_transaction(self, tx: Dict[str, Any]) -> bytes:
+        with self._lock:
+            if tx["nonce"] < self.nonces.get(tx["from"], 0):
+                raise ValueError(f"nonce {tx['nonce']} is too stale")
+            tx_hash = keccak(json.dumps(tx, sort_keys=True, default=str).encode() + bytes([next(self._salt) % 256]))
+            self.pool[tx_hash] = dict(tx)
+            self.sent.append(dict(tx))
+            return tx_hash
+
+    def mine(self):
+        with self._lock:
+            self.epoch += 1
+            progressed = True
+            while progressed:
+                progressed = False
+                for tx_hash, tx in list(self.pool.items()):
+                    sender = tx["from"]
+                    if tx["nonce"] != self.nonces.get(sender, 0):
+                        continue
+                    del self.pool[tx_hash]
+                    self.nonces[sender] = tx["nonce"] + 1
+                    self.executed[tx_hash] = tx
+                    self.receipts[tx_hash] = {
+                        "transactionHash": tx_hash,
+                        "outcomeStatus": 1 if self.fails(tx) else 0,
+                        "gasUsed": 21000,
+                        "epochNumber": self.epoch,
+                    }
+                    # transactions of the same nonce left in the pool are replaced
+                    for other, pooled in list(self.pool.items()):
+                        if pooled["from"] == sender and pooled["nonce"] == tx["nonce"]:
+                            del self.pool[other]
+                    progressed = True
+
+    def drop(self, tx_hash: bytes):
+        with self._lock:
+            del self.pool[tx_hash]
+
+    def get_transaction_receipt(self, tx_hash: bytes) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if self.auto_mine:
+                self.mine()
+            return self.receipts.get(bytes(tx_hash))
+
+    def get_transaction_by_hash(self, tx_hash: Any) -> Optional[Dict[str, Any]]:
+        tx_hash = _hash_bytes(tx_hash)
+        with self._lock:
+            tx = self.pool.get(tx_hash) or self.executed.get(tx_hash)
+            return None if tx is None else {**tx, "hash": tx_hash}
+
+    def wait_for_transaction_receipt(self, tx_hash: Any, timeout: float = 0) -> Dict[str, Any]:
+        receipt = self.get_transaction_receipt(_hash_bytes(tx_hash))
+        if receipt is None:
+            raise TimeoutError(f"transaction {_hash_bytes(tx_hash).hex()} is not executed")
+        return receipt
+
+    def estimate_gas_and_collateral(self, tx: Dict[str, Any]) -> Dict[str, int]:
+        # batchAuthorizeMintPermission like cost, 30000 + 20000 per username
+        usernames = decode_call(tx["data"])["args"][1]
+        return {"gasLimit": 30000 + 20000 * len(usernames), "storageCollateralized": 64 * len(usernames)}
+
+    def get_block_by_epoch_number(self, tag: Any) -> Dict[str, Any]:
+        return {"gasLimit": 1000000, "blockNumber": self.epoch}
+
+
+def _hash_bytes(tx_hash: Any) -> bytes:
+    if isinstance(tx_hash, str):
+        return bytes.fromhex(tx_hash[2:] if tx_hash.startswith("0x") else tx_hash)
+    return bytes(tx_hash)
+
+
+def _hex(value: Any) -> Any:
+    if isinstance(value, bytes):
+        return "0x" + value.hex()
+    if isinstance(value, int):
+        return hex(value)
+    return value
+
+
+class FakeRpcServer:
+    """
+    JSON-RPC (single and batch) over the state of a `FakeCore`,
+    `errors` answers the next requests with the listed HTTP statuses before serving them
+    """
+
+    def __init__(self, core: FakeCore):
+        self.core = core
+        self.errors: List[int] = []
+        self.requests: List[Any] = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                server.requests.append(payload)
+                if server.errors:
+                    self.send_response(server.errors.pop(0))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if isinstance(payload, list):
+                    body = [server._answer(call) for call in payload]
+                else:
+                    body = server._answer(payload)
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def _answer(self, call: Dict[str, Any]) -> Dict[str, Any]:
+        method, params = call["method"], call.get("params", [])
+        if method in ("cfx_getTransactionReceipt", "eth_getTransactionReceipt"):
+            receipt = self.core.get_transaction_receipt(_hash_bytes(params[0]))
+            result: Any = None if receipt is None else {k: _hex(v) for k, v in receipt.items()}
+        elif method in ("cfx_getTransactionByHash", "eth_getTransactionByHash"):
+            tx = self.core.get_transaction_by_hash(params[0])
+            result = None if tx is None else {k: _hex(v) for k, v in tx.items()}
+        elif method in ("cfx_epochNumber", "eth_blockNumber"):
+            result = hex(self.core.epoch)
+        else:
+            return {"jsonrpc": "2.0", "id": call["id"], "error": {"code": -32601, "message": f"{method} not found"}}
+        return {"jsonrpc": "2.0", "id": call["id"], "result": result}
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FakeLogSource(LogSource):
+    """
+    blocks of one space, block hashes change with `reorg`
+    """
+
+    def __init__(self, head: int = 0):
+        self.hashes: Dict[int, str] = {}
+        self.logs: List[Log] = []
+        self.extend(head)
+
+    def extend(self, head: int, fork: str = ""):
+        for block in range(len(self.hashes), head + 1):
+            self.hashes[block] = f"{fork}{block}"
+
+    def reorg(self, from_block: int, fork: str):
+        """
+        replaces blocks from `from_block` by a fork without their logs
+        """
+        for block in range(from_block, len(self.hashes)):
+            self.hashes[block] = f"{fork}{block}"
+        self.logs = [log for log in self.logs if log.block < from_block]
+
+    def transfer(self, block: int, to: str, token_id: int):
+        topics = [TRANSFER_TOPIC, bytes(32), bytes(12) + bytes.fromhex(to[2:]), token_id.to_bytes(32, "big")]
+        self.logs.append(Log(block, topics, b""))
+
+    def batch_start(self, block: int, batch_nbr: int, ratio: int = 1):
+        data = block.to_bytes(32, "big") + batch_nbr.to_bytes(32, "big") + ratio.to_bytes(32, "big")
+        self.logs.append(Log(block, [BATCH_START_TOPIC], data))
+
+    def head(self) -> int:
+        return len(self.hashes) - 1
+
+    def block_hash(self, number: int) -> str:
+        return self.hashes[number]
+
+    def get_logs(self, address: str, from_block: int, to_block: int, topics: Optional[List[bytes]] = None) -> List[Log]:
+        topics = topics or [TRANSFER_TOPIC, BATCH_START_TOPIC]
+        return [log for log in self.logs if from_block <= log.block <= to_block and log.topics[0] in topics]
@@ -0,0 +1,87 @@
+import json
+import os
+import pytest
+from unittest import mock
+
+from eth_utils import keccak
+from web3 import Web3
+
+from scripts import artifacts
+from scripts.artifacts import ArtifactRegistry
+
+ABI = [
+    {
+        "type": "function",
+        "name": "mint",
+        "inputs": [
+            {"type": "uint128", "name": "batchNbr"},
+            {"type": "tuple", "name": "sig", "components": [{"type": "uint8"}, {"type": "bytes32"}]},
+        ],
+        "outputs": [],
+        "stateMutability": "nonpayable",
+    },
+    {
+        "type": "event",
+        "name": "Transfer",
+        "anonymous": False,
+        "inputs": [
+            {"type": "address", "name": "from", "indexed": True},
+            {"type": "address", "name": "to", "indexed": True},
+            {"type": "uint256", "name": "tokenId", "indexed": True},
+        ],
+    },
+]
+
+
+def _write(build_dir: str, name: str, abi, bytecode: str = "0x6000"):
+    # brownie artifacts also hold large fields the registry skips
+    with open(os.path.join(build_dir, f"{name}.json"), "w") as f:
+        json.dump({"contractName": name, "ast": {"nodes": [1] * 100}, "abi": abi, "bytecode": bytecode}, f)
+
+
+@pytest.fixture
+def registry(tmp_path) -> ArtifactRegistry:
+    build_dir, cache_dir = tmp_path / "contracts", tmp_path / "cache"
+    build_dir.mkdir()
+    _write(str(build_dir), "Token", ABI)
+    return ArtifactRegistry(str(build_dir), str(cache_dir))
+
+
+def test_artifact(registry: ArtifactRegistry):
+    artifact = registry.artifact("Token")
+    assert artifact.abi == ABI and artifact.bytecode == "0x6000"
+    mint, transfer = "mint(uint128,(uint8,bytes32))", "Transfer(address,address,uint256)"
+    assert artifact.selectors == {mint: "0x" + keccak(text=mint)[:4].hex()}
+    assert artifact.topics == {transfer: "0x" + keccak(text=transfer).hex()}
+    assert registry.metadata("Token") == {"abi": ABI, "bytecode": "0x6000"}
+
+
+def test_cached_artifacts(registry: ArtifactRegistry):
+    artifact = registry.artifact("Token")
+    # memoized while the file is unchanged
+    with mock.patch.object(artifacts, "_parse", side_effect=AssertionError("parsed again")):
+        assert registry.artifact("Token") is artifact
+        # a new registry reads the disk cache
+        fresh = ArtifactRegistry(registry.build_dir, registry.cache_dir)
+        assert fresh.artifact("Token") == artifact
+    assert len(os.listdir(registry.cache_dir)) == 1  # type: ignore
+
+    # a rebuilt artifact is parsed again
+    _write(registry.build_dir, "Token", ABI[:1], "0x6001")
+    os.utime(registry._path("Token"), ns=(0, 0))
+    rebuilt = registry.artifact("Token")
+    assert rebuilt.bytecode == "0x6001" and rebuilt.topics == {}
+    assert len(os.listdir(registry.cache_dir)) == 2  # type: ignore
+
+
+def test_contract_factories(registry: ArtifactRegistry):
+    w3 = Web3()
+    factory = registry.contract(w3, "Token")
+    assert registry.contract(w3, "Token") is factory
+    address = Web3.to_checksum_address("0x" + "12" * 20)
+    assert registry.contract(w3, "Token", address).address == address
+    _write(registry.build_dir, "Token", ABI, "0x6002")
+    os.utime(registry._path("Token"), ns=(1, 1))
+    assert registry.contract(w3, "Token") is not factory
+    with pytest.raises(FileNotFoundError):
+        registry.artifact("Missing")
@@ -0,0 +1,79 @@
+import pytest
+import threading
+from types import SimpleNamespace
+from typing import Optional
+
+from scripts.batch_reader import EvmBatchReader, OwnerTokenPager
+
+OWNER = "0x" + "aa" * 20
+ZERO_ADDRESS = "0x" + "00" * 20
+
+
+class FakeContract:
+    """
+    `batchTokenState` runs out of gas above `gas_cap` token ids, odd token ids are not minted
+    """
+
+    def __init__(self, gas_cap: int, error: Optional[Exception] = None):
+        self.gas_cap = gas_cap
+        self.error = error
+        self.calls = []
+        self._lock = threading.Lock()
+        self.functions = SimpleNamespace(batchTokenState=self._batch_token_state)
+
+    def _batch_token_state(self, token_ids):
+        def call():
+            with self._lock:
+                self.calls.append(len(token_ids))
+            if self.error is not None:
+                raise self.error
+            if len(token_ids) > self.gas_cap:
+                raise ValueError("out of gas")
+            return [(ZERO_ADDRESS if i % 2 else OWNER, i, False, f"uri/{i}") for i in token_ids]
+
+        return SimpleNamespace(call=call)
+
+
+def test_chunks_are_halved_on_gas_errors():
+    contract = FakeContract(gas_cap=30)
+    reader = EvmBatchReader(contract, chunk_size=100)
+    states = reader.read(range(1000))
+    assert [s and s.token_uri for s in states] == [None if i % 2 else f"uri/{i}" for i in range(1000)]
+    assert reader.chunk_size == 25 and max(contract.calls) == 100
+
+
+def test_other_errors_are_raised():
+    contract = FakeContract(gas_cap=30, error=ValueError("execution reverted"))
+    with pytest.raises(ValueError, match="reverted"):
+        EvmBatchReader(contract, chunk_size=100).read(range(100))
+    assert contract.calls == [100]
+
+
+class FakeIndexedContract:
+    """
+    `tokensOfOwner` of an owner whose index is reordered at every block, as when the owner keeps sending tokens
+    """
+
+    def __init__(self, count: int):
+        self.count = count
+        self.blocks = []
+        self.w3 = SimpleNamespace(eth=SimpleNamespace(block_number=7))
+        self.functions = SimpleNamespace(tokensOfOwner=self._tokens_of_owner)
+
+    def _tokens_of_owner(self, owner, cursor, limit):
+        def call(block_identifier=None):
+            self.blocks.append(block_identifier)
+            block = self.w3.eth.block_number if block_identifier is None else block_identifier
+            # a new block is produced by every call
+            self.w3.eth.block_number += 1
+            tokens = [(i + block) % self.count for i in range(self.count)]
+            return tokens[cursor : cursor + limit], self.count
+
+        return SimpleNamespace(call=call)
+
+
+def test_pages_are_read_at_one_block():
+    contract = FakeIndexedContract(1050)
+    token_ids = OwnerTokenPager(contract, page_size=100).tokens_of(OWNER)
+    assert token_ids == [(i + 7) % 1050 for i in range(1050)]
+    assert contract.blocks == [7] * 11
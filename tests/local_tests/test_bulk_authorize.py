@@ -0,0 +1,99 @@
+import os
+import pytest
+import tempfile
+
+from scripts.bulk_authorize import BulkAuthorizer, Checkpoint, read_csv
+
+from fake_chain import SENDER, FakeContract, FakeCore, decode_call
+
+BATCH_NBR = 20230401
+
+
+def _write(content: str) -> str:
+    path = os.path.join(tempfile.mkdtemp(), "usernames.csv")
+    with open(path, "w") as f:
+        f.write(content)
+    return path
+
+
+def _authorizer(core: FakeCore, **kwargs) -> BulkAuthorizer:
+    authorizer = BulkAuthorizer(core, FakeContract(), BATCH_NBR, sender=SENDER, **kwargs)  # type: ignore
+    authorizer.pipeline.poll_interval = 0
+    return authorizer
+
+
+def _authorized(core: FakeCore):
+    # usernames of executed and successful chunks, in execution order
+    return [
+        username
+        for tx_hash, tx in core.executed.items()
+        if core.receipts[tx_hash]["outcomeStatus"] == 0
+        for username in decode_call(tx["data"])["args"][1]
+    ]
+
+
+def test_read_csv():
+    path = _write("username,rarity\n# comment\nalice,1\n\nbob, 2\n")
+    assert list(read_csv(path)) == [("alice", 1), ("bob", 2)]
+    with pytest.raises(ValueError, match=r"usernames.csv:3: expected username,rarity"):
+        list(read_csv(_write("alice,1\nbob,2\ncarol\n")))
+    with pytest.raises(ValueError, match=r":2: rarity 'x' is not a number"):
+        list(read_csv(_write("alice,1\nbob,x\n")))
+
+
+def test_upload_chunks_and_checkpoints():
+    core = FakeCore()
+    checkpoint = Checkpoint(os.path.join(tempfile.mkdtemp(), "checkpoint.json"), BATCH_NBR)
+    permissions = [(f"user_{i}", 1) for i in range(100)]
+    assert _authorizer(core, max_in_flight=2).upload(permissions, checkpoint) == 100
+    assert _authorized(core) == [u for u, _ in permissions]
+    # 30000 + 20000 per username within 40% of the 1000000 block gas limit
+    assert max(len(decode_call(tx["data"])["args"][1]) for tx in core.sent) == 17
+    saved = Checkpoint.load(checkpoint.path, BATCH_NBR)
+    assert saved.done == [[0, 100]] and saved.pending == []
+    # nothing left to send
+    assert _authorizer(core).upload(permissions, saved) == 0
+    with pytest.raises(ValueError, match="belongs to batch"):
+        Checkpoint.load(checkpoint.path, BATCH_NBR + 1)
+
+
+def test_resume():
+    core = FakeCore(auto_mine=False)
+    authorizer = _authorizer(core, max_in_flight=4)
+    permissions = [(f"user_{i}", 1) for i in range(40)]
+    chunks = [permissions[0:10], permissions[10:20], permissions[20:30]]
+    pending = [authorizer._send(chunk) for chunk in chunks]
+    # the first chunk is executed, the second is still pooled and the third is dropped
+    core.drop(pending[2].hash)
+    second = core.pool.pop(pending[1].hash)
+    core.mine()
+    core.pool[pending[1].hash] = second
+    checkpoint = Checkpoint(
+        os.path.join(tempfile.mkdtemp(), "checkpoint.json"),
+        BATCH_NBR,
+        pending=[[i * 10, i * 10 + 10, p.hash.hex(), p.nonce] for i, p in enumerate(pending)],
+    )
+    core.auto_mine = True
+    resumed = _authorizer(core, max_in_flight=4)
+    assert resumed.upload(permissions, checkpoint) == 20
+    assert checkpoint.done == [[0, 40]] and checkpoint.pending == []
+    # executed and pending chunks are not sent again, every username is authorized once
+    assert sorted(_authorized(core)) == sorted(u for u, _ in permissions)
+
+
+def test_resume_unknown_transaction_with_used_nonce():
+    core = FakeCore(auto_mine=False)
+    authorizer = _authorizer(core)
+    pending = authorizer._send([("alice", 1)])
+    core.drop(pending.hash)
+    # the nonce is consumed by another transaction of the sender
+    core.send_transaction({"from": SENDER, "nonce": pending.nonce, "data": FakeContract().encodeABI("x", [0, []])})
+    core.mine()
+    checkpoint = Checkpoint(
+        os.path.join(tempfile.mkdtemp(), "checkpoint.json"),
+        BATCH_NBR,
+        pending=[[0, 1, pending.hash.hex(), pending.nonce]],
+    )
+    with pytest.raises(Exception, match="unknown and its nonce may be used"):
+        authorizer.resume(checkpoint)
+    assert checkpoint.pending and not checkpoint.done
@@ -0,0 +1,452 @@
+import pytest
+import tempfile
+from typing import Any
+
+from web3 import Web3
+
+from scripts.batch_reader import OwnerTokenPager
+from scripts.dual_space_sim import TransactionFailed, hex_address
+from scripts.metadata_cache import MetadataService
+from scripts.merkle_permission import MerkleIndex, build as build_permission_tree
+from scripts.metatransaction import MetatransactionBuilder
+from scripts.mint_oracle import AdmissionControl, AllowAllVerifier, MintOracle, OracleError, SignatureStore
+from scripts.mint_signer import ZERO_ADDRESS, MintRequest, MintSigner, username_hash
+
+from conftest import BATCH_NBR, NAME, ORACLE_EXPIRATION, Accounts, Metatransactions, Minter
+
+
+def should_revert(backend: Any, reason: str, fn: Any, sender: Any):
+    with pytest.raises(TransactionFailed, match=reason):
+        backend.transact(fn, sender)
+
+
+def test_upgrade_evm_contract_by_non_owner(backend: Any, core_contract: Any, evm_contract: Any, accounts: Accounts):
+    # reverts before the implementation is checked
+    should_revert(
+        backend,
+        "caller is not the owner",
+        core_contract.functions.upgradeEvmContractTo(evm_contract.address),
+        accounts.oracle_signer,
+    )
+
+
+def test_evm_contract_only_from_core(backend: Any, evm_contract: Any, accounts: Accounts):
+    # only the mapped address of the core contract passes `fromCore`
+    should_revert(
+        backend,
+        "only core contract could manipulate this function",
+        evm_contract.functions.upgradeTo(evm_contract.address),
+        accounts.evm_user,
+    )
+
+
+def test_fresh_deployment_is_migrated(backend: Any, core_contract: Any, evm_contract: Any, accounts: Accounts):
+    should_revert(
+        backend,
+        "legacy storage already migrated",
+        core_contract.functions.migrateLegacyStorage([], [], True),
+        accounts.owner,
+    )
+    should_revert(
+        backend,
+        "only core contract could manipulate this function",
+        evm_contract.functions.migrateLegacyStorage([], [], True),
+        accounts.oracle_signer,
+    )
+
+
+def test_mint(backend: Any, core_contract: Any, evm_contract: Any, accounts: Accounts, minter: Minter):
+    username = minter.username()
+    mint_fn = core_contract.functions.mint(
+        BATCH_NBR, username, accounts.user.address, accounts.evm_user.address, (0, bytes(32), bytes(32))
+    )
+    should_revert(backend, "no permission to mint", mint_fn, accounts.random_sender)
+
+    token_id = minter.mint(username, accounts.user, accounts.evm_user)
+    assert core_contract.functions.ownerOf(token_id).call() == accounts.user.address
+    assert evm_contract.functions.ownerOf(token_id).call() == accounts.evm_user.address
+    assert not core_contract.functions.isPrivilegeExpired(token_id).call()
+    # computed from the batch setting mirrored by startBatch
+    assert (
+        core_contract.functions.getPrivilegeExpiration(token_id).call()
+        == evm_contract.functions.getPrivilegeExpiration(token_id).call()
+    )
+    # permission is consumed
+    should_revert(backend, "no permission to mint", mint_fn, accounts.random_sender)
+
+
+def test_core_only_mint(core_contract: Any, accounts: Accounts, minter: Minter):
+    token_id = minter.mint(minter.username(), accounts.user, None)
+    assert core_contract.functions.ownerOf(token_id).call() == accounts.user.address
+
+
+def test_evm_only_mint(evm_contract: Any, accounts: Accounts, minter: Minter):
+    token_id = minter.mint(minter.username(), None, accounts.evm_user)
+    assert evm_contract.functions.ownerOf(token_id).call() == accounts.evm_user.address
+
+
+def test_mint_without_owner(minter: Minter):
+    with pytest.raises(TransactionFailed, match="cannot clear both space owner when minting"):
+        minter.mint(minter.username(), None, None)
+
+
+def test_mint_with_oracle(core_contract: Any, evm_contract: Any, accounts: Accounts, minter: Minter):
+    username = minter.username()
+    minter.authorize([username])
+    request = MintRequest(BATCH_NBR, username, hex_address(accounts.user), accounts.evm_user.address)
+    with MintOracle(
+        MintSigner(accounts.oracle_signer.key, workers=0),
+        AllowAllVerifier(),
+        SignatureStore(),
+        AdmissionControl(rate=1, burst=1, batches={BATCH_NBR}),
+    ) as oracle:
+        signature, cached = oracle.sign(request)
+        assert not cached
+        # retries are answered from the store, even when the batch is over its rate
+        assert oracle.sign(request) == (signature, True)
+        with pytest.raises(OracleError, match="too many requests"):
+            oracle.sign(request._replace(username=minter.username()))
+        with pytest.raises(OracleError, match="is not served"):
+            oracle.sign(request._replace(batch_nbr=BATCH_NBR + 1))
+
+    fn = core_contract.functions.mint(
+        BATCH_NBR, username, accounts.user.address, accounts.evm_user.address, tuple(signature)
+    )
+    token_id = fn.call({"from": accounts.random_sender.address})
+    minter.backend.transact(fn, accounts.random_sender)
+    assert evm_contract.functions.ownerOf(token_id).call() == accounts.evm_user.address
+
+
+def test_transfer_blocked_while_both_owners_set(
+    backend: Any, core_contract: Any, evm_contract: Any, accounts: Accounts, token_id: int
+):
+    should_revert(
+        backend,
+        "not transferable because its evm space owner is set",
+        core_contract.functions.safeTransferFrom(accounts.user.address, accounts.core_another.address, token_id),
+        accounts.user,
+    )
+    should_revert(
+        backend,
+        "not transferable because its core space owner is set",
+        evm_contract.functions.safeTransferFrom(accounts.evm_user.address, accounts.evm_another.address, token_id),
+        accounts.evm_user,
+    )
+
+
+def test_set_evm_owner_by_non_owner(backend: Any, core_contract: Any, accounts: Accounts, token_id: int):
+    should_revert(
+        backend,
+        "caller is not core token owner",
+        core_contract.functions.setEvmOwner(token_id, accounts.evm_another.address),
+        accounts.core_another,
+    )
+    should_revert(
+        backend,
+        "caller is not core token owner",
+        core_contract.functions.clearEvmOwner(token_id),
+        accounts.core_another,
+    )
+
+
+def test_evm_owner(backend: Any, core_contract: Any, evm_contract: Any, accounts: Accounts, token_id: int):
+    backend.transact(core_contract.functions.setEvmOwner(token_id, accounts.evm_another.address), accounts.user)
+    assert evm_contract.functions.ownerOf(token_id).call() == accounts.evm_another.address
+
+    backend.transact(core_contract.functions.clearEvmOwner(token_id), accounts.user)
+    assert evm_contract.functions.ownerOf(token_id).call() == evm_contract.address
+    assert Web3.to_checksum_address(core_contract.functions.evmOwnerOf(token_id).call()) == evm_contract.address
+    backend.transact(
+        core_contract.functions.safeTransferFrom(accounts.user.address, accounts.core_another.address, token_id),
+        accounts.user,
+    )
+    assert core_contract.functions.ownerOf(token_id).call() == accounts.core_another.address
+
+
+def test_evm_owner_cleared_in_espace(
+    backend: Any, core_contract: Any, evm_contract: Any, accounts: Accounts, token_id: int
+):
+    # core is not told, the evm owner is read through staticCallEVM
+    backend.transact(
+        evm_contract.functions.transferFrom(accounts.evm_user.address, evm_contract.address, token_id),
+        accounts.evm_user,
+    )
+    backend.transact(
+        core_contract.functions.batchSafeTransferFrom(
+            accounts.user.address, accounts.core_another.address, [token_id]
+        ),
+        accounts.user,
+    )
+    assert core_contract.functions.ownerOf(token_id).call() == accounts.core_another.address
+
+    backend.transact(core_contract.functions.setEvmOwner(token_id, accounts.evm_another.address), accounts.core_another)
+    should_revert(
+        backend,
+        "not transferable because its evm space owner is set",
+        core_contract.functions.safeTransferFrom(accounts.core_another.address, accounts.user.address, token_id),
+        accounts.core_another,
+    )
+
+
+def test_core_owner(
+    backend: Any,
+    core_contract: Any,
+    evm_contract: Any,
+    accounts: Accounts,
+    metatransactions: Metatransactions,
+    token_id: int,
+):
+    backend.transact(
+        core_contract.functions.clearCoreOwner(
+            accounts.evm_user.address,
+            token_id,
+            metatransactions.sign(accounts.evm_user, token_id, core_contract.address),
+        ),
+        accounts.random_sender,
+    )
+    assert core_contract.functions.ownerOf(token_id).call() == core_contract.address
+
+    backend.transact(
+        evm_contract.functions.safeTransferFrom(accounts.evm_user.address, accounts.evm_another.address, token_id),
+        accounts.evm_user,
+    )
+    assert evm_contract.functions.ownerOf(token_id).call() == accounts.evm_another.address
+
+    backend.transact(
+        core_contract.functions.setCoreOwner(
+            accounts.evm_another.address,
+            token_id,
+            accounts.user.address,
+            metatransactions.sign(accounts.evm_another, token_id, accounts.user.address),
+        ),
+        accounts.random_sender,
+    )
+    assert core_contract.functions.ownerOf(token_id).call() == accounts.user.address
+    should_revert(
+        backend,
+        "not transferable because its core space owner is set",
+        evm_contract.functions.safeTransferFrom(accounts.evm_another.address, accounts.evm_user.address, token_id),
+        accounts.evm_another,
+    )
+
+
+def test_metatransaction_builder(backend: Any, core_contract: Any, accounts: Accounts, token_id: int):
+    builder = MetatransactionBuilder(
+        backend.espace_chain_id,
+        NAME,
+        "v1",
+        core_contract.address,
+        lambda signers: [core_contract.functions.getMetatransactionNonce(s).call() for s in signers],
+        workers=0,
+    )
+    # the second metatransaction of the signer uses the nonce advanced locally
+    (cleared, clear_signature), (restored, restore_signature) = builder.sign_many(
+        [
+            (accounts.evm_user.key, token_id, core_contract.address),
+            (accounts.evm_user.key, token_id, accounts.user.address),
+        ]
+    )
+    assert restored.nonce == cleared.nonce + 1
+    backend.transact(
+        core_contract.functions.clearCoreOwner(accounts.evm_user.address, token_id, clear_signature),
+        accounts.random_sender,
+    )
+    assert core_contract.functions.ownerOf(token_id).call() == core_contract.address
+    backend.transact(
+        core_contract.functions.setCoreOwner(
+            accounts.evm_user.address, token_id, accounts.user.address, restore_signature
+        ),
+        accounts.random_sender,
+    )
+    assert core_contract.functions.ownerOf(token_id).call() == accounts.user.address
+
+
+def test_batch_entry_points(backend: Any, core_contract: Any, evm_contract: Any, accounts: Accounts, minter: Minter):
+    usernames = [minter.username(), minter.username()]
+    minter.authorize(usernames)
+    requests = [
+        (
+            username,
+            accounts.user.address,
+            accounts.evm_user.address,
+            tuple(minter.sign(username, accounts.user, accounts.evm_user)),
+        )
+        for username in usernames
+    ]
+    mint_fn = core_contract.functions.batchMint(BATCH_NBR, requests)
+    token_ids = mint_fn.call({"from": accounts.random_sender.address})
+    backend.transact(mint_fn, accounts.random_sender)
+    for token_id in token_ids:
+        assert core_contract.functions.ownerOf(token_id).call() == accounts.user.address
+        assert evm_contract.functions.ownerOf(token_id).call() == accounts.evm_user.address
+
+    should_revert(
+        backend,
+        "caller is not core token owner",
+        core_contract.functions.batchClearEvmOwner(token_ids),
+        accounts.core_another,
+    )
+    transfer_fn = core_contract.functions.batchSafeTransferFrom(
+        accounts.user.address, accounts.core_another.address, token_ids
+    )
+    should_revert(backend, "not transferable because its evm space owner is set", transfer_fn, accounts.user)
+    backend.transact(
+        core_contract.functions.batchSetEvmOwner(token_ids, [accounts.evm_another.address] * len(token_ids)),
+        accounts.user,
+    )
+    assert evm_contract.functions.ownerOf(token_ids[0]).call() == accounts.evm_another.address
+    backend.transact(core_contract.functions.batchClearEvmOwner(token_ids), accounts.user)
+    backend.transact(transfer_fn, accounts.user)
+    for token_id in token_ids:
+        assert evm_contract.functions.ownerOf(token_id).call() == evm_contract.address
+        assert core_contract.functions.ownerOf(token_id).call() == accounts.core_another.address
+
+
+def test_merkle_mint(backend: Any, core_contract: Any, evm_contract: Any, accounts: Accounts, minter: Minter):
+    usernames = [minter.username() for _ in range(3)]
+    tree_dir = tempfile.mkdtemp()
+    build_permission_tree([(u, 1) for u in usernames], tree_dir)
+    with MerkleIndex(tree_dir) as merkle_index:
+        should_revert(
+            backend,
+            "msg sender is not authorized to set mint permission",
+            core_contract.functions.setMintPermissionRoot(BATCH_NBR, merkle_index.root),
+            accounts.random_sender,
+        )
+        backend.transact(core_contract.functions.setMintPermissionRoot(BATCH_NBR, merkle_index.root), accounts.authorizer)
+        proofs = [merkle_index.permission_proof(u) for u in usernames]
+
+    def mint_fn(username: str, proof: Any) -> Any:
+        return core_contract.functions.mintWithProof(
+            BATCH_NBR,
+            username,
+            accounts.user.address,
+            accounts.evm_user.address,
+            tuple(minter.sign(username, accounts.user, accounts.evm_user)),
+            proof.to_args(),
+        )
+
+    should_revert(backend, "no permission to mint", mint_fn(usernames[0], proofs[1]), accounts.random_sender)
+    token_id = mint_fn(usernames[0], proofs[0]).call({"from": accounts.random_sender.address})
+    backend.transact(mint_fn(usernames[0], proofs[0]), accounts.random_sender)
+    assert core_contract.functions.ownerOf(token_id).call() == accounts.user.address
+    assert core_contract.functions.isMintPermissionClaimed(BATCH_NBR, proofs[0].index).call()
+    should_revert(backend, "mint permission already claimed", mint_fn(usernames[0], proofs[0]), accounts.random_sender)
+
+    requests = [
+        (
+            username,
+            accounts.user.address,
+            accounts.evm_user.address,
+            tuple(minter.sign(username, accounts.user, accounts.evm_user)),
+        )
+        for username in usernames[1:]
+    ]
+    batch_fn = core_contract.functions.batchMintWithProof(BATCH_NBR, requests, [p.to_args() for p in proofs[1:]])
+    token_ids = batch_fn.call({"from": accounts.random_sender.address})
+    backend.transact(batch_fn, accounts.random_sender)
+    for token_id in token_ids:
+        assert evm_contract.functions.ownerOf(token_id).call() == accounts.evm_user.address
+
+
+def test_tokens_of_owner(backend: Any, core_contract: Any, evm_contract: Any, accounts: Accounts, minter: Minter):
+    token_ids = [minter.mint(minter.username(), accounts.user, accounts.evm_user) for _ in range(3)]
+    # other tests may have minted to the same accounts
+    assert set(token_ids) <= set(OwnerTokenPager(core_contract, page_size=2).tokens_of(accounts.user.address))
+    assert set(token_ids) <= set(OwnerTokenPager(evm_contract, page_size=2).tokens_of(accounts.evm_user.address))
+    _, total = core_contract.functions.tokensOfOwner(accounts.user.address, 0, 0).call()
+    assert core_contract.functions.tokensOfOwner(accounts.user.address, total, 10).call()[0] == []
+    # cursor + limit overflows
+    max_uint = 2**256 - 1
+    assert len(core_contract.functions.tokensOfOwner(accounts.user.address, 1, max_uint).call()[0]) == total - 1
+    assert evm_contract.functions.tokensOfOwner(accounts.evm_user.address, max_uint, max_uint).call()[0] == []
+
+    # tokens held by the evm contract are not indexed
+    backend.transact(core_contract.functions.clearEvmOwner(token_ids[0]), accounts.user)
+    evm_tokens = OwnerTokenPager(evm_contract).tokens_of(accounts.evm_user.address)
+    assert token_ids[0] not in evm_tokens
+    assert token_ids[1] in evm_tokens and token_ids[2] in evm_tokens
+    assert OwnerTokenPager(evm_contract).tokens_of(evm_contract.address) == []
+
+    backend.transact(
+        core_contract.functions.safeTransferFrom(accounts.user.address, accounts.core_another.address, token_ids[0]),
+        accounts.user,
+    )
+    assert token_ids[0] not in OwnerTokenPager(core_contract).tokens_of(accounts.user.address)
+    assert token_ids[0] in OwnerTokenPager(core_contract).tokens_of(accounts.core_another.address)
+    # already indexed tokens are skipped
+    backend.transact(core_contract.functions.indexTokens(token_ids), accounts.random_sender)
+    assert OwnerTokenPager(core_contract).tokens_of(accounts.core_another.address).count(token_ids[0]) == 1
+
+
+def test_token_state(backend: Any, core_contract: Any, evm_contract: Any, accounts: Accounts, token_id: int):
+    backend.transact(core_contract.functions.setBaseURI("https://baidu.com/"), accounts.owner)
+    assert core_contract.functions.tokenURI(token_id).call() == evm_contract.functions.tokenURI(token_id).call()
+    # uris are built locally from the cached base uri
+    with MetadataService(evm_contract, fetch=lambda uri: uri) as service:
+        assert service.token_uri(token_id) == evm_contract.functions.tokenURI(token_id).call()
+        assert service.metadata_many([token_id, token_id + 1]) == [service.token_uri(token_id)] * 2
+
+    # read of both spaces through staticCallEVM
+    core_states, evm_states = core_contract.functions.batchTokenState([token_id, token_id + 1000]).call()
+    assert core_states[0][0] == core_contract.functions.ownerOf(token_id).call()
+    assert evm_states[0][0] == evm_contract.functions.ownerOf(token_id).call()
+    assert core_states[0][1] == evm_contract.functions.getPrivilegeExpiration(token_id).call()
+    assert core_states[0][3] == core_contract.functions.tokenURI(token_id).call()
+    assert core_states[1][0] == evm_states[1][0] == ZERO_ADDRESS
+    assert tuple(evm_contract.functions.batchTokenState([token_id]).call()[0]) == tuple(evm_states[0])
+
+
+def test_clear_mint_setting(backend: Any, core_contract: Any, accounts: Accounts):
+    # own batch, the shared one stays usable when the node backend runs without snapshots
+    batch_nbr = BATCH_NBR + 1
+    backend.transact(
+        core_contract.functions.startBatch(batch_nbr, accounts.oracle_signer.address, accounts.authorizer.address, 1),
+        accounts.owner,
+    )
+    usernames = ["unminted_0", "unminted_1", "unminted_2"]
+    backend.transact(
+        core_contract.functions.batchAuthorizeMintPermission(batch_nbr, usernames, [1, 2, 1]), accounts.authorizer
+    )
+    username_hashes = [username_hash(u) for u in usernames[:2]]
+    clear_fn = core_contract.functions.clearMintSetting(batch_nbr)
+    clear_permissions_fn = core_contract.functions.clearMintPermissions(batch_nbr, username_hashes)
+    should_revert(backend, "mint setting not expired for enough time", clear_fn, accounts.random_sender)
+    backend.mine(ORACLE_EXPIRATION)
+    should_revert(backend, "mint setting not expired for enough time", clear_fn, accounts.random_sender)
+    should_revert(backend, "mint setting not expired for enough time", clear_permissions_fn, accounts.random_sender)
+    backend.mine(ORACLE_EXPIRATION)
+    # anyone clears the permissions of a started batch expired for enough time
+    last_hash = [username_hash(usernames[2])]
+    backend.transact(core_contract.functions.clearMintPermissions(batch_nbr, last_hash), accounts.random_sender)
+    assert core_contract.functions.batchCheckMintPermission(batch_nbr, last_hash).call() == [0]
+    backend.transact(clear_fn, accounts.random_sender)
+    assert core_contract.functions.getMintSettingExpiration(batch_nbr).call() == 0
+
+    # a chunk holding a batch that is not clearable reverts as a whole
+    active_batch_nbr = batch_nbr + 1
+    backend.transact(
+        core_contract.functions.startBatch(
+            active_batch_nbr, accounts.oracle_signer.address, accounts.authorizer.address, 1
+        ),
+        accounts.owner,
+    )
+    should_revert(
+        backend,
+        "mint setting not expired for enough time",
+        core_contract.functions.batchClearMintSetting([batch_nbr, active_batch_nbr]),
+        accounts.random_sender,
+    )
+    backend.transact(core_contract.functions.batchClearMintSetting([batch_nbr]), accounts.random_sender)
+
+    assert core_contract.functions.batchCheckMintPermission(batch_nbr, username_hashes).call() == [1, 2]
+    # the batch has no expiration once its setting is cleared, as a batch that is not started
+    should_revert(backend, "batch not started", clear_permissions_fn, accounts.random_sender)
+    should_revert(
+        backend,
+        "batch not started",
+        core_contract.functions.clearMintPermissions(active_batch_nbr + 1, username_hashes),
+        accounts.random_sender,
+    )
+    backend.transact(clear_permissions_fn, accounts.owner)
+    assert core_contract.functions.batchCheckMintPermission(batch_nbr, username_hashes).call() == [0, 0]
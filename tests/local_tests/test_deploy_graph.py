@@ -0,0 +1,94 @@
+import json
+import os
+import pytest
+import tempfile
+
+from scripts.deploy_graph import DeploymentGraph, SpaceConfig, Step
+from scripts.receipt_pool import CORE_RECEIPT_METHOD
+
+from fake_chain import SENDER, FakeCore, FakeRpcServer
+
+
+@pytest.fixture
+def core():
+    return FakeCore(auto_mine=False)
+
+
+@pytest.fixture
+def server(core):
+    server = FakeRpcServer(core)
+    yield server
+    server.close()
+
+
+def _graph(core: FakeCore, server: FakeRpcServer, steps, manifest_path: str, **kwargs) -> DeploymentGraph:
+    spaces = {"core": SpaceConfig(server.url, CORE_RECEIPT_METHOD, lambda: core.get_next_nonce(SENDER))}
+    return DeploymentGraph(steps, spaces, manifest_path, poll_interval=0.01, **kwargs)
+
+
+def _step(core: FakeCore, name: str, deps=(), sent=None) -> Step:
+    def send(results, tx):
+        if sent is not None:
+            sent.append(name)
+        return core.send_transaction({"from": SENDER, "data": "0x" + name.encode().hex(), **tx})
+
+    return Step(name, "core", send, deps)
+
+
+def _manifest() -> str:
+    return os.path.join(tempfile.mkdtemp(), "deployment.json")
+
+
+def test_dependencies(core, server):
+    core.auto_mine = True
+    path = _manifest()
+    steps = [_step(core, "a"), _step(core, "b", ("a",)), _step(core, "c", ("a",)), _step(core, "d", ("b", "c"))]
+    results = _graph(core, server, steps, path).run()
+    assert sorted(results) == ["a", "b", "c", "d"]
+    assert sorted(tx["nonce"] for tx in core.sent) == [0, 1, 2, 3]
+    with open(path) as f:
+        assert json.load(f) == {"results": results, "sent": {}, "nonces": {}}
+
+
+def test_resume_allocates_after_pending_nonces(core, server):
+    path = _manifest()
+    # `a` was sent by a previous run and is still pooled, the node's next nonce does not count it
+    tx_hash = core.send_transaction({"from": SENDER, "nonce": 0, "data": "0x61"})
+    with open(path, "w") as f:
+        json.dump({"results": {}, "sent": {"a": "0x" + tx_hash.hex()}, "nonces": {"a": 0}}, f)
+    sent = []
+    core.auto_mine = True
+    results = _graph(core, server, [_step(core, "a", sent=sent), _step(core, "b", sent=sent)], path).run()
+    assert sent == ["b"] and sorted(results) == ["a", "b"]
+    assert [tx["nonce"] for tx in core.sent] == [0, 1]
+
+
+def test_dropped_transaction_is_sent_again(core, server):
+    sent = []
+    step = _step(core, "a", sent=sent)
+
+    def send(results, tx):
+        tx_hash = step_send(results, tx)
+        if len(sent) == 1:
+            core.drop(tx_hash)
+        else:
+            core.auto_mine = True
+        return tx_hash
+
+    step_send, step.send = step.send, send
+    results = _graph(core, server, [step], _manifest(), step_timeout=0.2).run()
+    assert sent == ["a", "a"] and "a" in results
+    assert [tx["nonce"] for tx in core.sent] == [0, 0]
+
+
+def test_pooled_transaction_times_out_and_resumes(core, server):
+    path = _manifest()
+    sent = []
+    steps = [_step(core, "a", sent=sent), _step(core, "b", ("a",), sent=sent)]
+    with pytest.raises(Exception, match="a: transaction .* is not executed in 0.2 seconds"):
+        _graph(core, server, steps, path, step_timeout=0.2).run()
+    with open(path) as f:
+        assert list(json.load(f)["sent"]) == ["a"]
+    core.auto_mine = True
+    results = _graph(core, server, steps, path).run()
+    assert sent == ["a", "b"] and sorted(results) == ["a", "b"]
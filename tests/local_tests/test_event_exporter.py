@@ -0,0 +1,154 @@
+import json
+import os
+import pytest
+
+import pyarrow.dataset as ds
+
+from scripts.artifacts import ArtifactRegistry
+from scripts.event_exporter import AdaptiveWindow, EventExporter
+from scripts.ownership_indexer import CORE, EVM
+
+from fake_chain import FakeLogSource
+
+ALICE = "0x" + "aa" * 20
+BOB = "0x" + "bb" * 20
+BATCH_NBR = 20230401
+ABI = [
+    {
+        "type": "event",
+        "name": "Transfer",
+        "anonymous": False,
+        "inputs": [
+            {"type": "address", "name": "from", "indexed": True},
+            {"type": "address", "name": "to", "indexed": True},
+            {"type": "uint256", "name": "tokenId", "indexed": True},
+        ],
+    },
+    {
+        "type": "event",
+        "name": "BatchStart",
+        "anonymous": False,
+        "inputs": [
+            {"type": "uint256", "name": "startBlock", "indexed": False},
+            {"type": "uint128", "name": "batchNbr", "indexed": False},
+            {"type": "uint8", "name": "ratio", "indexed": False},
+        ],
+    },
+]
+
+
+def _token_id(batch_nbr: int, rarity: int, internal_id: int) -> int:
+    return batch_nbr * 10**6 + rarity * 10**4 + internal_id
+
+
+@pytest.fixture
+def registry(tmp_path) -> ArtifactRegistry:
+    build_dir = tmp_path / "contracts"
+    build_dir.mkdir()
+    for name in ("DualSpaceNFTCore", "DualSpaceNFTEvm"):
+        with open(build_dir / f"{name}.json", "w") as f:
+            json.dump({"contractName": name, "abi": ABI, "bytecode": "0x"}, f)
+    return ArtifactRegistry(str(build_dir), str(tmp_path / "cache"))
+
+
+def _sources():
+    core, evm = FakeLogSource(40), FakeLogSource(40)
+    core.batch_start(2, BATCH_NBR)
+    evm.batch_start(2, BATCH_NBR)
+    for block in range(3, 40, 3):
+        core.transfer(block, ALICE, _token_id(BATCH_NBR, block % 3 + 1, block))
+    evm.transfer(7, BOB, _token_id(BATCH_NBR + 1, 2, 1))
+    return core, evm
+
+
+def _exporter(out_dir: str, registry: ArtifactRegistry, core: FakeLogSource, evm: FakeLogSource, **kwargs):
+    sources = {CORE: (core, "0x" + "11" * 20, 1), EVM: (evm, "0x" + "22" * 20, 1)}
+    return EventExporter(out_dir, sources, registry, confirmations=0, **kwargs)
+
+
+def _rows(out_dir: str, name: str):
+    return ds.dataset(os.path.join(out_dir, name), partitioning="hive").to_table().to_pylist()
+
+
+def test_partitions(tmp_path, registry):
+    out_dir = str(tmp_path / "export")
+    core, evm = _sources()
+    assert _exporter(out_dir, registry, core, evm, window=100).sync() == {CORE: 14, EVM: 2}
+    assert sorted(os.listdir(os.path.join(out_dir, "Transfer"))) == [
+        f"batch_nbr={BATCH_NBR}",
+        f"batch_nbr={BATCH_NBR + 1}",
+    ]
+    assert sorted(os.listdir(os.path.join(out_dir, "Transfer", f"batch_nbr={BATCH_NBR + 1}"))) == [
+        "part-evm-000000000001-000000000040-0.parquet"
+    ]
+    transfers = _rows(out_dir, "Transfer")
+    evm_transfer = next(row for row in transfers if row["space"] == EVM)
+    assert evm_transfer["to"] == BOB and evm_transfer["block"] == 7
+    assert (evm_transfer["batch_nbr"], evm_transfer["rarity"], evm_transfer["internal_id"]) == (BATCH_NBR + 1, 2, 1)
+    batch_starts = _rows(out_dir, "BatchStart")
+    assert sorted(row["space"] for row in batch_starts) == [CORE, EVM]
+    assert all(row["batch_nbr"] == BATCH_NBR and row["startBlock"] == 2 for row in batch_starts)
+
+
+def test_rerun_after_interrupted_flush(tmp_path, registry):
+    out_dir = str(tmp_path / "export")
+    core, evm = _sources()
+    exporter = _exporter(out_dir, registry, core, evm, window=5, max_rows=3)
+    save_state = exporter._save_state
+    saves = []
+
+    def interrupted_save_state():
+        saves.append(dict(exporter.cursors))
+        if len(saves) == 2:
+            # the files of the second flush are written, its cursor is not saved
+            raise KeyboardInterrupt
+        save_state()
+
+    exporter._save_state = interrupted_save_state  # type: ignore
+    with pytest.raises(KeyboardInterrupt):
+        exporter.sync()
+    with open(os.path.join(out_dir, "_state.json")) as f:
+        saved_cursor = json.load(f)["cursors"][CORE]
+    assert 1 <= saved_cursor < saves[1][CORE]
+
+    # appended again from the saved cursor
+    core.extend(50)
+    core.transfer(45, BOB, _token_id(BATCH_NBR, 1, 45))
+    resumed = _exporter(out_dir, registry, core, evm, window=5, max_rows=3)
+    assert resumed.cursors[CORE] == saved_cursor
+    resumed.sync()
+    transfers = _rows(out_dir, "Transfer")
+    keys = [(row["space"], row["block"], row["tokenId"]) for row in transfers]
+    assert len(keys) == len(set(keys)) == 15
+    assert sorted(row["block"] for row in transfers if row["space"] == CORE) == list(range(3, 40, 3)) + [45]
+    assert resumed.cursors == {CORE: 50, EVM: 40}
+
+
+def test_window_shrinks_on_too_many_results(tmp_path, registry):
+    core, evm = _sources()
+    get_logs = core.get_logs
+    queried = []
+
+    def limited_get_logs(address, from_block, to_block, topics=None):
+        queried.append(to_block - from_block + 1)
+        if to_block - from_block >= 8:
+            raise ValueError("query returned more than 10000 results")
+        return get_logs(address, from_block, to_block, topics)
+
+    core.get_logs = limited_get_logs  # type: ignore
+    out_dir = str(tmp_path / "export")
+    assert _exporter(out_dir, registry, core, evm, window=32)._get_logs(CORE, AdaptiveWindow(32), 1, 40)[1] == 8
+    assert queried == [32, 16, 8]
+    queried.clear()
+    assert _exporter(out_dir, registry, core, evm, window=32).sync()[CORE] == 14
+    # grows again after every successful window, shrinks on every error
+    assert queried[:5] == [32, 16, 8, 16, 8]
+
+
+def test_adaptive_window():
+    window = AdaptiveWindow(4, minimum=2, maximum=8)
+    window.grow()
+    window.grow()
+    assert window.size == 8
+    assert window.shrink() and window.shrink() and window.size == 2
+    assert not window.shrink()
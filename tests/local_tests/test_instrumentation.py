@@ -0,0 +1,77 @@
+import json
+import math
+from unittest import mock
+
+from eth_utils import keccak
+
+from scripts import instrumentation
+from scripts.artifacts import ArtifactRegistry
+from scripts.instrumentation import Histogram, MetricsRegistry, function_name
+
+MINT = {
+    "type": "function",
+    "name": "mint",
+    "inputs": [{"type": "uint128", "name": "batchNbr"}],
+    "outputs": [],
+    "stateMutability": "nonpayable",
+}
+
+
+def test_histogram():
+    histogram = Histogram("latency", "help", ("method",), buckets=(0.1, 1, math.inf))
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value, "eth_call")
+    histogram.observe(3, "eth_chainId")
+    # buckets are cumulative
+    assert histogram.values[("eth_call",)] == [2, 3, 4, 2.65, 4]
+    assert histogram.to_json()["eth_chainId"] == {
+        "count": 1,
+        "sum": 3,
+        "avg": 3,
+        "buckets": {"0.1": 0, "1": 0, "+Inf": 1},
+    }
+
+
+def test_render():
+    registry = MetricsRegistry()
+    errors = registry.counter("rpc_errors_total", "failed requests", ("method",))
+    errors.inc("eth_call")
+    errors.inc("eth_call", amount=2)
+    registry.counter("restarts_total", "restarts").inc()
+    registry.histogram("gas", "gas used", ("space", "function"), (21000, math.inf)).observe(30000, "core", 'a"b')
+    assert registry.counter("rpc_errors_total", "ignored") is errors
+    assert registry.render() == (
+        "# HELP rpc_errors_total failed requests\n"
+        "# TYPE rpc_errors_total counter\n"
+        'rpc_errors_total{method="eth_call"} 3\n'
+        "# HELP restarts_total restarts\n"
+        "# TYPE restarts_total counter\n"
+        "restarts_total 1\n"
+        "# HELP gas gas used\n"
+        "# TYPE gas histogram\n"
+        'gas_bucket{space="core",function="a\\"b",le="21000"} 0\n'
+        'gas_bucket{space="core",function="a\\"b",le="+Inf"} 1\n'
+        'gas_sum{space="core",function="a\\"b"} 30000\n'
+        'gas_count{space="core",function="a\\"b"} 1\n'
+    )
+
+
+def test_function_name(tmp_path):
+    build_dir = tmp_path / "contracts"
+    build_dir.mkdir()
+    with open(build_dir / "DualSpaceNFTCore.json", "w") as f:
+        json.dump({"contractName": "DualSpaceNFTCore", "abi": [MINT], "bytecode": "0x"}, f)
+    artifacts = ArtifactRegistry(str(build_dir), str(tmp_path / "cache"))
+    selector = keccak(text="mint(uint128)")[:4]
+    to = "0x" + "11" * 20
+    patch_registry = mock.patch("scripts.artifacts.registry", artifacts)
+    with patch_registry, mock.patch.object(instrumentation, "_function_names", None):
+        assert function_name({"to": to, "data": "0x" + selector.hex().upper() + "00" * 32}) == "mint"
+        assert function_name({"to": to, "data": selector + bytes(32)}) == "mint"
+        # unknown selectors are reported as is
+        assert function_name({"to": to, "data": "0x12345678"}) == "0x12345678"
+        # calldata shorter than a selector, e.g. a value transfer
+        assert function_name({"to": to, "data": "0x"}) == "transfer"
+        assert function_name({"to": to, "data": b"\x01\x02"}) == "transfer"
+        assert function_name({"to": to}) == "transfer"
+        assert function_name({"data": "0x6000"}) == "constructor"
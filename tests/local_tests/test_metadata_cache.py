@@ -0,0 +1,158 @@
+import threading
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from eth_abi import encode
+
+from scripts.metadata_cache import BASE_URI_CHANGE_TOPIC, LRUCache, MetadataService
+from scripts.ownership_indexer import Log
+
+from fake_chain import FakeLogSource
+
+TOKEN_A = 20230401 * 10**6 + 1 * 10**4 + 1
+# same batch and rarity as TOKEN_A
+TOKEN_B = TOKEN_A + 1
+TOKEN_C = 20230401 * 10**6 + 2 * 10**4 + 1
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeContract:
+    address = "0x" + "22" * 20
+
+    def __init__(self, base_uri: str):
+        self.base_uri = base_uri
+        self.reads = 0
+        self.functions = SimpleNamespace(baseURI=lambda: SimpleNamespace(call=self._call))
+
+    def _call(self) -> str:
+        self.reads += 1
+        return self.base_uri
+
+
+class DoneExecutor:
+    """
+    runs the fetch in `submit`, the future is done before the service sees it
+    """
+
+    def submit(self, f, *args) -> Future:
+        future = Future()
+        future.set_result(f(*args))
+        return future
+
+    def shutdown(self):
+        pass
+
+
+def test_lru_cache():
+    clock = Clock()
+    cache = LRUCache(capacity=2, ttl=10, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    # "b" is the least recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    clock.now = 10
+    assert cache.get("a", "expired") == "expired" and len(cache) == 1
+    assert cache.hits == 3 and cache.misses == 2
+
+
+def test_metadata_ttl():
+    clock = Clock()
+    fetched = []
+    contract = FakeContract("https://poap/")
+
+    def fetch(uri):
+        fetched.append(uri)
+        return {"uri": uri}
+
+    with MetadataService(contract, fetch, ttl=100, base_uri_ttl=1000, clock=clock) as service:
+        assert service.metadata_many([TOKEN_A, TOKEN_B, TOKEN_C]) == [
+            {"uri": "https://poap/2023040101"},
+            {"uri": "https://poap/2023040101"},
+            {"uri": "https://poap/2023040102"},
+        ]
+        assert service.metadata(TOKEN_B) == {"uri": "https://poap/2023040101"}
+        assert fetched == ["https://poap/2023040101", "https://poap/2023040102"]
+        assert service.hit_rate == 0.5
+        clock.now = 100
+        service.metadata(TOKEN_A)
+        assert fetched[2:] == ["https://poap/2023040101"]
+    assert contract.reads == 1
+
+
+def test_concurrent_lookups_share_fetch():
+    release = threading.Event()
+    fetched = []
+
+    def fetch(uri):
+        fetched.append(uri)
+        release.wait(5)
+        return uri
+
+    with MetadataService(FakeContract("ipfs://"), fetch) as service:
+        # the fetch is released once every lookup waits for it
+        waiting = threading.Semaphore(0)
+        fetch_future = service._fetch
+
+        def _fetch(uri):
+            future = fetch_future(uri)
+            waiting.release()
+            return future
+
+        service._fetch = _fetch  # type: ignore
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(service.metadata(TOKEN_A))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for _ in threads:
+            assert waiting.acquire(timeout=5)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        assert results == ["ipfs://2023040101"] * 4
+        assert fetched == ["ipfs://2023040101"] and service.fetches == 1
+
+
+def test_fetch_done_before_callback():
+    service = MetadataService(FakeContract("ipfs://"), lambda uri: uri)
+    service._executor = DoneExecutor()  # type: ignore
+    results = []
+    thread = threading.Thread(target=lambda: results.append(service.metadata_many([TOKEN_A, TOKEN_C])), daemon=True)
+    thread.start()
+    thread.join(5)
+    assert results == [["ipfs://2023040101", "ipfs://2023040102"]]
+    assert not service._in_flight
+
+
+def test_base_uri_change_drops_cache():
+    clock = Clock()
+    contract = FakeContract("ipfs://old/")
+    with MetadataService(contract, lambda uri: uri, base_uri_ttl=60, clock=clock) as service:
+        assert service.metadata(TOKEN_A) == "ipfs://old/2023040101"
+        contract.base_uri = "ipfs://new/"
+        # read again only when base_uri_ttl is over
+        assert service.metadata(TOKEN_A) == "ipfs://old/2023040101"
+        clock.now = 60
+        assert service.metadata(TOKEN_A) == "ipfs://new/2023040101"
+        assert len(service.cache) == 1
+        contract.base_uri = "ipfs://newer/"
+        service.invalidate()
+        assert service.token_uri(TOKEN_C) == "ipfs://newer/2023040102" and len(service.cache) == 0
+
+    # with a log source the change is picked from `BaseURIChange` logs
+    contract = FakeContract("ipfs://old/")
+    source = FakeLogSource(10)
+    with MetadataService(contract, lambda uri: uri, log_source=source, from_block=1) as service:
+        assert service.metadata(TOKEN_A) == "ipfs://old/2023040101"
+        source.extend(12)
+        source.logs.append(Log(12, [BASE_URI_CHANGE_TOPIC], encode(["string"], ["ipfs://new/"])))
+        assert service.metadata(TOKEN_A) == "ipfs://new/2023040101"
+        assert contract.reads == 1 and service.fetches == 2
@@ -0,0 +1,80 @@
+from eth_account import Account
+from eth_account.messages import encode_typed_data
+from eth_utils import keccak
+
+from scripts.metatransaction import (
+    MetatransactionBuilder,
+    digest,
+    domain_separator,
+    is_overwhelmingly_same_address,
+    recover_signer,
+    sign_digest,
+    signable_message,
+)
+
+CHAIN_ID = 71
+CONTRACT = "0x" + "12" * 20
+NEW_CORE_OWNER = "0x" + "34" * 20
+
+
+def _typed_data(nonce: int, token_id: int, new_core_owner: str):
+    return {
+        "types": {
+            "EIP712Domain": [
+                {"name": "name", "type": "string"},
+                {"name": "version", "type": "string"},
+                {"name": "chainId", "type": "uint256"},
+                {"name": "verifyingContract", "type": "address"},
+            ],
+            "EvmMetatransaction": [
+                {"name": "metatransactionNonce", "type": "uint256"},
+                {"name": "tokenId", "type": "uint256"},
+                {"name": "newCoreOwner", "type": "address"},
+            ],
+        },
+        "primaryType": "EvmMetatransaction",
+        "domain": {"name": "NAME", "version": "v1", "chainId": CHAIN_ID, "verifyingContract": CONTRACT},
+        "message": {"metatransactionNonce": nonce, "tokenId": token_id, "newCoreOwner": new_core_owner},
+    }
+
+
+def test_digest_matches_typed_data():
+    separator = domain_separator("NAME", "v1", CHAIN_ID, CONTRACT)
+    expected = encode_typed_data(full_message=_typed_data(3, 2023040101010001, NEW_CORE_OWNER))
+    assert signable_message(separator, 3, 2023040101010001, NEW_CORE_OWNER) == expected
+    assert digest(separator, 3, 2023040101010001, NEW_CORE_OWNER) == keccak(
+        b"\x19" + expected.version + expected.header + expected.body
+    )
+
+
+def test_sign_and_recover():
+    account = Account.create()
+    separator = domain_separator("NAME", "v1", CHAIN_ID, CONTRACT)
+    message_digest = digest(separator, 0, 1, NEW_CORE_OWNER)
+    signature = sign_digest(account.key, message_digest)
+    assert signature == account.sign_message(signable_message(separator, 0, 1, NEW_CORE_OWNER)).signature
+    assert recover_signer(message_digest, signature) == account.address
+    # core space addresses only differ in the type bits
+    core_address = "0x1" + account.address[3:]
+    assert is_overwhelmingly_same_address(core_address, account.address)
+    assert not is_overwhelmingly_same_address(NEW_CORE_OWNER, account.address)
+
+
+def test_builder_nonces():
+    fetched = []
+
+    def nonce_source(signers):
+        fetched.append(list(signers))
+        return [10 * (i + 1) for i in range(len(signers))]
+
+    accounts = [Account.create() for _ in range(3)]
+    builder = MetatransactionBuilder(CHAIN_ID, "NAME", "v1", CONTRACT, nonce_source, workers=0, chunk_size=2)
+    requests = [(accounts[i % 2].key, i, NEW_CORE_OWNER) for i in range(4)] + [(accounts[2].key, 4, NEW_CORE_OWNER)]
+    signed = list(builder.sign_many(requests))
+    # nonces are fetched in chunks and advanced locally per signer
+    assert [len(chunk) for chunk in fetched] == [2, 1]
+    assert [m.nonce for m, _ in signed] == [10, 20, 11, 21, 10]
+    for metatransaction, signature in signed:
+        assert recover_signer(metatransaction.digest, signature) == metatransaction.evm_signer
+    builder.reset_nonce(accounts[0].address)
+    assert builder.peek_nonce(accounts[0].address) == 10 and builder.peek_nonce(accounts[1].address) == 22
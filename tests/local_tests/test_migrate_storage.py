@@ -0,0 +1,34 @@
+import pytest
+
+from scripts.migrate_storage import StorageMigrator, started_batches
+
+from fake_chain import SENDER, FakeContract, FakeCore, FakeLogSource, decode_call
+
+
+def test_finishing_chunk_checks_started_batches():
+    core = FakeCore()
+    core.default_account = SENDER  # type: ignore
+    source = FakeLogSource(50)
+    source.batch_start(3, 20230401)
+    source.batch_start(40, 20230501)
+    source.transfer(41, SENDER, 1)
+    started = lambda: started_batches(source, FakeContract.address, 0, chunk_size=10)
+    assert started() == {20230401, 20230501}
+
+    migrator = StorageMigrator(core, FakeContract(), chunk_size=2)  # type: ignore
+    migrator.sender.poll_interval = 0
+    with pytest.raises(Exception, match=r"started batches \[20230501\] are not migrated"):
+        migrator.migrate([20230401], [1, 2, 3], started)
+    # the chunks before are sent, legacy storage is still read
+    assert [decode_call(tx["data"])["args"][2] for tx in core.sent] == [False]
+
+    assert migrator.migrate([20230401, 20230501], [1, 2, 3], started) == 3
+    calls = [decode_call(tx["data"])["args"] for tx in core.sent[1:]]
+    assert calls == [[[20230401, 20230501], [], False], [[], [1, 2], False], [[], [3], True]]
+    assert [(chunk["batches"], chunk["tokens"]) for chunk in migrator.gas_report()] == [
+        (1, 1),
+        (2, 0),
+        (0, 2),
+        (0, 1),
+    ]
+    assert all(chunk["gasUsed"] == 21000 for chunk in migrator.gas_report())
@@ -0,0 +1,62 @@
+from scripts.ownership_indexer import ZERO_ADDRESS, OwnershipIndexer
+
+from fake_chain import FakeLogSource
+
+CORE_CONTRACT = "0x" + "11" * 20
+EVM_CONTRACT = "0x" + "22" * 20
+ALICE = "0x" + "aa" * 20
+BOB = "0x" + "bb" * 20
+
+
+def _indexer(core: FakeLogSource, **kwargs) -> OwnershipIndexer:
+    # chunks end at multiples of chunk_size
+    return OwnershipIndexer(core, CORE_CONTRACT, FakeLogSource(), EVM_CONTRACT, core_start=1, **kwargs)
+
+
+def test_transfers():
+    core = FakeLogSource(30)
+    core.transfer(3, ALICE, 1)
+    core.transfer(12, ALICE, 2)
+    core.transfer(25, BOB, 1)
+    indexer = _indexer(core, chunk_size=10)
+    indexer.sync()
+    assert indexer.index.owner_of(1).core_owner == BOB  # type: ignore
+    assert indexer.index.owner_of(2).core_owner == ALICE  # type: ignore
+    assert indexer.index.owner_of(2).evm_owner == ZERO_ADDRESS  # type: ignore
+    assert indexer.index.owner_of(3) is None
+
+
+def test_reorg_rolls_back_to_checkpoint():
+    core = FakeLogSource(20)
+    core.transfer(12, ALICE, 1)
+    core.transfer(18, ALICE, 2)
+    indexer = _indexer(core, chunk_size=10, reorg_depth=5)
+    indexer.sync()
+    # the journal still covers block 12 which is after the oldest kept checkpoint (block 10)
+    assert [c[0] for c in indexer.spaces["core"].checkpoints] == [10, 20]
+    assert [entry[0] for entry in indexer.spaces["core"].journal] == [12, 18]
+    # blocks from 11 are replaced, token 1 goes to bob in the fork and token 2 is not minted
+    core.reorg(11, "fork")
+    core.transfer(14, BOB, 1)
+    indexer.sync()
+    assert indexer.index.owner_of(1).core_owner == BOB  # type: ignore
+    assert indexer.index.owner_of(2) is None
+    assert indexer.spaces["core"].cursor == 20
+
+
+def test_journal_is_pruned_with_checkpoints(tmp_path):
+    core = FakeLogSource(100)
+    for block in range(1, 101, 7):
+        core.transfer(block, ALICE, block)
+    path = str(tmp_path / "index.json")
+    indexer = _indexer(core, chunk_size=10, reorg_depth=25, state_path=path)
+    indexer.sync()
+    state = indexer.spaces["core"]
+    assert state.checkpoints[0][0] == 70
+    assert all(entry[0] > 70 for entry in state.journal)
+    assert len(state.journal) == len([b for b in range(1, 101, 7) if b > 70])
+    # rolled back to the oldest checkpoint of the saved state
+    core.reorg(75, "fork")
+    resumed = _indexer(core, chunk_size=10, reorg_depth=25, state_path=path)
+    resumed.sync()
+    assert sorted(resumed.index.token_ids()) == [b for b in range(1, 101, 7) if b < 75]
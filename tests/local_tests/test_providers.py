@@ -0,0 +1,84 @@
+import pytest
+import requests
+
+from scripts.providers import PooledHTTPProvider, metrics
+
+from fake_chain import SENDER, FakeCore, FakeRpcServer
+
+
+@pytest.fixture
+def core():
+    return FakeCore(auto_mine=False)
+
+
+@pytest.fixture
+def server(core):
+    server = FakeRpcServer(core)
+    yield server
+    server.close()
+
+
+def _provider(server: FakeRpcServer, **kwargs) -> PooledHTTPProvider:
+    return PooledHTTPProvider(server.url, session=requests.Session(), backoff=0, **kwargs)
+
+
+def _retries(method: str) -> int:
+    stats = metrics.methods.get(method)
+    return stats.retries if stats else 0
+
+
+def test_retry(core, server):
+    core.epoch = 5
+    provider = _provider(server, retries=2)
+    retries = _retries("cfx_epochNumber")
+    server.errors = [429, 503]
+    assert provider.make_request("cfx_epochNumber", [])["result"] == "0x5"
+    assert len(server.requests) == 3 and _retries("cfx_epochNumber") == retries + 2
+    # out of retries
+    server.errors = [500] * 3
+    with pytest.raises(requests.HTTPError):
+        provider.make_request("cfx_epochNumber", [])
+    # client errors are not retried
+    server.errors = [400]
+    requests_count = len(server.requests)
+    with pytest.raises(requests.HTTPError):
+        provider.make_request("cfx_epochNumber", [])
+    assert len(server.requests) == requests_count + 1
+
+
+def test_batch_request(core, server):
+    tx_hash = core.send_transaction({"from": SENDER, "nonce": 0})
+    core.mine()
+    provider = _provider(server)
+    server.errors = [429]
+    results = provider.batch_request(
+        [
+            ("cfx_getTransactionReceipt", ["0x" + tx_hash.hex()]),
+            ("cfx_unknownMethod", []),
+            ("cfx_getTransactionReceipt", ["0x" + "00" * 32]),
+            ("cfx_epochNumber", []),
+        ]
+    )
+    # one batch sent again after the rate limit
+    assert len(server.requests) == 2 and len(server.requests[1]) == 4
+    assert results[0]["transactionHash"] == "0x" + tx_hash.hex()
+    assert isinstance(results[1], Exception) and "cfx_unknownMethod" in str(results[1])
+    assert results[2] is None and results[3] == "0x1"
+    assert provider.batch_request([]) == [] and len(server.requests) == 2
+
+
+def test_sends_are_not_retried(core, server):
+    provider = _provider(server, retries=2)
+    # the first attempt may have reached the node
+    server.errors = [503]
+    with pytest.raises(requests.HTTPError):
+        provider.make_request("cfx_sendRawTransaction", ["0x00"])
+    assert len(server.requests) == 1
+    server.errors = [502]
+    with pytest.raises(requests.HTTPError):
+        provider.batch_request([("cfx_epochNumber", []), ("cfx_sendRawTransaction", ["0x00"])])
+    assert len(server.requests) == 2
+    # rate limited requests are not processed
+    server.errors = [429]
+    assert "error" in provider.make_request("cfx_sendRawTransaction", ["0x00"])
+    assert len(server.requests) == 4
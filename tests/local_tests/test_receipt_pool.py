@@ -0,0 +1,64 @@
+import asyncio
+import pytest
+
+from scripts.receipt_pool import CORE_RECEIPT_METHOD, ReceiptPool, wait_for_receipts
+
+from fake_chain import SENDER, FakeCore, FakeRpcServer
+
+
+@pytest.fixture
+def core():
+    return FakeCore(auto_mine=False, fails=lambda tx: tx.get("data") == "0xbad")
+
+
+@pytest.fixture
+def server(core):
+    server = FakeRpcServer(core)
+    yield server
+    server.close()
+
+
+def _send(core: FakeCore, data: str = "0x") -> bytes:
+    return core.send_transaction({"from": SENDER, "nonce": len(core.sent), "data": data})
+
+
+def test_wait_for_receipts(core, server):
+    hashes = [_send(core) for _ in range(3)]
+    core.mine()
+    receipts = wait_for_receipts(server.url, hashes, CORE_RECEIPT_METHOD, poll_interval=0.01)
+    assert [r["transactionHash"] for r in receipts] == ["0x" + h.hex() for h in hashes]
+    # the receipts are fetched in one batch
+    assert all(isinstance(payload, list) for payload in server.requests)
+
+
+def test_timeout_stops_polling(core, server):
+    async def run():
+        async with ReceiptPool(server.url, CORE_RECEIPT_METHOD, poll_interval=0.01) as pool:
+            tx_hash = _send(core)
+            with pytest.raises(asyncio.TimeoutError):
+                await pool.wait(tx_hash, timeout=0.05)
+            assert pool._futures == {} and pool._waiters == {}
+            # a hash waited twice keeps being polled until both waits give up
+            waits = [asyncio.ensure_future(pool.wait(tx_hash, timeout)) for timeout in (0.05, 5)]
+            with pytest.raises(asyncio.TimeoutError):
+                await waits[0]
+            assert list(pool._futures) == ["0x" + tx_hash.hex()]
+            core.mine()
+            assert (await waits[1])["outcomeStatus"] == "0x0"
+            assert pool._futures == {} and pool._waiters == {}
+
+    asyncio.run(run())
+
+
+def test_failed_transaction_stops_wait_all(core, server):
+    async def run():
+        async with ReceiptPool(server.url, CORE_RECEIPT_METHOD, poll_interval=0.01) as pool:
+            failed = _send(core, "0xbad")
+            core.mine()
+            pending = _send(core)
+            with pytest.raises(Exception, match="failed"):
+                await pool.wait_all([failed, pending], timeout=5)
+            await asyncio.sleep(0)
+            assert pool._futures == {} and pool._waiters == {}
+
+    asyncio.run(run())
@@ -0,0 +1,107 @@
+import pytest
+from typing import Any
+
+from web3 import Web3
+
+from scripts.dual_space_sim import DualSpaceSimulator
+from scripts.metatransaction import signable_message
+from scripts.relayer import RelayError, Relayer
+from scripts.tx_pipeline import ESpace
+
+from conftest import Accounts, Metatransactions
+
+
+@pytest.fixture
+def relayer(backend: Any, core_contract: Any, accounts: Accounts) -> Relayer:
+    if not isinstance(backend, DualSpaceSimulator):
+        pytest.skip("relays from a simulator account")
+    relayer = Relayer(
+        backend.w3, core_contract, storage_limit=None, space=ESpace(backend.w3), sender=backend.owner.address
+    )
+    relayer.sender.poll_interval = 0
+    return relayer
+
+
+def _payload(metatransactions: Metatransactions, evm_signer: Any, token_id: int, new_core_owner: Any, nonce: int):
+    signature = evm_signer.sign_message(
+        signable_message(metatransactions.domain_separator, nonce, token_id, new_core_owner)
+    ).signature
+    return {
+        "evmSigner": evm_signer.address,
+        "tokenId": token_id,
+        "newCoreOwner": new_core_owner,
+        "signature": signature.hex(),
+        "nonce": nonce,
+    }
+
+
+def test_relay(
+    relayer: Relayer, core_contract: Any, accounts: Accounts, metatransactions: Metatransactions, token_id: int
+):
+    nonce = core_contract.functions.getMetatransactionNonce(accounts.evm_user.address).call()
+    payload = _payload(metatransactions, accounts.evm_user, token_id, core_contract.address, nonce)
+    with pytest.raises(RelayError, match="invalid nonce"):
+        relayer.relay({**payload, "nonce": nonce + 1})
+    with pytest.raises(RelayError, match="signature does not match"):
+        relayer.relay({**payload, "evmSigner": accounts.evm_another.address})
+    with pytest.raises(RelayError, match="malformed request"):
+        relayer.relay({**payload, "nonce": "next"})
+    # the signature is accepted for an address differing in the first 4 bits, setCoreOwner still needs the owner
+    similar_signer = Web3.to_checksum_address(
+        "0x" + format(int(accounts.evm_user.address[2], 16) ^ 1, "x") + accounts.evm_user.address[3:]
+    )
+    similar_nonce = core_contract.functions.getMetatransactionNonce(similar_signer).call()
+    with pytest.raises(RelayError, match="not the espace owner"):
+        relayer.relay(
+            {
+                **_payload(metatransactions, accounts.evm_user, token_id, core_contract.address, similar_nonce),
+                "evmSigner": similar_signer,
+            }
+        )
+    status = relayer.relay(payload)
+    assert status["nonce"] == nonce and not status["duplicate"]
+    assert relayer.relay(payload)["duplicate"]
+    relayer.sender.flush()
+    assert relayer.status(status["hash"])["status"] == "executed"  # type: ignore
+    assert core_contract.functions.ownerOf(token_id).call() == core_contract.address
+
+
+def test_failed_relay_releases_nonce(
+    relayer: Relayer, core_contract: Any, accounts: Accounts, metatransactions: Metatransactions, token_id: int
+):
+    nonce = core_contract.functions.getMetatransactionNonce(accounts.evm_user.address).call()
+    payload = _payload(metatransactions, accounts.evm_user, token_id, accounts.user.address, nonce)
+    # runs out of gas
+    relayer.gas = 30000
+    status = relayer.relay(payload)
+    relayer.sender.flush()
+    assert relayer.status(status["hash"])["status"] == "failed"  # type: ignore
+    relayer.gas = 500000
+    assert not relayer.relay(payload)["duplicate"]
+    relayer.sender.flush()
+    assert core_contract.functions.getMetatransactionNonce(accounts.evm_user.address).call() == nonce + 1
+
+
+def test_nonce_used_without_relayer(
+    backend: Any,
+    relayer: Relayer,
+    core_contract: Any,
+    accounts: Accounts,
+    metatransactions: Metatransactions,
+    token_id: int,
+):
+    nonce = core_contract.functions.getMetatransactionNonce(accounts.evm_user.address).call()
+    assert relayer.builder.peek_nonce(accounts.evm_user.address) == nonce
+    backend.transact(
+        core_contract.functions.clearCoreOwner(
+            accounts.evm_user.address,
+            token_id,
+            metatransactions.sign(accounts.evm_user, token_id, core_contract.address),
+        ),
+        accounts.random_sender,
+    )
+    # the nonce cached by the relayer is behind the chain
+    payload = _payload(metatransactions, accounts.evm_user, token_id, accounts.user.address, nonce + 1)
+    assert relayer.relay(payload)["nonce"] == nonce + 1
+    relayer.sender.flush()
+    assert core_contract.functions.ownerOf(token_id).call() == accounts.user.address
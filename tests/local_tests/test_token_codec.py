@@ -0,0 +1,54 @@
+import numpy as np
+
+from scripts.token_codec import BatchTable, decode, encode, is_privilege_expired, metadata_ids, privilege_expiration
+
+UINT64_MAX = 2**64 - 1
+
+
+def _next_token_id(batch_nbr: int, rarity: int, internal_id: int) -> int:
+    # `DualSpaceGeneral._nextTokenId`
+    return batch_nbr * 10**6 + rarity * 10**4 + internal_id
+
+
+def _resolve_token_id(token_id: int):
+    # `DualSpaceGeneral._resolveTokenId`
+    batch_nbr = token_id // 10**6
+    rarity = (token_id - batch_nbr * 10**6) // 10**4
+    return batch_nbr, rarity, token_id - batch_nbr * 10**6 - rarity * 10**4
+
+
+def test_encode_decode():
+    fields = [
+        (20230401, 0, 0),
+        (20230401, 0, 9999),
+        (20230401, 99, 1),
+        (20230401, 99, 9999),
+        (99999998, 1, 1),
+        # largest batch number whose token ids fit in uint64
+        (UINT64_MAX // 10**6, 0, 9999),
+        (UINT64_MAX // 10**6, 55, 1615),
+    ]
+    batch_nbrs, rarities, internal_ids = zip(*fields)
+    token_ids = encode(batch_nbrs, rarities, internal_ids)
+    assert token_ids.dtype == np.uint64
+    assert token_ids.tolist() == [_next_token_id(*f) for f in fields]
+    assert token_ids.tolist()[-1] == UINT64_MAX
+    decoded = decode(token_ids)
+    assert list(zip(*(a.tolist() for a in decoded))) == [_resolve_token_id(t) for t in token_ids.tolist()]
+    assert list(zip(*(a.tolist() for a in decoded))) == fields
+    assert metadata_ids(token_ids).tolist() == [t // 10**4 for t in token_ids.tolist()]
+
+
+def test_privilege_expiration():
+    table = BatchTable({20230401: (100, 2), 20230501: (5000, 1)})
+    token_ids = [
+        _next_token_id(20230401, 0, 1),
+        _next_token_id(20230401, 99, 9999),
+        _next_token_id(20230501, 3, 1),
+        # not started, start block and ratio are 0
+        _next_token_id(20230601, 3, 1),
+    ]
+    assert privilege_expiration(token_ids, table, base_interval=10).tolist() == [100, 100 + 2 * 99 * 10, 5030, 0]
+    assert is_privilege_expired(token_ids, table, 100, base_interval=10).tolist() == [False, False, False, True]
+    assert is_privilege_expired(token_ids, table, 101, base_interval=10).tolist() == [True, False, False, True]
+    assert privilege_expiration(token_ids, BatchTable({}), base_interval=10).tolist() == [0, 0, 0, 0]
@@ -0,0 +1,128 @@
+import pytest
+import threading
+
+from scripts.tx_pipeline import CoreSpace, PipelinedSender
+
+from fake_chain import SENDER, FakeCore
+
+
+def _sender(core: FakeCore, **kwargs) -> PipelinedSender:
+    return PipelinedSender(CoreSpace(core), SENDER, poll_interval=0, **kwargs)  # type: ignore
+
+
+def test_window_and_nonces():
+    core = FakeCore(auto_mine=False)
+    sender = _sender(core, window=2)
+    first = sender.submit({"data": "0x01"})
+    sender.submit({"data": "0x02"})
+    assert sender.in_flight == 2
+    # the window is full, submit waits until a transaction is executed
+    threading.Timer(0.05, core.mine).start()
+    third = sender.submit({"data": "0x03"})
+    assert [tx["nonce"] for tx in core.sent] == [0, 1, 2]
+    assert first.receipt is not None and third.nonce == 2
+    core.mine()
+    assert len(sender.flush()) == 1 and sender.in_flight == 0
+
+
+def test_nonce_resync():
+    core = FakeCore()
+    sender = _sender(core)
+    sender.wait(sender.submit({"data": "0x01"}))
+    # the account is used by another process meanwhile
+    core.send_transaction({"from": SENDER, "nonce": 1, "data": "0xff"})
+    core.mine()
+    assert sender.wait(sender.submit({"data": "0x02"}))["outcomeStatus"] == 0
+    assert [tx["nonce"] for tx in core.sent] == [0, 1, 2]
+
+
+def test_failed_send_after_resync():
+    core = FakeCore()
+    sender = _sender(core, timeout=5)
+    sender.wait(sender.submit({"data": "0x01"}))
+    core.send_transaction({"from": SENDER, "nonce": 1, "data": "0xff"})
+    core.mine()
+    send = core.send_transaction
+    calls = []
+
+    def fail_second_send(tx):
+        calls.append(tx["nonce"])
+        if len(calls) == 2:
+            raise ConnectionError("node unavailable")
+        return send(tx)
+
+    core.send_transaction = fail_second_send  # type: ignore
+    with pytest.raises(ConnectionError):
+        sender.submit({"data": "0x02"})
+    # the resynced nonce is not skipped
+    assert sender.wait(sender.submit({"data": "0x03"}))["outcomeStatus"] == 0
+    assert calls == [1, 2, 2]
+
+
+def test_resend_dropped_and_replaced():
+    core = FakeCore(auto_mine=False)
+    settled = []
+    sender = _sender(core, resend_after=0, on_settled=settled.append)
+    dropped = sender.submit({"data": "0x01"})
+    replaced = sender.submit({"data": "0x02"})
+    dropped_hash = dropped.hash
+    core.drop(dropped.hash)
+    assert sender.poll() == []
+    assert dropped.hash != dropped_hash and dropped.tx["nonce"] == 0
+    # another transaction takes the nonce of `replaced`
+    core.drop(replaced.hash)
+    core.send_transaction({"from": SENDER, "nonce": 1, "data": "0xff"})
+    core.mine()
+    assert {p.tx["data"] for p in sender.poll()} == {"0x01", "0x02"}
+    assert dropped.receipt is not None and dropped.error is None
+    assert replaced.error is not None and "replaced" in replaced.error
+    assert settled == [dropped, replaced] or settled == [replaced, dropped]
+
+
+def test_failed_resend_is_settled():
+    core = FakeCore(auto_mine=False)
+    sender = _sender(core, resend_after=0)
+    dropped = sender.submit({"data": "0x01"})
+    other = sender.submit({"data": "0x02"})
+    core.drop(dropped.hash)
+
+    def fail(tx):
+        raise ConnectionError("node unavailable")
+
+    send = core.send_transaction
+    core.send_transaction = fail  # type: ignore
+    assert sender.poll() == [dropped]
+    assert "node unavailable" in (dropped.error or "")
+    # the other transaction is still tracked
+    core.send_transaction = send  # type: ignore
+    assert sender.in_flight == 1
+    core.send_transaction({"from": SENDER, "nonce": 0, "data": "0xff"})
+    core.mine()
+    assert sender.poll() == [other] and other.receipt is not None
+
+
+def test_failed_transaction():
+    core = FakeCore(fails=lambda tx: tx["data"] == "0xbad")
+    sender = _sender(core)
+    pending = sender.submit({"data": "0xbad"})
+    with pytest.raises(Exception, match="failed"):
+        sender.wait(pending)
+    assert pending.receipt is not None
+
+
+def test_concurrent_submit():
+    core = FakeCore()
+    sender = _sender(core, window=4)
+    settled = []
+    sender.on_settled = settled.append
+    threads = [
+        threading.Thread(target=lambda i=i: [sender.submit({"data": hex(i * 10 + j)}) for j in range(10)])
+        for i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sender.flush()
+    assert sorted(tx["nonce"] for tx in core.sent) == list(range(40))
+    assert len(settled) == 40 and all(p.error is None for p in settled)
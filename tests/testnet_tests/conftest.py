@@ -15,9 +15,15 @@ from web3.middleware.signing import construct_sign_and_send_raw_middleware
 from web3.contract.contract import Contract
 from web3 import Web3, HTTPProvider
 
+from scripts.artifacts import registry
+from scripts.providers import make_provider
+from scripts.receipt_pool import wait_for_receipts, CORE_RECEIPT_METHOD
 
 load_dotenv()
 
+CORE_URL = "https://test.confluxrpc.com"
+EVM_URL = "https://evmtestnet.confluxrpc.com/"
+
 @pytest.fixture(scope="session")
 def deployed() -> bool:
     return bool(os.environ.get("deployed", False))
@@ -28,7 +34,7 @@ def private_key() -> str:
 
 @pytest.fixture(scope="session")
 def e_w3(private_key: str) -> Web3:
-    w3 = Web3(HTTPProvider("https://evmtestnet.confluxrpc.com/"))
+    w3 = Web3(make_provider(EVM_URL))
     acct = Account.from_key(private_key)
     w3.middleware_onion.add(
         construct_sign_and_send_raw_middleware(acct)
@@ -39,24 +45,17 @@ def e_w3(private_key: str) -> Web3:
 
 @pytest.fixture(scope="session")
 def c_w3(private_key: str) -> CWeb3:
-    w3 = CWeb3(HTTPProvider("https://test.confluxrpc.com"))
+    w3 = CWeb3(make_provider(CORE_URL))
     w3.cfx.default_account = w3.account.from_key(private_key)
     return w3
 
 
-# returns (abi, bytecode)
-def get_metadata(p: str) -> Tuple[str, str]:
-    with open(p) as f:
-        metadata = json.load(f)
-        return metadata["abi"], metadata["bytecode"]
-
 @pytest.fixture(scope="session")
 def core_contract(deployed: bool, c_w3: CWeb3, e_w3: Web3) -> ConfluxContract:
-    abi, bytecode = get_metadata("build/contracts/DualSpaceNFTCore.json")
     if deployed:
         address = cast(Base32Address, os.environ["CORE_CONTRACT_ADDRESS"])
     else:
-        construct_c = c_w3.cfx.contract(bytecode=bytecode, abi=abi)
+        construct_c = registry.contract(c_w3, "DualSpaceNFTCore")
         constructor = construct_c.constructor(
             os.environ["NAME"],
             os.environ["SYMBOL"],
@@ -70,16 +69,15 @@ def core_contract(deployed: bool, c_w3: CWeb3, e_w3: Web3) -> ConfluxContract:
         if address == None:
             raise Exception
 
-    return c_w3.cfx.contract(address=address, abi=abi)
+    return registry.contract(c_w3, "DualSpaceNFTCore", address)
 
 
 @pytest.fixture(scope="session")
 def evm_contract(deployed: bool, e_w3: Web3, core_contract: ConfluxContract) -> Contract:
-    abi, bytecode = get_metadata("build/contracts/DualSpaceNFTEVM.json")
     if deployed:
         address = Web3.to_checksum_address(os.environ["EVM_CONTRACT_ADDRESS"])
     else:
-        construct_c = e_w3.eth.contract(bytecode=bytecode, abi=abi)
+        construct_c = registry.contract(e_w3, "DualSpaceNFTEvm")
         mappingAddress = core_contract.address.mapped_evm_space_address
         deploy_hash = construct_c.constructor(
             os.environ["NAME"],
@@ -96,7 +94,7 @@ def evm_contract(deployed: bool, e_w3: Web3, core_contract: ConfluxContract) ->
         # bind core to espace
         core_contract.functions.setEvmContractAddress(bytes.fromhex(address[2:])).transact().executed()
 
-    return e_w3.eth.contract(address=address, abi=abi)
+    return registry.contract(e_w3, "DualSpaceNFTEvm", address)
 
 @dataclass
 class BatchSetting:
@@ -132,18 +130,12 @@ def cw3_accounts(c_w3: CWeb3) -> Tuple[CfxLocalAccount, CfxLocalAccount, CfxLoca
     c_w3.wallet.add_accounts([
         user_account, oracle_signer, random_account, authorizer
     ])
-    faucet.functions.claimCfx().transact({
-        "from": user_account.address
-    }).mined()
-    faucet.functions.claimCfx().transact({
-        "from": oracle_signer.address
-    }).mined()
-    faucet.functions.claimCfx().transact({
-        "from": random_account.address
-    }).mined()
-    faucet.functions.claimCfx().transact({
-        "from": authorizer.address
-    }).executed()
+    # claims are sent from different accounts so they can be confirmed concurrently
+    wait_for_receipts(CORE_URL, [
+        faucet.functions.claimCfx().transact({
+            "from": account.address
+        }) for account in (user_account, oracle_signer, random_account, authorizer)
+    ], CORE_RECEIPT_METHOD)
     return user_account, oracle_signer, random_account, authorizer
 
 @pytest.fixture(scope="session")
@@ -18,6 +18,7 @@ from cfx_account import LocalAccount as CfxLocalAccount
 from conflux_web3.contract import ConfluxContract
 
 from conftest import BatchSetting
+from scripts.mint_signer import sign_mint_message
 
 
 @dataclass
@@ -79,19 +80,12 @@ def test_mint(
     username = authorized_usernames[0]
     core_user_address = cast(Base32Address, c_w3.account.from_key(user_private_key).address)
     
-    message_hash = Web3.solidity_keccak(
-        ["uint128", "bytes32", "address", "address"],
-        [
-            batch_setting.batch_nbr,
-            Web3.solidity_keccak(["string"], [username]),
-            core_user_address.hex_address,
-            core_user_address.hex_address,
-        ],
-    )
-    
-    signature = Account.signHash(
-        message_hash,
+    signature = sign_mint_message(
         oracle_signer.key,
+        batch_setting.batch_nbr,
+        username,
+        core_user_address.hex_address,
+        core_user_address.hex_address,
     )
     
     
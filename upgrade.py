@@ -2,8 +2,11 @@ from conflux_web3 import Web3 as ConfluxWeb3
 from web3 import Web3
 from web3.middleware.signing import construct_sign_and_send_raw_middleware
 
-import os, json, dotenv
-from typing import Any, TypedDict
+import os, dotenv
+
+from scripts.artifacts import registry
+from scripts.instrumentation import export_from_env
+from scripts.providers import make_provider
 
 dotenv.load_dotenv()
 
@@ -13,28 +16,15 @@ def get_sk() -> str:
 
 
 def get_e_web3() -> Web3:
-    return Web3(Web3.HTTPProvider(os.environ["EVM_URL"]))
+    return Web3(make_provider(os.environ["EVM_URL"]))
 
 
 def get_c_web3() -> ConfluxWeb3:
-    return ConfluxWeb3(ConfluxWeb3.HTTPProvider(os.environ["CORE_URL"]))
-
-
-class Metadata(TypedDict):
-    abi: Any
-    bytecode: Any
-
-
-def get_metadata(name: str) -> Metadata:
-    with open(f"build/contracts/{name}.json") as f:
-        d = json.load(f)
-        return {
-            "abi": d["abi"],
-            "bytecode": d["bytecode"]
-        }
+    return ConfluxWeb3(make_provider(os.environ["CORE_URL"]))
 
 
 def main():
+    export_from_env()
     c_web3 = get_c_web3()
     e_web3 = get_e_web3()
     c_web3.cfx.default_account = c_web3.account.from_key(get_sk())
@@ -48,10 +38,10 @@ def main():
     symbol = os.environ["CORE_CONTRACT_SYMBOL"]
     default_oracle_life = int(os.environ["DEFAULT_ORACLE_LIFE"])
 
-    DualSpaceNFTCore = c_web3.cfx.contract(**get_metadata("DualSpaceNFTCore"))
-    DualSpaceNFTEvm = e_web3.eth.contract(**get_metadata("DualSpaceNFTEvm"))
-    DeploymentProxyCore = c_web3.cfx.contract(**get_metadata("DeploymentProxy"))
-    DeploymentProxyEvm = e_web3.eth.contract(**get_metadata("DeploymentProxy"))
+    DualSpaceNFTCore = registry.contract(c_web3, "DualSpaceNFTCore")
+    DualSpaceNFTEvm = registry.contract(e_web3, "DualSpaceNFTEvm")
+    DeploymentProxyCore = registry.contract(c_web3, "DeploymentProxy")
+    DeploymentProxyEvm = registry.contract(e_web3, "DeploymentProxy")
     espace_chain_id = e_web3.eth.chain_id
     
     print(f"deploying...")